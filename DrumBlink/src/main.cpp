@@ -16,8 +16,46 @@ const uint8_t LED_PINS[] = {PIN_B1, PIN_R1, PIN_G1, PIN_Y, PIN_W, PIN_B2, PIN_R2
 const uint8_t NUM_LEDS = sizeof(LED_PINS) / sizeof(LED_PINS[0]);
 
 const byte START = 0xAA;
+// Control frames: [START, CTRL_NOTE, cmd]. Data bytes are 7-bit, so START always resyncs.
+const uint8_t CTRL_NOTE = 0x7F;
+const uint8_t CTRL_PING = 0x00;
+const uint8_t CTRL_SYNC = 0x01;   // reply [TIME_START, millis (4 x 7 bits)]
+const uint8_t CTRL_STATUS = 0x02; // reply [STATUS_START, fired, late, dropped, drift (2 x 7 bits each), free slots]
+const uint8_t CTRL_CLEAR = 0x03;  // drop every queued cue
+const byte ACK = 0x55; // sent on boot and in reply to a ping, so the host knows we're listening
 unsigned long offAt[8] = {0};
 
+// ===== LED look-ahead =====
+// The host uploads upcoming chart notes as cues timed on our millis(), a couple of seconds early:
+// [CUE_START, base (4), host ms (4), n, n x (dt (2), note, vel), xor of the bytes after CUE_START].
+// Times are 28-bit ms; each cue's dt is from the one before (the first from base).
+const byte CUE_START = 0xAB;
+const byte TIME_START = 0xAD;
+const byte STATUS_START = 0xAE;
+const uint8_t CUE_CAPACITY = 48; // LED_CUE_CAPACITY in config.py
+const uint8_t CUE_BATCH_MAX = 16;
+const uint8_t CUE_HEADER = 9;
+const unsigned long MASK28 = 0x0FFFFFFFUL;
+const unsigned long LATE_MS = 2;    // fired later than this counts as late
+const unsigned long STALE_MS = 250; // later than this is dropped instead
+
+struct Cue
+{
+  unsigned long at;
+  uint8_t note, vel;
+};
+Cue cues[CUE_CAPACITY]; // ring buffer, in time order (the host sends them that way)
+uint8_t cueHead = 0, cueCount = 0;
+uint16_t cuesFired = 0, cuesLate = 0, cuesDropped = 0;
+// drift: (millis - host ms) from each cue frame, relative to the first; the minimum since the
+// last STATUS, since transport delay only ever adds to it
+bool haveDriftBase = false;
+long driftBase = 0, driftMin = 0;
+bool haveDriftMin = false;
+
+uint8_t cueBuf[CUE_HEADER + CUE_BATCH_MAX * 4 + 1];
+uint8_t cueLen = 0;
+
 const bool ACTIVE_LOW = true;
 
 // helper to write logical on/off regardless of wiring
@@ -31,7 +69,8 @@ enum ParseState
 {
   WAIT,
   NOTE,
-  VEL
+  VEL,
+  CUES
 };
 ParseState st = WAIT;
 uint8_t curNote = 0, curVel = 0;
@@ -88,6 +127,7 @@ void setup()
     ledWrite(LED_PINS[i], false); // ensure all off at boot
   }
   Serial.begin(115200);
+  Serial.write(ACK);
 }
 
 static inline uint16_t velToMs(uint8_t vel)
@@ -114,17 +154,155 @@ void triggerNote(uint8_t note, uint8_t vel)
   flashPin((uint8_t)pin, velToMs(vel));
 }
 
+static void write7(unsigned long v, uint8_t n)
+{
+  while (n--)
+    Serial.write((uint8_t)((v >> (7 * n)) & 0x7F));
+}
+
+static unsigned long read7(const uint8_t *p, uint8_t n)
+{
+  unsigned long v = 0;
+  while (n--)
+    v = (v << 7) | *p++;
+  return v;
+}
+
+static long signed28(unsigned long v)
+{
+  v &= MASK28;
+  return (v & 0x08000000UL) ? (long)v - 0x10000000L : (long)v;
+}
+
+void sendStatus()
+{
+  long drift = haveDriftMin ? driftMin : 0;
+  if (drift > 8191)
+    drift = 8191;
+  if (drift < -8192)
+    drift = -8192;
+  Serial.write(STATUS_START);
+  write7(cuesFired & 0x3FFF, 2);
+  write7(cuesLate & 0x3FFF, 2);
+  write7(cuesDropped & 0x3FFF, 2);
+  write7((unsigned long)(drift + 8192), 2);
+  Serial.write((uint8_t)(CUE_CAPACITY - cueCount));
+  haveDriftMin = false;
+}
+
+void handleControl(uint8_t cmd)
+{
+  switch (cmd)
+  {
+  case CTRL_PING:
+    Serial.write(ACK);
+    break;
+  case CTRL_SYNC:
+    Serial.write(TIME_START);
+    write7(millis() & MASK28, 4);
+    break;
+  case CTRL_STATUS:
+    sendStatus();
+    break;
+  case CTRL_CLEAR:
+    cueCount = 0;
+    break;
+  }
+}
+
+void handleCues()
+{
+  uint8_t n = cueBuf[8];
+  uint8_t x = 0;
+  for (uint8_t i = 0; i < cueLen - 1; ++i)
+    x ^= cueBuf[i];
+  if ((x & 0x7F) != cueBuf[cueLen - 1])
+  {
+    cuesDropped += n;
+    return;
+  }
+  unsigned long now = millis();
+  long d = signed28(now - read7(cueBuf + 4, 4));
+  if (!haveDriftBase)
+  {
+    driftBase = d;
+    haveDriftBase = true;
+  }
+  d -= driftBase;
+  if (!haveDriftMin || d < driftMin)
+  {
+    driftMin = d;
+    haveDriftMin = true;
+  }
+  // 28-bit base -> the full millis() value nearest to now
+  unsigned long at = now + signed28(read7(cueBuf, 4) - now);
+  for (uint8_t i = 0; i < n; ++i)
+  {
+    const uint8_t *c = cueBuf + CUE_HEADER + 4 * i;
+    at += read7(c, 2);
+    if (cueCount >= CUE_CAPACITY)
+    {
+      ++cuesDropped;
+      continue;
+    }
+    Cue &q = cues[(cueHead + cueCount) % CUE_CAPACITY];
+    q.at = at;
+    q.note = c[2];
+    q.vel = c[3];
+    ++cueCount;
+  }
+}
+
+void fireCues()
+{
+  unsigned long now = millis();
+  while (cueCount && (long)(now - cues[cueHead].at) >= 0)
+  {
+    const Cue &q = cues[cueHead];
+    unsigned long late = now - q.at;
+    cueHead = (cueHead + 1) % CUE_CAPACITY;
+    --cueCount;
+    if (late > STALE_MS)
+    {
+      ++cuesDropped;
+      continue;
+    }
+    triggerNote(q.note, q.vel);
+    ++cuesFired;
+    if (late > LATE_MS)
+      ++cuesLate;
+  }
+}
+
 void loop()
 {
-  // ---- Parse [START, note, velocity] coming from Python ----
+  // ---- Parse [START, note, velocity] and cue frames coming from Python ----
   while (Serial.available())
   {
     uint8_t b = (uint8_t)Serial.read();
+    if (b & 0x80)
+    {
+      // a frame marker: resync whatever was in progress
+      st = b == START ? NOTE : b == CUE_START ? CUES : WAIT;
+      cueLen = 0;
+      continue;
+    }
     switch (st)
     {
     case WAIT:
-      if (b == START)
-        st = NOTE;
+      break;
+    case CUES:
+      cueBuf[cueLen++] = b;
+      if (cueLen > CUE_HEADER - 1 && cueBuf[8] > CUE_BATCH_MAX)
+      {
+        ++cuesDropped;
+        st = WAIT;
+      }
+      else if (cueLen >= CUE_HEADER && cueLen == CUE_HEADER + 4 * cueBuf[8] + 1)
+      {
+        handleCues();
+        st = WAIT;
+      }
       break;
     case NOTE:
       curNote = b & 0x7F;
@@ -133,11 +311,17 @@ void loop()
     case VEL:
       curVel = b & 0x7F;
       st = WAIT;
-      triggerNote(curNote, curVel);
+      if (curNote == CTRL_NOTE)
+        handleControl(curVel);
+      else
+        triggerNote(curNote, curVel);
       break;
     }
   }
 
+  // ---- Cues due on our own clock ----
+  fireCues();
+
   // ---- Turn off LEDs  ----
   unsigned long now = millis();
   for (uint8_t i = 0; i < NUM_LEDS; ++i)
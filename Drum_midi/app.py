@@ -1,94 +1,348 @@
 #!/usr/bin/env python3
-import argparse, signal, sys
-from mido import MidiFile
-from config import MATCH_TOL_MS, GM
-from chart import extract_chart
-from judge import Judge
-from scheduler import PlayScheduler
-from midi_io import MidiInputLoop
-from notifier import ArduinoNotifier, find_serial
-from profiles import ALEsis_NITRO_PRO, build_active_map
-
-STOP = False
+# Only what argument parsing needs is imported up front; NumPy, mido, audio and pyserial load
+# when a feature that uses them is switched on (see `python -m bench --only startup`).
+import argparse, itertools, os, signal, sys, time
+from config import GUIDE_GATE_MS, MATCH_TOL_MS, OVERFLOW_POLICIES
+from profiles import PROFILES, DEFAULT_PROFILE
+
+stoppables = []      # input loops / players to stop on Ctrl-C (the asyncio runtime cancels its loop instead)
 def _on_sigint(signum, frame):
-    global STOP
-    STOP = True
+    for s in stoppables: s.stop()
 signal.signal(signal.SIGINT, _on_sigint)
 
-note_to_kind = build_active_map(GM, ALEsis_NITRO_PRO)
+def _set_loop(loop):
+    stoppables.append(loop)
+
+def _per_player(values, n, what):
+    # one value for everyone, or one per --input
+    if not values or len(values) == 1:
+        return (values or [None]) * n
+    if len(values) != n:
+        raise SystemExit(f"give one {what} or one per --input ({n}), got {len(values)}")
+    return values
+
+def _player_path(path, i, n):
+    # log/record files: one per player when several kits play
+    if not path or n == 1: return path
+    root, ext = os.path.splitext(path)
+    return f"{root}.p{i + 1}{ext}"
+
+def list_ports():
+    import mido
+    for title, names in (("MIDI inputs", mido.get_input_names), ("MIDI outputs", mido.get_output_names)):
+        print(f"Available {title}:")
+        try:
+            for name in names(): print("  -", name)
+        except Exception as e:
+            print(f"  (unavailable: {e})")
+    print("Serial ports:")
+    try:
+        import serial.tools.list_ports
+        for p in serial.tools.list_ports.comports(): print(f"  - {p.device}  {p.description or ''}")
+    except ImportError as e:
+        print(f"  (unavailable: {e})")
+    print("\nTip: re-run with --input 'Your E-Drum Port' (repeat --input for several kits)")
+
+def _print_stats(stats):
+    for k, v in stats.items():
+        if k == "avg_abs_dt_ms": print(f"{k:>18s}: {v:.1f}")
+        else:                    print(f"{k:>18s}: {v}")
 
 def main(argv=None):
     ap = argparse.ArgumentParser(description="Drum practice judge: play MIDI, listen to e-drum, score your hits.")
-    ap.add_argument("midifile", help="Path to MIDI file")
-    ap.add_argument("--input", required=False, help="MIDI input name (e-drum). If omitted, prints ports and exits.")
+    ap.add_argument("midifile", nargs="?", help="Path to MIDI file (not needed with --calibrate or --list-ports)")
+    ap.add_argument("--list-ports", action="store_true", help="List MIDI and serial ports, then exit")
+    ap.add_argument("--input", action="append", help="MIDI input name (e-drum); repeat for several kits. If omitted, prints ports and exits.")
+    ap.add_argument("--input-mode", choices=("callback", "poll"), default="callback",
+                    help="callback: rtmidi driver timestamps (default); poll: 1 ms polling fallback")
     ap.add_argument("--output", help="MIDI output name for guide notes (e.g., 'IAC Driver Bus 1')")
+    ap.add_argument("--guide-gate", type=float, default=GUIDE_GATE_MS, metavar="MS", help=f"Guide note length before its note-off (default {GUIDE_GATE_MS} ms)")
+    ap.add_argument("--render-guide", metavar="PATH", help="Write the guide-note stream --output would play to this MIDI file, then exit")
     ap.add_argument("--no-click", action="store_true", help="Disable metronome/count-in click")
+    ap.add_argument("--metronome", action="store_true", help="Click every beat of the song, not just the count-in")
+    ap.add_argument("--audio", choices=("auto", "sounddevice", "simpleaudio", "null"), default="auto",
+                    help="Click output: one mixed stream (sounddevice), one-shot buffers (simpleaudio) or null")
     ap.add_argument("--tol", type=int, default=MATCH_TOL_MS, help=f"Match tolerance in ms (default {MATCH_TOL_MS})")
-    ap.add_argument("--serial", help="Arduino serial (full path or substring, e.g. 'usbmodem', 'COM5')")
+    ap.add_argument("--serial", action="append", help="Arduino serial (full path or substring, e.g. 'usbmodem', 'COM5'); one per --input")
+    ap.add_argument("--led-guide", action="store_true", help="Upload upcoming notes to the Arduino so it lights each pad just before its hit, on its own clock")
     ap.add_argument("--baud", type=int, default=115200, help="Arduino baud (default 115200)")
+    ap.add_argument("--log", help="Append every judgment as a JSON line to this file")
+    ap.add_argument("--telemetry", metavar="ADDR", help="Serve live judgments and snapshots on this Unix socket path or host:port (read with telemetry.py)")
+    ap.add_argument("--record", help="Append every judgment to this binary session file (read with recorder.py)")
+    ap.add_argument("--queue-size", type=int, default=1024, help="Per-sink judgment queue size (default 1024)")
+    ap.add_argument("--overflow", choices=OVERFLOW_POLICIES, default="drop_oldest", help="What a full sink queue does (default drop_oldest)")
+    ap.add_argument("--no-cache", action="store_true", help="Decode the chart while playing (the MIDI file itself is still read whole); don't read or write the chart cache")
+    ap.add_argument("--rebuild-cache", action="store_true", help="Re-extract the chart and overwrite its cache entry")
+    ap.add_argument("--profile", action="append", choices=sorted(PROFILES), help=f"Device profile, once or per --input (default {DEFAULT_PROFILE})")
+    ap.add_argument("--calibrate", action="store_true", help="Measure this profile's input latency by tapping along to clicks, then exit")
+    ap.add_argument("--report", action="store_true", help="Print per-kind timing percentiles, velocity error and drift at the end")
+    ap.add_argument("--runtime", choices=("asyncio", "threads"), default="asyncio",
+                    help="asyncio: inputs, scheduler, sinks and Arduino on one event loop (default); threads: a thread per part")
+    ap.add_argument("--stats", type=float, nargs="?", const=10.0, metavar="SECONDS",
+                    help="Per-stage latency histograms (input, judge, sinks, serial, scheduler): every SECONDS (default 10; 0 = only at the end) and in the results")
+    ap.add_argument("--loop", metavar="BARS", help="Practice: loop these bars (e.g. 17-20) gaplessly until Ctrl-C")
+    ap.add_argument("--speed", type=float, default=100.0, help="Practice tempo, percent of the song's (default 100)")
+    ap.add_argument("--ramp", type=float, default=0.0, metavar="PCT", help="Practice: raise --speed by PCT after each pass landing 90%% of its notes")
+    ap.add_argument("--passes", type=int, help="Practice: stop queueing after this many passes")
+    ap.add_argument("--offset-ms", type=float, action="append", help="Input latency to subtract from hits, once or per --input (default: the profile's calibrated offset)")
     args = ap.parse_args(argv)
 
-    # MIDI file → expected chart
-    mid = MidiFile(args.midifile)
-    expected, tempo_map = extract_chart(mid)
+    if args.calibrate and not args.input and not args.list_ports:
+        ap.error("--calibrate needs --input")
+    # Nothing to play against yet: list ports without touching the MIDI file or any device
+    if args.list_ports or not (args.input or args.render_guide):
+        list_ports()
+        return 0
+
+    if args.calibrate:
+        from calibrate import run_calibration
+        profile = (args.profile or [DEFAULT_PROFILE])[0]
+        return 0 if run_calibration(args.input[0], profile, args.input_mode, args.audio, on_loop=_set_loop) is not None else 1
+    if not args.midifile:
+        ap.error("midifile is required")
+    if args.loop and args.no_cache:
+        ap.error("--loop needs the whole chart; drop --no-cache")
+    if args.led_guide and not args.serial:
+        ap.error("--led-guide needs --serial")
+    if args.loop and args.render_guide:
+        ap.error("--render-guide writes the whole song; drop --loop")
+
+    from judge import Judge
+    from pipeline import JudgmentPipeline, ConsoleSink, NotifierSink, LogFileSink
+    from profiles import DeviceProfile, load_latency_offset
+    from scheduler import PlayScheduler
+    from stats import dt_histogram
+
+    # MIDI file → expected chart. Without the cache, the chart is decoded lazily while playing.
+    if args.no_cache:
+        from mido import MidiFile
+        from chart import iter_chart
+        from midi_time import build_tempo_map
+        mid = MidiFile(args.midifile)
+        tempo_map = build_tempo_map(mid)
+        hits = iter_chart(mid, tempo_map)
+        first = next(hits, None)
+        expected = [first] if first else []
+        chart_source = itertools.chain(expected, hits)
+    else:
+        from chart_cache import load_chart
+        expected, tempo_map = load_chart(args.midifile, rebuild=args.rebuild_cache)
+        chart_source = None
     if not expected:
         print("No drum notes found on channel 10 in this MIDI.")
         return 1
 
-    # Optional Arduino notifier
-    notifier = None
-    if args.serial:
-        port = find_serial(args.serial)
-        if not port:
-            print("[WARN] Serial port not found. Proceeding without Arduino.")
-        else:
-            notifier = ArduinoNotifier(port, args.baud)
+    if args.render_guide:
+        from guide import render_midi
+        profile = DeviceProfile.load((args.profile or [DEFAULT_PROFILE])[0])
+        hits = expected if chart_source is None else list(chart_source)
+        count = render_midi(hits, tempo_map, args.render_guide, profile.out_note, args.guide_gate)
+        print(f"Wrote {count} guide messages ({args.guide_gate:g} ms gate) to {args.render_guide}")
+        return 0
+
+    practice = None
+    if args.loop:
+        # the looped section replaces the chart; Judges fill up pass by pass
+        from practice import Practice, parse_bars
+        try:
+            practice = Practice(expected, tempo_map, *parse_bars(args.loop), speed=args.speed, ramp=args.ramp,
+                                passes=args.passes, tol_ms=args.tol)
+        except ValueError as e:
+            ap.error(str(e))
+        print(f"Practice: bars {args.loop} ({practice.n} notes) at {args.speed:.0f}%" + (f", +{args.ramp:g}% per clean pass" if args.ramp else ""))
+        chart_source, tempo_map = practice.hits(), practice.timeline
+
+    # One player per --input: own profile, Judge, judgment pipeline and Arduino
+    from kits import Player, run_players, aggregate
+    rt = None
+    if args.runtime == "asyncio":
+        from runtime import Runtime
+        rt = Runtime()
+    n = len(args.input)
+    profiles = [p or DEFAULT_PROFILE for p in _per_player(args.profile, n, "--profile")]
+    offsets = _per_player(args.offset_ms, n, "--offset-ms")
+    serials = args.serial or []
+    if len(serials) > n:
+        ap.error(f"more --serial ({len(serials)}) than --input ({n})")
+    telemetry = None
+    if args.telemetry:
+        from telemetry import TelemetryServer
+        try:
+            telemetry = (rt.telemetry if rt else TelemetryServer)(args.telemetry).start()
+            print(f"Telemetry on {args.telemetry}")
+        except OSError as e:
+            print(f"[WARN] Could not serve telemetry on '{args.telemetry}': {e}")
+            telemetry = None
+    players = []
+    led_guides = {}        # player name -> LedGuide
+    for i, input_name in enumerate(args.input):
+        name = input_name if n == 1 else f"P{i + 1}"
+        profile = DeviceProfile.load(profiles[i])
+        offset_ms = offsets[i] if offsets[i] is not None else load_latency_offset(profiles[i])
+
+        notifier = None
+        if i < len(serials):
+            from notifier import ArduinoNotifier, find_serial
+            port = find_serial(serials[i])
+            if not port:
+                print(f"[WARN] Serial port '{serials[i]}' not found. {name} proceeds without Arduino.")
+            else:
+                notifier = rt.notifier(port, args.baud) if rt else ArduinoNotifier(port, args.baud)
+                if args.led_guide:
+                    from led_guide import LedGuide
+                    led_guides[name] = LedGuide(notifier)
+
+        # Judge → judgment pipeline (console / Arduino / log sinks run on the loop, or on their own threads)
+        pipeline = (rt.pipeline if rt else JudgmentPipeline)([ConsoleSink("" if n == 1 else f"{name} ")], capacity=args.queue_size, overflow=args.overflow)
+        if notifier: pipeline.add_sink(NotifierSink(notifier))
+        if args.log: pipeline.add_sink(LogFileSink(_player_path(args.log, i, n)))
+        if telemetry: pipeline.add_sink(telemetry.sink(name))
+        if args.record:
+            from recorder import SessionRecorder
+            pipeline.add_sink(SessionRecorder(_player_path(args.record, i, n)))
+        judge = Judge([] if chart_source is not None else expected, tol_ms=args.tol, pipeline=pipeline, offset_ms=offset_ms,
+                      lock=rt.judge_lock if rt else None)
+        if practice: pipeline.add_sink(practice.sink(judge), overflow="block")    # a dropped record would stall its pass
+        if n > 1: print(f"{name}: {input_name}  ({profile.title})")
+        if offset_ms: print(f"{name} input latency offset: {offset_ms:+.1f} ms ({profiles[i]})")
+        players.append((rt.player if rt else Player)(name, input_name, profile, judge, pipeline, notifier, args.input_mode, offset_ms))
+    stoppables.extend(players)
+
+    stages = None
+    if args.stats is not None:
+        from stats import StageStats
+        stages = StageStats()
+        for p in players: p.instrument(stages if n == 1 else stages.prefixed(f"{p.name}."))
+
+    # Click stream: one long-lived output, clicks mixed at sample offsets
+    mixer = audio_out = None
+    if not args.no_click and args.audio != "simpleaudio":
+        from audio import ClickMixer, open_backend
+        mixer = ClickMixer()
+        audio_out = open_backend(mixer, args.audio)
+        if audio_out: audio_out.start()
+        else:         mixer = None
 
-    # Judge
-    judge = Judge(expected, tol_ms=args.tol, notifier=notifier)
+    def on_expected(batch):
+        if chart_source is not None:
+            for p in players: p.judge.extend(batch)
+        for g in led_guides.values(): g.add(batch)
 
-    # Scheduler (click + guide notes)
-    scheduler = PlayScheduler()
+    # One scheduler (click + guide notes) drives every kit
+    scheduler = rt.scheduler() if rt else PlayScheduler()
+    scheduler.stages = stages
+    if practice: practice.schedule = scheduler.schedule
     start_at = scheduler.start(
-        expected_hits=expected,
+        expected_hits=expected if chart_source is None else chart_source,
         tempo_map=tempo_map,
+        on_expected=on_expected if chart_source is not None or led_guides else None,
         play_click=(not args.no_click),
         midi_out_name=args.output,
-        start_delay=2.0
+        out_notes=players[0].profile.out_note,
+        gate_ms=args.guide_gate,
+        start_delay=2.0,
+        mixer=mixer,
+        metronome=args.metronome,
+        threaded=rt is None,
     )
+    for p in players: p.pipeline.set_origin(start_at)
+    for g in led_guides.values(): g.start(start_at, scheduler.schedule)
 
-    # MIDI input loop
-    if not args.input:
-        print("Available MIDI inputs:")
-        import mido
-        for name in mido.get_input_names(): print("  -", name)
-        print("\nAvailable MIDI outputs:")
-        for name in mido.get_output_names(): print("  -", name)
-        print("\nTip: re-run with --input 'Your E-Drum Port'")
-        scheduler.stop(); scheduler.join()
-        if notifier: notifier.close()
-        return 0
-
-    def on_note(t_song, note, vel):
-        if STOP:
-            raise KeyboardInterrupt
-        judge.register_hit(t_song, note, vel, note_to_kind)
-
-    midi_loop = MidiInputLoop(args.input)
+    def dump_stages():
+        print(f"\n----- Stage latency (µs) @ {time.monotonic() - start_at:.0f} s -----")
+        for line in stages.format(): print(line)
+    every = (args.stats, dump_stages) if stages and args.stats > 0 else None
 
+    usage = None
     try:
-        midi_loop.run(start_at, on_note)
+        usage = rt.run(players, scheduler, start_at, every=every) if rt else run_players(players, start_at, every=every)
     except KeyboardInterrupt:
         pass
     finally:
+        t_stop = time.monotonic() - start_at
+        for p in players: p.stop()
         scheduler.stop(); scheduler.join()
-        stats = judge.finalize()
-        if notifier: notifier.close()
+        scheduler.close_output()
+        if args.no_cache:
+            # notes the stream never reached still count, as they do with the whole chart in the Judge
+            rest = scheduler.unpulled()
+            if rest:
+                for p in players: p.judge.extend(rest)
+        if audio_out: audio_out.close()
+        if practice: practice.finish(t_stop)
+        for g in led_guides.values(): g.close()    # before the links close: the CLEAR still goes out
+        for p in players: p.close()
+        if telemetry: telemetry.close()
+        if rt: rt.close()
+
+        for p in players:
+            judge = p.judge
+            print("\n----- Results -----" if n == 1 else f"\n----- Results: {p.name} ({p.input_name}) -----")
+            _print_stats(p.stats)
+            if args.report:
+                from report import build_report, format_report
+                print()
+                for line in format_report(build_report(judge.scores, t_end=expected[-1].t if chart_source is None else None)):
+                    print(line)
+            if p.offset_ms and judge.scores:
+                # dt_ms is already corrected; adding the offset back gives what the uncalibrated judge would have seen
+                print(f"\nΔt before correction (offset {p.offset_ms:+.1f} ms):")
+                for line in dt_histogram([s.dt_ms + p.offset_ms for s in judge.scores]): print("  " + line)
+                print("Δt after correction:")
+                for line in dt_histogram([s.dt_ms for s in judge.scores]): print("  " + line)
+            ins = p.input_stats()
+            if ins["hits"]:
+                print(f"{'input ' + ins['mode']:>18s}: timestamp uncertainty {ins['uncertainty_ms_mean']:.2f}/"
+                      f"{ins['uncertainty_ms_p99']:.2f}/{ins['uncertainty_ms_max']:.2f} ms (mean/p99/max)")
+                h = ins["handle_ms"]
+                print(f"{'input events':>18s}: {ins['events']} ({ins['events_per_s']:.1f}/s), judged in "
+                      f"{h['mean_ms']*1000:.1f}/{h['p99_ms']*1000:.1f}/{h['max_ms']*1000:.1f} µs (mean/p99/max)")
+            if p.notifier:
+                ns = p.notifier.stats()
+                print(f"{'arduino':>18s}: {ns['written']} frames in {ns['writes']} writes, write {ns['write_ms']['mean_ms']:.2f}/"
+                      f"{ns['write_ms']['max_ms']:.2f} ms, max depth {ns['max_depth']}, dropped {ns['dropped'] + ns['dropped_not_ready']}")
+            if p.name in led_guides:
+                ls = led_guides[p.name].stats()
+                sy, dev = ls["sync"], ls["device"]
+                line = f"{ls['cues']} cues in {ls['frames']} frames ({ls['bytes']} B), at most {ls['max_onboard']} on board"
+                if ls["lost"]: line += f", {ls['lost']} lost in failed writes"
+                if sy["samples"]:
+                    line += (f"; sync rtt {sy['rtt_ms_min']:.2f}/{sy['rtt_ms_p50']:.2f} ms (min/p50), "
+                             f"drift {sy['drift_ppm']:+.0f} ppm ({sy['drift_ms']:+.1f} ms)")
+                print(f"{'led guide':>18s}: {line}")
+                if dev:
+                    print(f"{'':>18s}  firmware: {dev['fired']} fired, {dev['late']} late, {dev['dropped']} dropped, "
+                          f"drift {dev['drift_ms']:+d} ms, {dev['free']} slots free")
+            for name, s in p.pipeline.stats().items():
+                e2e = s["e2e_ms"]
+                print(f"{'sink ' + name:>18s}: lag {s['lag_ms_mean']:.2f}/{s['lag_ms_max']:.2f} ms (mean/max)"
+                      f"  max depth {s['max_depth']}  dropped {s['dropped']}"
+                      + (f"  hit→done {e2e['p50_ms']:.2f}/{e2e['p99_ms']:.2f} ms (p50/p99)" if e2e["count"] else ""))
 
-        print("\n----- Results -----")
-        for k, v in stats.items():
-            if k == "avg_abs_dt_ms": print(f"{k:>18s}: {v:.1f}")
-            else:                    print(f"{k:>18s}: {v}")
+        if practice:
+            print()
+            for line in practice.summary(): print(line)
+        if n > 1:
+            print("\n----- All players -----")
+            _print_stats(aggregate([p.stats for p in players]))
+            ranked = sorted(players, key=lambda p: (-p.stats["hits_landed"], p.stats["avg_abs_dt_ms"]))
+            print(f"{'ranking':>18s}: " + ", ".join(f"{p.name} {p.stats['hits_landed']}/{p.stats['notes_in_chart']}" for p in ranked))
+        print()
+        if audio_out:
+            print(f"{'audio ' + audio_out.name:>18s}: output latency {audio_out.latency*1000:.1f} ms"
+                  f"  late clicks dropped {mixer.dropped}")
+        for label, s in scheduler.lateness_summary().items():
+            print(f"{label + ' lateness':>18s}: {s['mean_ms']:.3f}/{s['p99_ms']:.3f}/{s['max_ms']:.3f} ms (mean/p99/max, n={s['count']})")
+        if usage:
+            wake = f"  {usage['wakeups_per_s']:.1f} wakeups/s" if "wakeups_per_s" in usage else ""
+            print(f"{'runtime ' + args.runtime:>18s}: cpu {usage['cpu_pct']:.1f}%{wake}  {usage['threads']} threads")
+        if telemetry:
+            ts = telemetry.stats()
+            print(f"{'telemetry':>18s}: {ts['published']} judgments, {ts['subscribed']} subscribers (peak {ts['peak']}), "
+                  f"{ts['sent']} records sent, {ts['dropped']} dropped")
+        if stages:
+            print("\n----- Stage latency (µs) -----")
+            for line in stages.format(): print(line)
 
     return 0
 
@@ -1,6 +1,6 @@
+import threading, time, wave
 import numpy as np
-import simpleaudio as sa
-from config import SR, MASTER_GAIN, CLICK_HZ, CLICK_MS
+from config import SR, MASTER_GAIN, CLICK_HZ, CLICK_ACCENT_HZ, CLICK_MS, AUDIO_BLOCK
 
 def sine_click(duration_ms=CLICK_MS, freq=CLICK_HZ):
     n = int(SR * (duration_ms/1000.0))
@@ -10,9 +10,183 @@ def sine_click(duration_ms=CLICK_MS, freq=CLICK_HZ):
     mono = (wave * env * 0.6).astype(np.float32)
     return mono
 
-def play_mono(mono: np.ndarray):
+def to_stereo_int16(mono: np.ndarray) -> np.ndarray:
     stereo = np.stack([mono, mono], axis=1)
-    audio = (stereo * 32767 * MASTER_GAIN).astype(np.int16)
-    return sa.play_buffer(audio, 2, 2, SR)
+    return (stereo * 32767 * MASTER_GAIN).astype(np.int16)
+
+def play_mono(mono: np.ndarray):
+    # one-shot playback (opens a new simpleaudio buffer per call); the mixer below is the low-latency path
+    import simpleaudio as sa
+    return sa.play_buffer(to_stereo_int16(mono), 2, 2, SR)
+
+_clicks = None
+
+def clicks() -> tuple[np.ndarray, np.ndarray]:
+    # (CLICK, ACCENT_CLICK), synthesized the first time anything plays a click
+    global _clicks
+    if _clicks is None:
+        _clicks = (sine_click(), sine_click(freq=CLICK_ACCENT_HZ))
+    return _clicks
+
+def __getattr__(name):
+    # audio.CLICK / audio.ACCENT_CLICK stay importable without building them at import time
+    if name == "CLICK":        return clicks()[0]
+    if name == "ACCENT_CLICK": return clicks()[1]
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+class ClickMixer:
+    """
+    Mixes precomputed mono sounds into a continuous int16 stereo stream at exact sample offsets.
+    Events are monotonic-clock times; the backend anchors sample 0 to the clock once it knows
+    when that sample reaches the DAC. render() only writes into preallocated buffers.
+    """
+    def __init__(self, sounds=None, sr=SR, gain=MASTER_GAIN, block=AUDIO_BLOCK, max_voices=8):
+        self.sr = sr
+        self.scale = np.float32(32767 * gain)
+        self.sounds = [np.ascontiguousarray(s, dtype=np.float32) for s in (sounds or clicks())]
+        self.block = block
+        self._mix = np.zeros(block, dtype=np.float32)
+        self._voice_snd = np.zeros(max_voices, dtype=np.int64)
+        self._voice_off = np.zeros(max_voices, dtype=np.int64)
+        self._voices = 0
+        self._ev_t = np.zeros(0, dtype=np.float64)
+        self._ev_snd = np.zeros(0, dtype=np.int64)
+        self._ev_i = 0
+        self._lock = threading.Lock()
+        self.t0 = None         # monotonic time at which sample 0 plays
+        self.pos = 0           # samples rendered so far
+        self.dropped = 0       # events that arrived after their sample was already rendered
+
+    def anchor(self, t0: float):
+        self.t0 = t0
+
+    def schedule(self, times, sound_ids):
+        # times: monotonic seconds; merged into the pending queue (setup-time cost, not per sample)
+        times = np.asarray(times, dtype=np.float64)
+        snd = np.broadcast_to(np.asarray(sound_ids, dtype=np.int64), times.shape)
+        with self._lock:
+            t = np.concatenate([self._ev_t[self._ev_i:], times])
+            s = np.concatenate([self._ev_snd[self._ev_i:], snd])
+            order = np.argsort(t, kind="stable")
+            self._ev_t, self._ev_snd, self._ev_i = t[order], s[order], 0
+
+    def render(self, frames: int, out: np.ndarray):
+        # fill out[:frames] (int16, shape (>=frames, 2)); called from the audio callback
+        mix = self._mix[:frames]
+        mix.fill(0.0)
+        n = self._voices
+        vs, vo = self._voice_snd, self._voice_off
+        # continue voices started in earlier blocks
+        k = 0
+        for v in range(n):
+            snd = self.sounds[vs[v]]
+            off = vo[v]
+            m = min(frames, len(snd) - off)
+            mix[:m] += snd[off:off + m]
+            if off + m < len(snd):
+                vs[k], vo[k] = vs[v], off + m
+                k += 1
+        n = k
+        # start events whose sample falls inside this block
+        if self.t0 is not None:
+            with self._lock:
+                ev_t, i = self._ev_t, self._ev_i
+                while i < len(ev_t):
+                    at = int(round((ev_t[i] - self.t0) * self.sr)) - self.pos
+                    if at >= frames: break
+                    if at < 0:
+                        self.dropped += 1
+                    else:
+                        snd = self.sounds[self._ev_snd[i]]
+                        m = min(frames - at, len(snd))
+                        mix[at:at + m] += snd[:m]
+                        if m < len(snd) and n < len(vs):
+                            vs[n], vo[n] = self._ev_snd[i], m
+                            n += 1
+                    i += 1
+                self._ev_i = i
+        self._voices = n
+        np.clip(mix, -1.0, 1.0, out=mix)
+        mix *= self.scale
+        out[:frames, 0] = mix
+        out[:frames, 1] = mix
+        self.pos += frames
+
+class NullBackend:
+    # Paces the mixer against the wall clock without a sound device (headless runs)
+    name = "null"
+    latency = 0.0
+    def __init__(self, mixer: ClickMixer):
+        self.mixer = mixer
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        buf = np.zeros((self.mixer.block, 2), dtype=np.int16)
+        dt = self.mixer.block / self.mixer.sr
+        t0 = time.monotonic()
+        self.mixer.anchor(t0)
+        def run():
+            blocks = 0
+            while not self._stop.is_set():
+                self.mixer.render(self.mixer.block, buf)
+                blocks += 1
+                self._stop.wait(max(0.0, t0 + blocks * dt - time.monotonic()))
+        self._thread = threading.Thread(target=run, daemon=True)
+        self._thread.start()
+
+    def close(self):
+        self._stop.set()
+        if self._thread: self._thread.join(1.0)
+
+class SoundDeviceBackend:
+    # One long-lived PortAudio output stream whose callback pulls blocks from the mixer
+    name = "sounddevice"
+    def __init__(self, mixer: ClickMixer, latency="low"):
+        import sounddevice as sd
+        self.mixer = mixer
+        self._anchored = threading.Event()
+        def callback(outdata, frames, time_info, status):
+            if self.mixer.t0 is None:
+                # stream clock -> monotonic: the first sample of this block reaches the DAC at outputBufferDacTime
+                now = time.monotonic()
+                self.mixer.anchor(now + (time_info.outputBufferDacTime - time_info.currentTime) - self.mixer.pos / self.mixer.sr)
+                self._anchored.set()
+            self.mixer.render(frames, outdata)
+        self.stream = sd.OutputStream(samplerate=mixer.sr, channels=2, dtype="int16",
+                                      blocksize=mixer.block, latency=latency, callback=callback)
+        self.latency = 0.0
+
+    def start(self):
+        self.stream.start()
+        self.latency = float(self.stream.latency)
+        self._anchored.wait(1.0)
+
+    def close(self):
+        try:
+            self.stream.stop(); self.stream.close()
+        except Exception:
+            pass
+
+def open_backend(mixer: ClickMixer, name: str = "auto"):
+    # "auto" returns None when no stream can be opened, so callers can fall back to play_mono
+    if name == "null":
+        return NullBackend(mixer)
+    try:
+        return SoundDeviceBackend(mixer)
+    except (ImportError, OSError) as e:
+        if name == "sounddevice": raise
+        print(f"[WARN] No audio output stream ({e}); using one-shot simpleaudio clicks.")
+        return None
 
-CLICK = sine_click()
+def render_wav(mixer: ClickMixer, path: str, seconds: float):
+    # Offline render with sample 0 at t=0, for checking click placement without a sound card
+    mixer.anchor(0.0)
+    total = int(seconds * mixer.sr)
+    buf = np.zeros((mixer.block, 2), dtype=np.int16)
+    with wave.open(path, "wb") as w:
+        w.setnchannels(2); w.setsampwidth(2); w.setframerate(mixer.sr)
+        while mixer.pos < total:
+            n = min(mixer.block, total - mixer.pos)
+            mixer.render(n, buf)
+            w.writeframes(buf[:n].tobytes())
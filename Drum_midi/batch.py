@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+# Chart stats for a whole MIDI library on a process pool. Each worker extracts one file, writes
+# its chart cache entry plus a small stats sidecar, and results print as files finish.
+#   python batch.py . --jobs 8 --json library.jsonl
+#   python batch.py ~/midi --recursive
+
+import argparse, io, json, os, sys, time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from pathlib import Path
+from typing import Iterator, Optional
+import numpy as np
+from config import GM, JUDGED_KINDS
+
+def find_midis(paths: list[str], recursive: bool = False) -> Iterator[str]:
+    for p in paths:
+        if os.path.isdir(p):
+            it = Path(p).rglob("*") if recursive else Path(p).iterdir()
+            for f in sorted(it):
+                if f.suffix.lower() in (".mid", ".midi") and f.is_file():
+                    yield str(f)
+        else:
+            yield p
+
+def chart_stats(chart, tempo_map, unmapped: Counter) -> dict:
+    from dh_types import KINDS
+    t = chart.t
+    counts = np.bincount(chart.kind, minlength=len(KINDS))
+    duration = float(t[-1]) if len(t) else 0.0
+    # most notes inside any 1 s window starting at a note
+    peak = int((np.searchsorted(t, t + 1.0, "left") - np.arange(len(t))).max()) if len(t) else 0
+    bpms = [60_000_000 / us for _, us in tempo_map]
+    return {
+        "notes": len(chart),
+        "per_kind": {KINDS[k]: int(c) for k, c in enumerate(counts) if c},
+        "unmapped": {int(n): c for n, c in sorted(unmapped.items())},
+        "tempo_changes": len(tempo_map) - 1,       # after the opening tempo
+        "bpm_min": min(bpms),
+        "bpm_max": max(bpms),
+        "duration_s": duration,
+        "notes_per_s": len(chart) / duration if duration > 0 else 0.0,
+        "peak_nps": peak,
+    }
+
+def _unmapped_drum_notes(mid) -> Counter:
+    # channel-10 note-ons the chart drops because GM/JUDGED_KINDS don't cover them
+    c = Counter()
+    for track in mid.tracks:
+        for msg in track:
+            if msg.type == "note_on" and msg.velocity > 0 and msg.channel == 9 and GM.get(msg.note) not in JUDGED_KINDS:
+                c[msg.note] += 1
+    return c
+
+def analyze_file(path: str, directory: Optional[str] = None, use_cache: bool = True) -> dict:
+    """Stats for one file (runs in a worker). Reuses the cache entry and sidecar when both exist."""
+    from chart_cache import cache_dir, chart_key, save_chart
+    t0 = time.perf_counter()
+    try:
+        with open(path, "rb") as f:
+            data = f.read()
+        key = chart_key(data)
+        d = cache_dir(directory)
+        entry, meta = d / (key + ".npz"), d / (key + ".json")
+        if use_cache and entry.exists() and meta.exists():
+            with open(meta) as f:
+                stats = json.load(f)
+            stats["unmapped"] = {int(n): c for n, c in stats["unmapped"].items()}
+            cached = True
+        else:
+            from mido import MidiFile
+            from chart import extract_chart
+            mid = MidiFile(file=io.BytesIO(data))
+            chart, tempo_map = extract_chart(mid)
+            stats = chart_stats(chart, tempo_map, _unmapped_drum_notes(mid))
+            cached = False
+            if use_cache:
+                save_chart(entry, chart, tempo_map)
+                tmp = meta.with_name(meta.name + ".tmp")
+                with open(tmp, "w") as f:
+                    json.dump(stats, f)
+                os.replace(tmp, meta)
+        return {"path": path, "key": key, "cached": cached, "ms": (time.perf_counter() - t0) * 1000.0, **stats}
+    except Exception as e:
+        return {"path": path, "error": f"{type(e).__name__}: {e}", "ms": (time.perf_counter() - t0) * 1000.0}
+
+def run_batch(paths: list[str], jobs: Optional[int] = None, directory: Optional[str] = None,
+              use_cache: bool = True) -> Iterator[dict]:
+    """
+    Yields one result per file in completion order. At most a few tasks per worker are in flight,
+    so huge libraries don't queue thousands of futures up front. jobs=1 runs inline.
+    """
+    paths = iter(paths)
+    if jobs == 1:
+        for p in paths:
+            yield analyze_file(p, directory, use_cache)
+        return
+    jobs = jobs or os.cpu_count() or 1
+    with ProcessPoolExecutor(max_workers=jobs) as pool:
+        pending = set()
+        for p in paths:
+            pending.add(pool.submit(analyze_file, p, directory, use_cache))
+            if len(pending) >= jobs * 4:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for f in done: yield f.result()
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for f in done: yield f.result()
+
+def _line(r: dict) -> str:
+    name = os.path.basename(r["path"])
+    if "error" in r:
+        return f"{name[:44]:44s}  ERROR {r['error']}"
+    kinds = " ".join(f"{k}:{n}" for k, n in sorted(r["per_kind"].items(), key=lambda kv: -kv[1])[:4])
+    bpm = f"{r['bpm_min']:.0f}" if not r["tempo_changes"] else f"{r['bpm_min']:.0f}-{r['bpm_max']:.0f}"
+    unm = f"  unmapped {r['unmapped']}" if r["unmapped"] else ""
+    chg = f" ({r['tempo_changes']} chg)" if r["tempo_changes"] else ""
+    return (f"{name[:44]:44s} {r['notes']:6d} notes  {bpm:>7s} bpm{chg:>12s}  "
+            f"{r['notes_per_s']:5.1f}/s peak {r['peak_nps']:3d}/s  {kinds}{unm}{'  [cached]' if r['cached'] else ''}")
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Chart stats for a directory of MIDI files, in parallel.")
+    ap.add_argument("paths", nargs="+", help="MIDI files and/or directories")
+    ap.add_argument("--recursive", "-r", action="store_true", help="Descend into subdirectories")
+    ap.add_argument("--jobs", "-j", type=int, help="Worker processes (default: one per core)")
+    ap.add_argument("--json", help="Also write one JSON line per file here")
+    ap.add_argument("--no-cache", action="store_true", help="Don't read or write the chart cache")
+    args = ap.parse_args(argv)
+
+    out = open(args.json, "w", encoding="utf-8") if args.json else None
+    t0 = time.perf_counter()
+    n = errors = notes = cached = 0
+    kinds = Counter()
+    unmapped = Counter()
+    try:
+        for r in run_batch(find_midis(args.paths, args.recursive), args.jobs, use_cache=not args.no_cache):
+            n += 1
+            print(_line(r), flush=True)
+            if out: out.write(json.dumps(r) + "\n")
+            if "error" in r:
+                errors += 1
+                continue
+            notes += r["notes"]
+            cached += r["cached"]
+            kinds.update(r["per_kind"])
+            unmapped.update(r["unmapped"])
+    finally:
+        if out: out.close()
+    elapsed = time.perf_counter() - t0
+    print(f"\n{n} files ({cached} cached, {errors} errors), {notes} notes in {elapsed:.2f} s ({n / elapsed if elapsed else 0:.1f} files/s)")
+    if kinds:    print("per kind: " + ", ".join(f"{k} {v}" for k, v in kinds.most_common()))
+    if unmapped: print("unmapped drum notes (dropped): " + ", ".join(f"{k}×{v}" for k, v in sorted(unmapped.items())))
+    return 1 if errors else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
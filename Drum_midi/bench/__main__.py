@@ -0,0 +1,71 @@
+# Benchmark suite entry point (run from Drum_midi/):
+#   python -m bench                          # run everything, print a table
+#   python -m bench --json out.json          # also write machine-readable results
+#   python -m bench --baseline base.json     # compare; exit 1 if anything regressed past --threshold
+#   python -m bench --only judge,tempo --quick
+
+import argparse, json, platform, sys, time
+from bench.suite import BENCHMARKS
+
+def run(names, quick: bool) -> dict:
+    results = {}
+    for name in names:
+        t0 = time.perf_counter()
+        for metric, (value, unit, higher) in BENCHMARKS[name](quick).items():
+            results[metric] = {"value": value, "unit": unit, "higher_is_better": higher}
+        print(f"  {name:10s} done in {time.perf_counter() - t0:.1f}s", file=sys.stderr)
+    return results
+
+def compare(results: dict, baseline: dict, threshold: float) -> list[str]:
+    # returns the metrics that got worse than baseline by more than `threshold` (fraction)
+    regressions = []
+    print(f"\n{'metric':44s} {'baseline':>12s} {'current':>12s} {'change':>8s}")
+    for metric, cur in results.items():
+        base = baseline.get(metric)
+        if not base or not base["value"]:
+            print(f"{metric:44s} {'-':>12s} {cur['value']:12.3f} {'new':>8s}")
+            continue
+        change = cur["value"] / base["value"] - 1.0
+        worse = -change if cur["higher_is_better"] else change
+        flag = "  REGRESSION" if worse > threshold else ""
+        if flag: regressions.append(metric)
+        print(f"{metric:44s} {base['value']:12.3f} {cur['value']:12.3f} {change:+8.1%}{flag}")
+    return regressions
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(prog="python -m bench", description="Drum_midi benchmark suite")
+    ap.add_argument("--only", help=f"Comma-separated subset of: {', '.join(BENCHMARKS)}")
+    ap.add_argument("--quick", action="store_true", help="Smaller inputs and fewer repeats")
+    ap.add_argument("--json", help="Write results to this file")
+    ap.add_argument("--baseline", help="Compare against a previous --json output")
+    ap.add_argument("--threshold", type=float, default=0.25, help="Allowed slowdown vs baseline (default 0.25 = 25%%)")
+    args = ap.parse_args(argv)
+
+    names = args.only.split(",") if args.only else list(BENCHMARKS)
+    unknown = [n for n in names if n not in BENCHMARKS]
+    if unknown:
+        ap.error(f"unknown benchmark(s): {', '.join(unknown)}")
+
+    results = run(names, args.quick)
+    doc = {
+        "meta": {"python": platform.python_version(), "platform": platform.platform(),
+                 "time": time.strftime("%Y-%m-%dT%H:%M:%S"), "quick": args.quick},
+        "results": results,
+    }
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(doc, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f)["results"], args.threshold)
+        if regressions:
+            print(f"\n{len(regressions)} regression(s) beyond {args.threshold:.0%}")
+            return 1
+    else:
+        for metric, r in results.items():
+            print(f"{metric:44s} {r['value']:12.3f} {r['unit']}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,82 @@
+# Judge matching strategies on synthetic dense charts: the old fixed cursor-20..cursor+50 window scan
+# versus the per-kind bisect index.
+#   python -m bench.bench_judge [--notes 10000] [--kinds 10] [--spacing-ms 5] [--jitter-ms 15]
+
+import argparse, random, time
+from config import GM, JUDGED_KINDS
+from dh_types import ExpectedHit
+from judge import Judge
+
+KIND_NOTE = {}
+for _note, _kind in sorted(GM.items()):
+    KIND_NOTE.setdefault(_kind, _note)
+
+class WindowScanJudge(Judge):
+    """The pre-index matcher: one global miss cursor plus a linear scan of cursor-20 .. cursor+50."""
+    def __init__(self, expected_hits, tol_ms, pipeline=None):
+        self.cursor = 0
+        super().__init__(expected_hits, tol_ms, pipeline)
+
+    def _register_silent_misses_until(self, t_actual):
+        while self.cursor < len(self.expected) and self.expected[self.cursor].t < t_actual - self.tol:
+            if not self.expected[self.cursor].matched:
+                self.misses += 1
+                self.combo = 0
+            self.cursor += 1
+
+    def _find_match(self, kind, t_actual):
+        best_idx, best_dt = None, None
+        lo = max(0, self.cursor - 20)
+        hi = min(len(self.expected), self.cursor + 50)
+        for i in range(lo, hi):
+            e = self.expected[i]
+            if e.matched or e.kind != kind:
+                continue
+            dt = t_actual - e.t
+            if abs(dt) <= self.tol and (best_dt is None or abs(dt) < abs(best_dt)):
+                best_idx, best_dt = i, dt
+        return best_idx
+
+def synthetic_chart(notes: int, kinds: int, spacing_ms: float, seed: int = 0) -> list[ExpectedHit]:
+    rng = random.Random(seed)
+    pool = sorted(JUDGED_KINDS)[:kinds]
+    out = []
+    for i in range(notes):
+        kind = rng.choice(pool)
+        out.append(ExpectedHit(t=1.0 + i * spacing_ms / 1000.0, kind=kind, note=KIND_NOTE[kind], vel=100))
+    return out
+
+def synthetic_hits(chart, jitter_ms: float, seed: int = 1):
+    rng = random.Random(seed)
+    hits = [(e.t + rng.gauss(0.0, jitter_ms / 1000.0), e.note, e.vel) for e in chart]
+    hits.sort()
+    return hits
+
+def run(judge_cls, chart_args, hits, tol_ms):
+    chart = synthetic_chart(*chart_args)
+    judge = judge_cls(chart, tol_ms=tol_ms)
+    t0 = time.perf_counter()
+    for t, note, vel in hits:
+        judge.register_hit(t, note, vel, GM.get)
+    elapsed = time.perf_counter() - t0
+    stats = judge.finalize()
+    return elapsed, stats
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Compare Judge matching strategies on a synthetic chart")
+    ap.add_argument("--notes", type=int, default=10_000)
+    ap.add_argument("--kinds", type=int, default=10)
+    ap.add_argument("--spacing-ms", type=float, default=5.0, help="Gap between consecutive chart notes (any kind)")
+    ap.add_argument("--jitter-ms", type=float, default=15.0, help="Std-dev of synthetic hit timing error")
+    ap.add_argument("--tol", type=int, default=120)
+    args = ap.parse_args(argv)
+
+    chart_args = (args.notes, args.kinds, args.spacing_ms)
+    hits = synthetic_hits(synthetic_chart(*chart_args), args.jitter_ms)
+    print(f"{args.notes} notes, {args.kinds} kinds, {args.spacing_ms} ms apart, jitter σ={args.jitter_ms} ms")
+    for name, cls in (("window-scan", WindowScanJudge), ("kind-bisect", Judge)):
+        elapsed, stats = run(cls, chart_args, hits, args.tol)
+        print(f"  {name:12s} {elapsed*1e6/len(hits):7.2f} µs/hit   played={stats['played']:6d}  misses={stats['misses']:6d}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,52 @@
+# Shared helpers for the benchmark suite: timing and synthetic MIDI charts.
+
+import random, statistics, time
+from pathlib import Path
+from mido import MidiFile, MidiTrack, MetaMessage, Message
+from config import GM
+
+ROOT = Path(__file__).resolve().parents[1]
+BUNDLED_MIDIS = sorted(ROOT.glob("*.mid"))
+
+def timeit(fn, repeat: int = 5, number: int = 1) -> dict:
+    """Runs fn `number` times per sample, `repeat` samples; seconds per call (best and median)."""
+    samples = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        for _ in range(number):
+            fn()
+        samples.append((time.perf_counter() - t0) / number)
+    return {"best": min(samples), "median": statistics.median(samples)}
+
+def percentiles_ms(samples_s: list[float]) -> dict:
+    s = sorted(samples_s)
+    n = len(s)
+    pick = lambda q: s[min(n - 1, int(q * n))] * 1000.0
+    return {"mean": sum(s) / n * 1000.0, "p50": pick(0.50), "p99": pick(0.99), "max": s[-1] * 1000.0}
+
+def synthetic_midi(notes: int, tempo_every_beats: int = 1, tpq: int = 480, seed: int = 0) -> MidiFile:
+    """
+    A chart with `notes` drum hits on sixteenths across two drum tracks, and a tempo change every
+    `tempo_every_beats` beats in track 0 (a rubato / live-recorded worst case).
+    """
+    rng = random.Random(seed)
+    drum_notes = sorted(GM)
+    mid = MidiFile(ticks_per_beat=tpq)
+    conductor, a, b = MidiTrack(), MidiTrack(), MidiTrack()
+    mid.tracks.extend([conductor, a, b])
+    step = tpq // 4
+    beats = notes * step // tpq + 1
+    last = 0
+    for beat in range(0, beats, tempo_every_beats):
+        tick = beat * tpq
+        conductor.append(MetaMessage("set_tempo", tempo=rng.randint(400_000, 600_000), time=tick - last))
+        last = tick
+    last_a = last_b = 0
+    for i in range(notes):
+        tick = i * step
+        note = rng.choice(drum_notes)
+        if i % 2:
+            a.append(Message("note_on", channel=9, note=note, velocity=100, time=tick - last_a)); last_a = tick
+        else:
+            b.append(Message("note_on", channel=9, note=note, velocity=100, time=tick - last_b)); last_b = tick
+    return mid
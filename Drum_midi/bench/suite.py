@@ -0,0 +1,289 @@
+# Benchmark definitions. Each returns {metric_name: (value, unit, higher_is_better)}.
+
+import os, time
+import numpy as np
+from mido import MidiFile
+from bench.common import BUNDLED_MIDIS, timeit, percentiles_ms, synthetic_midi
+from bench.bench_judge import synthetic_chart, synthetic_hits
+from config import GM
+
+def _note_ticks(mid: MidiFile) -> list[int]:
+    out = []
+    for track in mid.tracks:
+        acc = 0
+        for msg in track:
+            acc += msg.time
+            if msg.type == "note_on" and msg.velocity > 0:
+                out.append(acc)
+    return out
+
+def bench_chart(quick: bool) -> dict:
+    from chart import extract_chart
+    res = {}
+    for path in BUNDLED_MIDIS:
+        name = path.stem.split("-")[1].strip().replace(" ", "_").lower()
+        parse = timeit(lambda: MidiFile(str(path)), repeat=3 if quick else 5)
+        mid = MidiFile(str(path))
+        extract = timeit(lambda: extract_chart(mid), repeat=3 if quick else 5)
+        res[f"chart.parse.{name}"] = (parse["median"] * 1000, "ms", False)
+        res[f"chart.extract.{name}"] = (extract["median"] * 1000, "ms", False)
+    return res
+
+def bench_tempo(quick: bool) -> dict:
+    from chart import extract_chart
+    from midi_time import build_tempo_map, ticks_to_seconds
+    res = {}
+    for n in ((1_000, 10_000) if quick else (1_000, 10_000, 100_000)):
+        mid = synthetic_midi(n, tempo_every_beats=1)
+        tm = build_tempo_map(mid)
+        ticks = _note_ticks(mid)
+        tpq = mid.ticks_per_beat
+        arr = np.asarray(ticks)
+        res[f"tempo.extract.{n}"] = (timeit(lambda: extract_chart(mid), repeat=3)["median"] * 1000, "ms", False)
+        scalar = timeit(lambda: [ticks_to_seconds(t, tpq, tm) for t in ticks], repeat=3)
+        batch = timeit(lambda: tm.seconds_array(arr), repeat=5)
+        res[f"tempo.scalar.{n}"] = (scalar["median"] * 1000, "ms", False)
+        res[f"tempo.batch.{n}"] = (batch["best"] * 1000, "ms", False)
+    return res
+
+def bench_judge(quick: bool) -> dict:
+    from judge import Judge
+    n = 2_000 if quick else 10_000
+    chart_args = (n, 10, 5.0)
+    hits = synthetic_hits(synthetic_chart(*chart_args), 15.0)
+    judge = Judge(synthetic_chart(*chart_args), tol_ms=120)
+    lat = []
+    pc = time.perf_counter
+    t_all = pc()
+    for t, note, vel in hits:
+        t0 = pc()
+        judge.register_hit(t, note, vel, GM.get)
+        lat.append(pc() - t0)
+    elapsed = pc() - t_all
+    judge.finalize()
+    p = percentiles_ms(lat)
+    return {
+        "judge.throughput": (len(hits) / elapsed, "hits/s", True),
+        "judge.latency.p50": (p["p50"] * 1000, "us", False),
+        "judge.latency.p99": (p["p99"] * 1000, "us", False),
+        "judge.latency.max": (p["max"] * 1000, "us", False),
+    }
+
+def bench_scheduler(quick: bool) -> dict:
+    # alternating clicks (spun for) and guide notes (just waited for): lateness of each, and CPU per event
+    import threading
+    from scheduler import EventScheduler
+    n = 100 if quick else 400
+    eng = EventScheduler()
+    start = time.monotonic() + 0.05
+    for i in range(n):
+        eng.schedule(start + i * 0.0025, lambda: None, label="click" if i % 2 else "guide")
+    eng.finish()
+    th = threading.Thread(target=eng.run)
+    cpu0 = time.process_time()
+    th.start(); th.join()
+    cpu = time.process_time() - cpu0
+    s = eng.lateness_summary()
+    return {
+        "scheduler.lateness.mean": (s["click"]["mean_ms"], "ms", False),
+        "scheduler.lateness.p99": (s["click"]["p99_ms"], "ms", False),
+        "scheduler.lateness.max": (s["click"]["max_ms"], "ms", False),
+        "scheduler.guide_lateness.p99": (s["guide"]["p99_ms"], "ms", False),
+        "scheduler.cpu_per_event": (cpu / n * 1e6, "us", False),
+    }
+
+def bench_audio(quick: bool) -> dict:
+    from audio import CLICK, ClickMixer, to_stereo_int16
+    prep = timeit(lambda: to_stereo_int16(CLICK), repeat=5, number=200 if quick else 1000)
+    mixer = ClickMixer()
+    mixer.anchor(0.0)
+    mixer.schedule(np.arange(0.0, 3600.0, 0.25), 0)
+    out = np.zeros((mixer.block, 2), dtype=np.int16)
+    render = timeit(lambda: mixer.render(mixer.block, out), repeat=5, number=500 if quick else 2000)
+    return {
+        "audio.play_mono_prep": (prep["best"] * 1e6, "us", False),
+        "audio.mixer_block": (render["best"] * 1e6, "us", False),
+    }
+
+class _NullSink:
+    name = "null"
+    def handle(self, rec): pass
+    def close(self): pass
+
+def _ctx_switches():
+    # voluntary + involuntary context switches of every live thread (Linux only): each is a wake-up
+    total = 0
+    try:
+        for tid in os.listdir("/proc/self/task"):
+            with open(f"/proc/self/task/{tid}/status") as f:
+                total += sum(int(line.split()[1]) for line in f if "ctxt_switches" in line)
+    except OSError:
+        return None
+    return total
+
+def _session(runtime: str, seconds: float, rate: float = 8.0) -> dict:
+    # A played song without devices: a stand-in driver thread delivers one hit per chart note, as the
+    # rtmidi callback would; the metronome runs into a ClickMixer with no audio backend.
+    import asyncio, threading
+    from audio import ClickMixer
+    from dh_types import Chart, ExpectedHit
+    from judge import Judge
+    from kits import Player
+    from midi_time import TempoMap
+    from pipeline import JudgmentPipeline
+    from profiles import DeviceProfile
+    from scheduler import PlayScheduler
+    from stats import thread_count
+    n = int(seconds * rate)
+    chart = Chart.from_hits([ExpectedHit(t=i / rate, kind="snare", note=38, vel=100) for i in range(n)])
+    rt = None
+    if runtime == "asyncio":
+        from runtime import Runtime
+        rt = Runtime()
+        pipe, sched = rt.pipeline([_NullSink()]), rt.scheduler()
+    else:
+        pipe, sched = JudgmentPipeline([_NullSink()]), PlayScheduler()
+    judge = Judge(chart, tol_ms=120, pipeline=pipe, lock=rt.judge_lock if rt else None)
+    player = Player("P1", "none", DeviceProfile.load("gm"), judge, pipe)
+    start_at = sched.start(chart, TempoMap([(0, 500_000)], 480), mixer=ClickMixer(), metronome=True,
+                           start_delay=0.1, threaded=rt is None)
+    pipe.set_origin(start_at)
+    dispatch = rt.loop.call_soon_threadsafe if rt else (lambda fn, *a: fn(*a))
+    finished = threading.Event()
+    def driver():
+        for i in range(n):
+            time.sleep(max(0.0, start_at + i / rate + 0.005 - time.monotonic()))
+            dispatch(player.on_note, time.monotonic() - start_at, 38, 100)
+        finished.set()
+    wall0, cpu0, ctx0 = time.monotonic(), time.process_time(), _ctx_switches()
+    threading.Thread(target=driver, daemon=True).start()
+    if not rt:
+        idle = threading.Event()
+        threading.Thread(target=lambda: idle.wait(seconds + 1.0), daemon=True).start()   # MidiInputLoop.run's idle wait
+    threads = thread_count() - 1             # not counting the stand-in driver
+    if rt:
+        async def wait():
+            while not finished.is_set():
+                await asyncio.sleep(0.2)     # the bench's own poll, standing in for waiting on Ctrl-C
+        rt.loop.run_until_complete(wait())
+    else:
+        while not finished.is_set():
+            time.sleep(0.2)                  # run_players
+    wall = time.monotonic() - wall0
+    cpu = time.process_time() - cpu0
+    ctx = _ctx_switches()
+    sched.stop(); sched.join()
+    player.close()
+    if rt: rt.close()
+    else:  idle.set()
+    e2e = pipe.stats()["null"]["e2e_ms"]
+    return {"cpu_pct": cpu / wall * 100.0, "wakeups": (ctx - ctx0) / wall if ctx is not None else 0.0,
+            "threads": threads, "e2e_p99": e2e["p99_ms"]}
+
+def bench_runtime(quick: bool) -> dict:
+    res = {}
+    for runtime in ("threads", "asyncio"):
+        r = _session(runtime, 2.0 if quick else 6.0)
+        res[f"runtime.{runtime}.cpu"] = (r["cpu_pct"], "%", False)
+        res[f"runtime.{runtime}.wakeups"] = (r["wakeups"], "/s", False)
+        res[f"runtime.{runtime}.threads"] = (r["threads"], "threads", False)
+        res[f"runtime.{runtime}.hit_to_sink_p99"] = (r["e2e_p99"], "ms", False)
+    return res
+
+def _fan_out(subs: int, records: int, stalled: int = 0) -> dict:
+    # one publisher, `subs` subscribers read by one selector thread, `stalled` that never read. With
+    # stalled clients the socket buffers are kept small, so the run really backs up and drops; the
+    # kernel still soaks up ~200 KB per stalled socket, so callers send enough records to get past it.
+    import asyncio, selectors, socket, tempfile, threading
+    from dh_types import Judgment
+    from telemetry import TelemetryServer
+    path = os.path.join(tempfile.mkdtemp(), "t.sock")
+    srv = TelemetryServer(path, snapshot_s=0, write_buffer=4096 if stalled else 64 * 1024).start()
+    sink = srv.sink("P1")
+    socks = []
+    for i in range(subs + stalled):
+        c = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        if i >= subs: c.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 4096)
+        c.connect(path)
+        c.sendall(b"json\n")
+        socks.append(c)
+    while srv.subscribers() < subs + stalled:
+        time.sleep(0.005)
+    sel = selectors.DefaultSelector()
+    for c in socks[:subs]:
+        c.setblocking(False)
+        sel.register(c, selectors.EVENT_READ)
+    want = subs * (records + 1)          # hello included
+    got = [0]
+    def read():
+        while got[0] < want:
+            for key, _ in sel.select(1.0):
+                got[0] += key.fileobj.recv(1 << 16).count(b"\n")
+    reader = threading.Thread(target=read, daemon=True)
+    reader.start()
+    recs = [Judgment(i * 0.1, "snare", "Perfect", 1.5, 90, 100, i, i, 0.0) for i in range(records)]
+    t0 = time.perf_counter()
+    for r in recs:
+        sink.handle(r)
+    publish = time.perf_counter() - t0
+    reader.join(30)
+    wall = time.perf_counter() - t0
+    asyncio.run_coroutine_threadsafe(asyncio.sleep(0), srv.loop).result(5.0)   # the last drain has returned
+    st = srv.stats()
+    srv.close()
+    for c in socks: c.close()
+    return {"publish_us": publish / records * 1e6, "fanout_us": st["drain_ms"] * 1000 / records,
+            "deliveries": got[0] / wall, "complete": got[0] >= want, "dropped": st["dropped"]}
+
+def bench_telemetry(quick: bool) -> dict:
+    from telemetry import TelemetryServer
+    from dh_types import Judgment
+    res = {}
+    records = 2000 if quick else 10000
+    for subs in ((1, 100) if quick else (1, 100, 500)):
+        r = _fan_out(subs, records)
+        res[f"telemetry.subs_{subs}.publish"] = (r["publish_us"], "us", False)
+        res[f"telemetry.subs_{subs}.fanout"] = (r["fanout_us"], "us", False)
+        res[f"telemetry.subs_{subs}.deliveries"] = (r["deliveries"], "/s", True)
+    r = _fan_out(100, max(records, 10000), stalled=10)
+    res["telemetry.stalled_10.publish"] = (r["publish_us"], "us", False)
+    res["telemetry.stalled_10.fanout"] = (r["fanout_us"], "us", False)
+    res["telemetry.stalled_10.live_complete"] = (float(r["complete"]), "bool", True)
+    res["telemetry.stalled_10.dropped"] = (r["dropped"], "records", False)
+    srv = TelemetryServer("127.0.0.1:0", snapshot_s=0)
+    srv.sink("P1")
+    rec = Judgment(12.5, "snare", "Great", -41.25, 90, 100, 123, 456, 0.0)
+    res["telemetry.bytes_per_record.json"] = (len(srv._json_hit(0, rec)), "B", False)
+    res["telemetry.bytes_per_record.bin"] = (len(srv._bin_hit(0, rec)), "B", False)
+    return res
+
+def bench_startup(quick: bool) -> dict:
+    # cold start in fresh interpreters: the light paths must not pay for NumPy, audio or pyserial
+    import subprocess, sys
+    from bench.common import ROOT
+    runs = {
+        "python": ["-c", "pass"],
+        "import_app": ["-c", "import app"],
+        "help": ["app.py", "--help"],
+        "list_ports": ["app.py", "--list-ports"],
+    }
+    res = {}
+    for name, args in runs.items():
+        def once():
+            subprocess.run([sys.executable, *args], cwd=ROOT, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, check=False)
+        res[f"startup.{name}"] = (timeit(once, repeat=3 if quick else 7)["median"] * 1000, "ms", False)
+    out = subprocess.run([sys.executable, "-c", "import sys, app; print(len(sys.modules))"], cwd=ROOT,
+                         capture_output=True, text=True, check=True).stdout
+    res["startup.import_app.modules"] = (int(out), "modules", False)
+    return res
+
+BENCHMARKS = {
+    "chart": bench_chart,
+    "tempo": bench_tempo,
+    "judge": bench_judge,
+    "scheduler": bench_scheduler,
+    "audio": bench_audio,
+    "runtime": bench_runtime,
+    "startup": bench_startup,
+    "telemetry": bench_telemetry,
+}
@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+# Latency calibration: play a click train, have the player tap along on any pad, and store the
+# robust average of (tap - click) as the profile's input offset. Judge subtracts it from every hit.
+#   python app.py --calibrate --input "Alesis Nitro" --profile alesis_nitro_pro
+
+import threading
+from bisect import bisect_left
+from statistics import median
+from typing import Optional
+from config import CALIBRATION_BPM, CALIBRATION_BEATS, COUNT_IN_BARS, BEATS_PER_BAR
+from dh_types import ExpectedHit
+from midi_time import TempoMap
+from stats import dt_histogram
+
+CAL_TPQ = 480
+
+def calibration_chart(bpm: float = CALIBRATION_BPM, beats: int = CALIBRATION_BEATS):
+    # one snare per beat after the count-in; the scheduler's metronome clicks on every one of them
+    tempo_map = TempoMap([(0, int(round(60_000_000 / bpm)))], CAL_TPQ)
+    first = int(COUNT_IN_BARS * BEATS_PER_BAR)
+    hits = [ExpectedHit(t=tempo_map.seconds_at((first + i) * CAL_TPQ), kind="snare", note=38, vel=100)
+            for i in range(beats)]
+    return hits, tempo_map
+
+def tap_offsets(taps: list[float], beats: list[float], window: float) -> list[float]:
+    # (tap - nearest beat) in ms for taps within `window` seconds of a beat
+    out = []
+    for t in taps:
+        i = bisect_left(beats, t)
+        near = min((beats[j] for j in (i - 1, i) if 0 <= j < len(beats)), key=lambda b: abs(t - b), default=None)
+        if near is not None and abs(t - near) <= window:
+            out.append((t - near) * 1000.0)
+    return out
+
+def estimate_offset(dts_ms: list[float], mad_k: float = 3.0, trim: float = 0.1) -> tuple[float, list[float]]:
+    """
+    Robust offset of a set of tap errors: drop points more than mad_k scaled MADs from the median,
+    then take the trimmed mean of the rest. Returns (offset_ms, kept samples).
+    """
+    if not dts_ms:
+        return 0.0, []
+    med = median(dts_ms)
+    mad = median(abs(d - med) for d in dts_ms) * 1.4826
+    kept = sorted(d for d in dts_ms if abs(d - med) <= max(mad_k * mad, 1.0))
+    cut = int(len(kept) * trim)
+    core = kept[cut:len(kept) - cut] or kept
+    return sum(core) / len(core), kept
+
+def run_calibration(input_name: str, profile: str, input_mode: str = "callback", audio: str = "auto",
+                    bpm: float = CALIBRATION_BPM, beats: int = CALIBRATION_BEATS,
+                    path: Optional[str] = None, on_loop=None) -> Optional[float]:
+    from midi_io import MidiInputLoop
+    from profiles import save_latency_offset
+    from scheduler import PlayScheduler
+
+    expected, tempo_map = calibration_chart(bpm, beats)
+    mixer = audio_out = None
+    if audio != "simpleaudio":
+        from audio import ClickMixer, open_backend
+        mixer = ClickMixer()
+        audio_out = open_backend(mixer, audio)
+        if audio_out: audio_out.start()
+        else:         mixer = None
+
+    taps: list[float] = []
+    lock = threading.Lock()
+    def on_note(t_song, note, vel):
+        with lock: taps.append(t_song)
+
+    loop = MidiInputLoop(input_name, mode=input_mode)
+    if on_loop: on_loop(loop)
+    scheduler = PlayScheduler()
+    print(f"Calibration: tap any pad on every click after the {COUNT_IN_BARS}-bar count-in ({beats} beats @ {bpm:g} BPM)")
+    start_at = scheduler.start(expected, tempo_map, play_click=True, start_delay=2.0, mixer=mixer, metronome=True)
+    scheduler.schedule(expected[-1].t + 1.0, loop.stop)
+    try:
+        loop.run(start_at, on_note)
+    finally:
+        scheduler.stop(); scheduler.join()
+        if audio_out: audio_out.close()
+
+    beat_times = [e.t for e in expected]
+    dts = tap_offsets(taps, beat_times, window=30.0 / bpm)
+    offset, kept = estimate_offset(dts)
+    if len(kept) < max(4, beats // 3):
+        print(f"Only {len(kept)} usable taps; calibration not saved.")
+        return None
+
+    print("\nTap - click (raw):")
+    for line in dt_histogram(dts): print("  " + line)
+    print("\nTap - click (after correction):")
+    for line in dt_histogram([d - offset for d in kept]): print("  " + line)
+    print(f"\nOffset {offset:+.1f} ms from {len(kept)}/{len(dts)} taps ({len(dts) - len(kept)} outliers rejected)")
+    save_latency_offset(profile, offset, len(kept), path)
+    print(f"Saved for profile '{profile}'.")
+    return offset
@@ -1,25 +1,64 @@
-from mido import MidiFile
-from dh_types import ExpectedHit
+import heapq
+from typing import Iterator, Optional
+import numpy as np
+from mido import MidiFile, MidiTrack
+from dh_types import Chart, ExpectedHit, kind_code
 from config import GM, JUDGED_KINDS
-from midi_time import build_tempo_map, ticks_to_seconds
+from midi_time import build_tempo_map, TempoMap
 
-def extract_chart(mid: MidiFile) -> tuple[list[ExpectedHit], list[tuple[int,int]]]:
-    tpq = mid.ticks_per_beat
+# Bump whenever extract_chart's output changes so cached charts get rebuilt
+EXTRACTOR_VERSION = 1
+
+def extract_chart(mid: MidiFile) -> tuple[Chart, TempoMap]:
     tempo_map = build_tempo_map(mid)
-    exp: list[ExpectedHit] = []
+    ticks: list[int] = []
+    codes: list[int] = []
+    notes: list[int] = []
+    vels: list[int] = []
 
     for track in mid.tracks:
         abs_ticks = 0
         for msg in track:
             abs_ticks += msg.time
-            if msg.is_meta: 
+            if msg.is_meta:
                 continue
             if getattr(msg, "channel", None) != 9:  # GM drums = ch 10 -> index 9
                 continue
             if msg.type == "note_on" and msg.velocity > 0:
                 kind = GM.get(msg.note)
                 if kind in JUDGED_KINDS:
-                    t = ticks_to_seconds(abs_ticks, tpq, tempo_map)
-                    exp.append(ExpectedHit(t=t, kind=kind, note=msg.note, vel=msg.velocity))
-    exp.sort(key=lambda e: e.t)
-    return exp, tempo_map
+                    ticks.append(abs_ticks)
+                    codes.append(kind_code(kind))
+                    notes.append(msg.note)
+                    vels.append(msg.velocity)
+
+    # one vectorized tempo lookup for the whole chart, then a stable sort by time
+    secs = tempo_map.seconds_array(ticks)
+    order = np.argsort(secs, kind="stable")
+    chart = Chart.from_arrays(secs[order], np.asarray(codes, np.uint8)[order],
+                              np.asarray(notes, np.uint8)[order], np.asarray(vels, np.uint8)[order])
+    return chart, tempo_map
+
+def _track_drum_notes(track: MidiTrack, track_idx: int):
+    # (abs_tick, track_idx, seq, kind, note, vel) for judged drum hits in one track, already tick-ordered
+    abs_ticks = 0
+    for seq, msg in enumerate(track):
+        abs_ticks += msg.time
+        if msg.is_meta or getattr(msg, "channel", None) != 9:
+            continue
+        if msg.type == "note_on" and msg.velocity > 0:
+            kind = GM.get(msg.note)
+            if kind in JUDGED_KINDS:
+                yield (abs_ticks, track_idx, seq, kind, msg.note, msg.velocity)
+
+def iter_chart(mid: MidiFile, tempo_map: Optional[TempoMap] = None) -> Iterator[ExpectedHit]:
+    """
+    Lazily yields the same hits as extract_chart, in the same order, by k-way merging the
+    tracks on absolute tick. Nothing is buffered beyond one pending note per track.
+    """
+    if tempo_map is None:
+        tempo_map = build_tempo_map(mid)
+    seconds_at = tempo_map.seconds_at
+    merged = heapq.merge(*(_track_drum_notes(tr, i) for i, tr in enumerate(mid.tracks)))
+    for abs_ticks, _, _, kind, note, vel in merged:
+        yield ExpectedHit(t=seconds_at(abs_ticks), kind=kind, note=note, vel=vel)
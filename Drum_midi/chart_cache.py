@@ -0,0 +1,67 @@
+# On-disk cache of extracted charts. One .npz per (MIDI bytes, GM/JUDGED_KINDS, extractor version),
+# so a song seen before loads without touching mido. Any change to the inputs changes the key.
+
+import hashlib, os
+from pathlib import Path
+from typing import Optional
+import numpy as np
+from dh_types import Chart, ExpectedHit, KINDS, kind_code
+from config import GM, JUDGED_KINDS, CHART_CACHE_DIR
+from midi_time import TempoMap
+
+def cache_dir(path: Optional[str] = None) -> Path:
+    return Path(os.path.expanduser(path or os.environ.get("DRUM_MIDI_CACHE", CHART_CACHE_DIR)))
+
+def chart_key(midi_bytes: bytes) -> str:
+    from chart import EXTRACTOR_VERSION
+    h = hashlib.sha256(midi_bytes)
+    h.update(repr(sorted(GM.items())).encode())
+    h.update(repr(sorted(JUDGED_KINDS)).encode())
+    h.update(f"v{EXTRACTOR_VERSION}".encode())
+    return h.hexdigest()
+
+def save_chart(path: Path, expected: Chart | list[ExpectedHit], tempo_map: TempoMap):
+    chart = Chart.from_hits(expected)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(path.name + ".tmp")
+    with open(tmp, "wb") as f:
+        np.savez(f,
+            t=chart.t, kind=chart.kind, note=chart.note, vel=chart.vel,
+            kinds=np.array(KINDS, dtype="U16"),   # code table at save time; codes are remapped on load
+            tempo_ticks=np.asarray(tempo_map.ticks, np.int64),
+            tempo_us=np.asarray(tempo_map.tempos, np.int64),
+            tpq=np.int64(tempo_map.tpq))
+    os.replace(tmp, path)  # atomic: readers never see a half-written cache file
+
+def read_chart(path: Path) -> tuple[Chart, TempoMap]:
+    with np.load(path) as z:
+        remap = np.array([kind_code(k) for k in z["kinds"].tolist()], np.uint8)
+        expected = Chart.from_arrays(z["t"], remap[z["kind"]], z["note"], z["vel"])
+        tempo_map = TempoMap(list(zip(z["tempo_ticks"].tolist(), z["tempo_us"].tolist())), int(z["tpq"]))
+    return expected, tempo_map
+
+def load_chart(midi_path: str, use_cache: bool = True, rebuild: bool = False,
+               directory: Optional[str] = None) -> tuple[Chart, TempoMap]:
+    """
+    Returns (expected, tempo_map) for a MIDI file, from the cache when possible.
+    use_cache=False never reads or writes the cache; rebuild=True re-extracts and overwrites it.
+    """
+    with open(midi_path, "rb") as f:
+        data = f.read()
+    entry = cache_dir(directory) / (chart_key(data) + ".npz")
+    if use_cache and not rebuild and entry.exists():
+        try:
+            return read_chart(entry)
+        except Exception as e:
+            print(f"[WARN] Ignoring unreadable chart cache '{entry}': {e}")
+
+    import io
+    from mido import MidiFile
+    from chart import extract_chart
+    expected, tempo_map = extract_chart(MidiFile(file=io.BytesIO(data)))
+    if use_cache:
+        try:
+            save_chart(entry, expected, tempo_map)
+        except OSError as e:
+            print(f"[WARN] Could not write chart cache '{entry}': {e}")
+    return expected, tempo_map
@@ -3,8 +3,12 @@ MASTER_GAIN = 0.8
 
 # Metronome / count-in
 CLICK_HZ = 1000
+CLICK_ACCENT_HZ = 1500   # bar downbeat
 CLICK_MS = 35
 COUNT_IN_BARS = 1
+BEATS_PER_BAR = 4
+# Click stream block size (samples); smaller = lower output latency, more callbacks
+AUDIO_BLOCK = 256
 
 # Grading windows (ms)
 PERFECT_MS = 30
@@ -42,3 +46,46 @@ OUTPUT_NOTE_MAP = {
     53: 51,  # ride bell -> ride cymbal
     54: 42,  # tambourine -> hihat closed
 }
+GUIDE_CHANNEL = 9        # GM drums (channel 10)
+GUIDE_GATE_MS = 40       # guide note length: note-off this long after each note-on
+
+# Compiled chart cache (.npz per MIDI file, keyed by content hash + mapping config)
+CHART_CACHE_DIR = "~/.cache/drum_midi/charts"
+
+# Event scheduler: coarse-sleep until this close to an event, then spin (ms). Only events with
+# these labels spin: one-shot clicks (the mixer places its own); guide notes and the rest just wait.
+SCHED_SPIN_MS = 2.0
+SCHED_SPIN_LABELS = ("click",)
+
+# Arduino LED link: [0xAA, note, velocity] frames. Each judged kind flashes its pad's LED
+# (note as in DrumBlink's noteToPin); the grade sets the flash length via velocity.
+KIND_LED_NOTE = {
+    "kick": 36, "snare": 38,
+    "hihat_closed": 42, "hihat_pedal": 44, "hihat_open": 46,
+    "tom_low": 43, "tom_mid": 47, "tom_high": 50,
+    "crash": 49, "ride": 51,
+}
+GRADE_LED_VEL = {"Perfect": 110, "Great": 70, "Good": 40, "Miss": 5}
+SERIAL_HANDSHAKE_S = 4.0   # give up waiting for the firmware's ACK after this long (UNO reset ≈ 1.6 s)
+SERIAL_QUEUE = 256         # frames buffered while the port is busy; oldest dropped beyond this
+
+# LED look-ahead (--led-guide): chart notes are uploaded ahead of time and the firmware lights each
+# pad on its own clock. LED_CUE_CAPACITY must match CUE_CAPACITY in DrumBlink/src/main.cpp.
+LED_CUE_LEAD_MS = 60       # light the pad this long before its note
+LED_CUE_VEL = 50           # cue flash length as a velocity (firmware: 50 + vel ms, so 100 ms)
+LED_LOOKAHEAD_S = 2.0      # upload cues this far ahead
+LED_CUE_CAPACITY = 48      # cues the firmware can hold
+LED_CUE_BATCH = 8          # cues per frame
+LED_SYNC_EVERY_S = 1.0     # clock-sync round trip this often (a quick burst first)
+LED_STATUS_EVERY_S = 2.0   # ask the firmware for its counters and drift this often
+
+# What a full judgment sink queue does (pipeline.py)
+OVERFLOW_POLICIES = ("drop_oldest", "drop_newest", "block")
+
+# Per-device-profile input latency offsets measured by `app.py --calibrate`
+CALIBRATION_PATH = "~/.config/drum_midi/calibration.json"
+CALIBRATION_BPM = 100
+CALIBRATION_BEATS = 24
+
+# Device profiles (*.json, see device_profiles/): shipped ones, then the user's own
+PROFILE_DIRS = ("device_profiles", "~/.config/drum_midi/profiles")
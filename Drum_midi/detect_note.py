@@ -1,11 +1,16 @@
+import sys
+from pathlib import Path
 from mido import MidiFile
-path = "/Users/ethanortega/Drum_Arduino/Drum_midi/The Strokes-You Only Live Once-10-28-2025.mid"
-mid = MidiFile(path)
 
-notes = set()
-for track in mid.tracks:
-    for msg in track:
-        if msg.type == "note_on" and msg.velocity > 0 and msg.channel == 9:  # drum channel
-            notes.add(msg.note)
+# python detect_note.py [file.mid ...]   (defaults to the bundled YOLO chart; see batch.py for whole libraries)
+paths = sys.argv[1:] or [str(Path(__file__).resolve().parent / "The Strokes-You Only Live Once-10-28-2025.mid")]
+for path in paths:
+    mid = MidiFile(path)
 
-print("Drum notes found:", sorted(notes))
+    notes = set()
+    for track in mid.tracks:
+        for msg in track:
+            if msg.type == "note_on" and msg.velocity > 0 and msg.channel == 9:  # drum channel
+                notes.add(msg.note)
+
+    print(f"{path}: drum notes found:", sorted(notes))
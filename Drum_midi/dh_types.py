@@ -1,14 +1,192 @@
 from dataclasses import dataclass
-from typing import Protocol
+from typing import Iterable, NamedTuple, Optional, Protocol
+import numpy as np
+from config import JUDGED_KINDS
 
-@dataclass
+@dataclass(slots=True)
 class ExpectedHit:
+    # One chart note on its own (streamed charts, tests); whole charts are held in a Chart
     t: float       # seconds from song start
     kind: str
     note: int
     vel: int
     matched: bool = False
 
+# Kind names <-> uint8 codes. Judged kinds get fixed codes; anything else is interned on first use.
+KINDS: list[str] = sorted(JUDGED_KINDS)
+KIND_CODE: dict[str, int] = {k: i for i, k in enumerate(KINDS)}
+
+def kind_code(kind: str) -> int:
+    c = KIND_CODE.get(kind)
+    if c is None:
+        if len(KINDS) >= 255:
+            raise ValueError("too many distinct drum kinds")
+        c = KIND_CODE[kind] = len(KINDS)
+        KINDS.append(kind)
+    return c
+
+class HitView:
+    # Read-only per-note access into a Chart, with the same attributes as ExpectedHit
+    __slots__ = ("_c", "_i")
+    def __init__(self, chart: "Chart", i: int):
+        self._c = chart
+        self._i = i
+    @property
+    def t(self) -> float:   return float(self._c._t[self._i])
+    @property
+    def kind(self) -> str:  return KINDS[self._c._kind[self._i]]
+    @property
+    def note(self) -> int:  return int(self._c._note[self._i])
+    @property
+    def vel(self) -> int:   return int(self._c._vel[self._i])
+    @property
+    def matched(self) -> bool: return self._c.is_matched(self._i)
+
+    def __eq__(self, other):
+        try:
+            return (self.t, self.kind, self.note, self.vel) == (other.t, other.kind, other.note, other.vel)
+        except AttributeError:
+            return NotImplemented
+    __hash__ = None
+    def __repr__(self):
+        return f"HitView(t={self.t!r}, kind={self.kind!r}, note={self.note}, vel={self.vel}, matched={self.matched})"
+
+class Chart:
+    """
+    Struct-of-arrays chart: t float64, kind uint8 codes (see KINDS), note/vel uint8 and a matched
+    bitmap, in growable contiguous arrays. t/kind/note/vel are views of the filled part, so the
+    Judge and scheduler can search and slice them with NumPy; chart[i] gives a HitView.
+    """
+    __slots__ = ("_t", "_kind", "_note", "_vel", "_bits", "n")
+    def __init__(self, capacity: int = 0):
+        self._t = np.empty(capacity, np.float64)
+        self._kind = np.empty(capacity, np.uint8)
+        self._note = np.empty(capacity, np.uint8)
+        self._vel = np.empty(capacity, np.uint8)
+        self._bits = bytearray((capacity + 7) // 8)
+        self.n = 0
+
+    @classmethod
+    def from_arrays(cls, t, kind, note, vel) -> "Chart":
+        # kind: uint8 codes
+        c = cls(len(t))
+        c._t[:] = t; c._kind[:] = kind; c._note[:] = note; c._vel[:] = vel
+        c.n = len(t)
+        return c
+
+    @classmethod
+    def from_hits(cls, hits: Iterable) -> "Chart":
+        # from ExpectedHit-like objects, keeping their matched flags
+        if isinstance(hits, Chart):
+            return hits
+        hits = list(hits)
+        n = len(hits)
+        c = cls.from_arrays(np.fromiter((h.t for h in hits), np.float64, n),
+                            np.fromiter((kind_code(h.kind) for h in hits), np.uint8, n),
+                            np.fromiter((h.note for h in hits), np.uint8, n),
+                            np.fromiter((h.vel for h in hits), np.uint8, n))
+        m = np.fromiter((bool(getattr(h, "matched", False)) for h in hits), np.bool_, n)
+        if m.any():
+            c._bits[:] = np.packbits(m, bitorder="little").tobytes()
+        return c
+
+    @property
+    def t(self) -> np.ndarray:    return self._t[:self.n]
+    @property
+    def kind(self) -> np.ndarray: return self._kind[:self.n]
+    @property
+    def note(self) -> np.ndarray: return self._note[:self.n]
+    @property
+    def vel(self) -> np.ndarray:  return self._vel[:self.n]
+    @property
+    def nbytes(self) -> int:
+        return self.n * 11 + (self.n + 7) // 8
+
+    def is_matched(self, i: int) -> bool:
+        return bool(self._bits[i >> 3] >> (i & 7) & 1)
+
+    def set_matched(self, i: int):
+        self._bits[i >> 3] |= 1 << (i & 7)
+
+    def matched_mask(self, lo: int = 0, hi: Optional[int] = None) -> np.ndarray:
+        hi = self.n if hi is None else hi
+        b = np.unpackbits(np.frombuffer(self._bits, np.uint8, ((hi + 7) >> 3) - (lo >> 3), lo >> 3), bitorder="little")
+        return b[lo & 7:(lo & 7) + hi - lo].astype(bool)
+
+    def _reserve(self, need: int):
+        cap = len(self._t)
+        if need <= cap:
+            return
+        cap = max(need, cap * 2, 64)
+        for name in ("_t", "_kind", "_note", "_vel"):
+            old = getattr(self, name)
+            new = np.empty(cap, old.dtype)
+            new[:self.n] = old[:self.n]
+            setattr(self, name, new)
+        self._bits.extend(bytes((cap + 7) // 8 - len(self._bits)))
+
+    def extend(self, hits) -> tuple[int, int]:
+        # append a Chart or ExpectedHit-like iterable (amortized O(1) per note); returns the new index range
+        other = hits if isinstance(hits, Chart) else Chart.from_hits(hits)
+        lo, k = self.n, other.n
+        self._reserve(lo + k)
+        self._t[lo:lo + k] = other.t
+        self._kind[lo:lo + k] = other.kind
+        self._note[lo:lo + k] = other.note
+        self._vel[lo:lo + k] = other.vel
+        self.n = lo + k
+        for j in np.flatnonzero(other.matched_mask()).tolist():
+            self.set_matched(lo + j)
+        return lo, self.n
+
+    def drop_front(self, k: int):
+        # forget the first k notes; the rest move down, matched flags included
+        rest = self.n - k
+        m = self.matched_mask(k)
+        for name in ("_t", "_kind", "_note", "_vel"):
+            a = getattr(self, name)
+            a[:rest] = a[k:self.n]
+        bits = np.packbits(m, bitorder="little").tobytes()
+        self._bits[:] = bits + bytes(len(self._bits) - len(bits))
+        self.n = rest
+
+    def fresh(self) -> "Chart":
+        # copy with every note unmatched (e.g. to judge the same chart again)
+        return Chart.from_arrays(self.t, self.kind, self.note, self.vel)
+
+    def __len__(self):
+        return self.n
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            lo, hi, step = i.indices(self.n)
+            if step != 1:
+                raise ValueError("Chart slices must be contiguous")
+            c = Chart.from_arrays(self._t[lo:hi], self._kind[lo:hi], self._note[lo:hi], self._vel[lo:hi])
+            for j in np.flatnonzero(self.matched_mask(lo, hi)).tolist():
+                c.set_matched(j)
+            return c
+        if i < 0: i += self.n
+        if not 0 <= i < self.n:
+            raise IndexError("chart index out of range")
+        return HitView(self, i)
+
+    def __iter__(self):
+        return (HitView(self, i) for i in range(self.n))
+
+    def __eq__(self, other):
+        if isinstance(other, Chart):
+            return (self.n == other.n and np.array_equal(self.t, other.t) and np.array_equal(self.kind, other.kind)
+                    and np.array_equal(self.note, other.note) and np.array_equal(self.vel, other.vel))
+        try:
+            return len(other) == self.n and all(a == b for a, b in zip(self, other))
+        except TypeError:
+            return NotImplemented
+    __hash__ = None
+
+    def __repr__(self):
+        return f"Chart({self.n} notes)"
+
 @dataclass
 class PerHitScore:
     kind: str
@@ -16,8 +194,33 @@ class PerHitScore:
     vel: int
     vel_target: int
     grade: str
+    t: float = 0.0     # hit time (song seconds, after the latency offset)
+
+class Judgment(NamedTuple):
+    # One judged (or silently missed) chart note, as published by Judge
+    t_song: float      # hit time (chart time for silent misses)
+    kind: str
+    grade: str
+    dt_ms: float       # nan for silent misses
+    vel: int           # 0 for silent misses
+    vel_target: int
+    combo: int
+    idx: int           # chart index from the song start (Judge.base + position in Judge.expected)
+    t_pub: float       # time.monotonic() when published
+    note: int = -1     # incoming note (chart note for silent misses)
+    t_in: float = float("nan")   # hit time as delivered by the input, before the latency offset
+
+    @property
+    def silent(self) -> bool:
+        # chart note that was never hit
+        return self.idx >= 0 and self.dt_ms != self.dt_ms
+
+    @property
+    def extra(self) -> bool:
+        # hit that matched no chart note (grade "Extra", idx -1)
+        return self.idx < 0
 
 class Notifier(Protocol):
-    def send_grade(self, grade: str) -> None: ...
-    def send_miss_pulse(self) -> None: ...
+    def send_grade(self, grade: str, kind: Optional[str] = None) -> None: ...
+    def send_miss_pulse(self, kind: Optional[str] = None) -> None: ...
     def close(self) -> None: ...
@@ -0,0 +1,167 @@
+# Stand-in for the DrumBlink firmware on a pseudo-terminal, for exercising the serial link without
+# an Arduino. Speaks the same framed protocol as DrumBlink/src/main.cpp, LED look-ahead cues included,
+# on a millis() clock that can run `ppm` fast or slow.
+#   sim = FirmwareSim(); notifier = ArduinoNotifier(sim.port); ...; sim.flashes, sim.cues
+
+import heapq, os, threading, time, tty
+from notifier import (START, CTRL_NOTE, CTRL_PING, CTRL_SYNC, CTRL_STATUS, CTRL_CLEAR, ACK, CUE_START,
+                      TIME_START, STATUS_START)
+
+MASK28 = (1 << 28) - 1
+CUE_CAPACITY = 48          # as in main.cpp
+CUE_BATCH_MAX = 16
+LATE_MS = 2
+STALE_MS = 250
+
+def _u7(v: int, n: int) -> bytes:
+    return bytes((v >> 7 * (n - 1 - i)) & 0x7F for i in range(n))
+
+class FirmwareSim:
+    def __init__(self, boot_delay: float = 0.0, ack: bool = True, ppm: float = 0.0, cues: bool = True):
+        self.master, self.slave = os.openpty()
+        tty.setraw(self.master)
+        tty.setraw(self.slave)
+        self.port = os.ttyname(self.slave)
+        self.boot_delay = boot_delay      # like the UNO's bootloader after the port opens
+        self.ack = ack
+        self.ppm = ppm
+        self.cue_support = cues           # False: old firmware, look-ahead frames are ignored
+        self.t0 = time.monotonic()
+        self.flashes: list[tuple[float, int, int]] = []   # (time.monotonic(), note, vel)
+        self.cues: list[tuple[float, int, int, int]] = [] # fired cues: (time.monotonic(), note, vel, late ms)
+        self.pings = 0
+        self.reads = 0
+        self.fired = self.late = self.dropped = 0
+        self.drift_ms = None              # min (millis - host ms) since the last STATUS, relative to the first
+        self._drift_base = None
+        self._queue: list = []            # heap of (device ms, seq, note, vel)
+        self._seq = 0
+        self._cv = threading.Condition()
+        self._stop = False
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        threading.Thread(target=self._fire, daemon=True).start()
+
+    def millis(self) -> int:
+        return int((time.monotonic() - self.t0) * 1000.0 * (1.0 + self.ppm * 1e-6))
+
+    def host_time(self, ms: float) -> float:
+        return self.t0 + ms / 1000.0 / (1.0 + self.ppm * 1e-6)
+
+    def _reply(self, data: bytes):
+        os.write(self.master, data)
+
+    def _run(self):
+        booted_at = time.monotonic() + self.boot_delay
+        state, note = 0, 0
+        body = bytearray()
+        while not self._stop:
+            try:
+                data = os.read(self.master, 256)
+            except OSError:
+                return
+            self.reads += 1
+            if time.monotonic() < booted_at:
+                continue          # still in the bootloader: input is lost
+            for b in data:
+                if b == START:
+                    state = 1
+                elif b == CUE_START and self.cue_support:
+                    state, body = 3, bytearray()
+                elif b & 0x80:
+                    state = 0
+                elif state == 1:
+                    note, state = b & 0x7F, 2
+                elif state == 2:
+                    state = 0
+                    self._on_frame(note, b & 0x7F)
+                elif state == 3:
+                    body.append(b)
+                    if len(body) >= 9:
+                        n = body[8]
+                        if n > CUE_BATCH_MAX:
+                            state = 0; self.dropped += 1
+                        elif len(body) == 9 + 4 * n + 1:
+                            state = 0
+                            self._on_cues(body)
+
+    def _on_frame(self, note: int, vel: int):
+        if note == CTRL_NOTE:
+            if vel == CTRL_PING:
+                self.pings += 1
+                if self.ack: self._reply(bytes((ACK,)))
+            elif not self.cue_support:
+                pass
+            elif vel == CTRL_SYNC:
+                self._reply(bytes((TIME_START,)) + _u7(self.millis() & MASK28, 4))
+            elif vel == CTRL_STATUS:
+                with self._cv:
+                    free = CUE_CAPACITY - len(self._queue)
+                drift = self.drift_ms if self.drift_ms is not None else 0
+                self._reply(bytes((STATUS_START,)) + _u7(self.fired & 0x3FFF, 2) + _u7(self.late & 0x3FFF, 2) +
+                            _u7(self.dropped & 0x3FFF, 2) + _u7(max(-8192, min(8191, drift)) + 8192, 2) + bytes((free,)))
+                self.drift_ms = None
+            elif vel == CTRL_CLEAR:
+                with self._cv:
+                    self._queue.clear()
+            return
+        if vel:
+            self.flashes.append((time.monotonic(), note, vel))
+
+    def _on_cues(self, body: bytes):
+        x = 0
+        for b in body[:-1]: x ^= b
+        if x & 0x7F != body[-1]:
+            self.dropped += body[8]
+            return
+        now = self.millis()
+        base = body[0] << 21 | body[1] << 14 | body[2] << 7 | body[3]
+        host = body[4] << 21 | body[5] << 14 | body[6] << 7 | body[7]
+        off = (now - host) & MASK28
+        if off >= 1 << 27: off -= 1 << 28
+        if self._drift_base is None: self._drift_base = off
+        d = off - self._drift_base
+        if self.drift_ms is None or d < self.drift_ms: self.drift_ms = d
+        # 28-bit cue time -> full millis, nearest to now
+        at = (now & ~MASK28) | base
+        if at - now > 1 << 27: at -= 1 << 28
+        elif now - at > 1 << 27: at += 1 << 28
+        with self._cv:
+            for i in range(body[8]):
+                p = 9 + 4 * i
+                at += body[p] << 7 | body[p + 1]
+                if len(self._queue) >= CUE_CAPACITY:
+                    self.dropped += 1
+                    continue
+                self._seq += 1
+                heapq.heappush(self._queue, (at, self._seq, body[p + 2], body[p + 3]))
+            self._cv.notify()
+
+    def _fire(self):
+        # the firmware's loop(): cues go off on the device clock, whatever the host is doing
+        with self._cv:
+            while not self._stop:
+                if not self._queue:
+                    self._cv.wait(0.05)
+                    continue
+                at, _, note, vel = self._queue[0]
+                wait = self.host_time(at) - time.monotonic()
+                if wait > 0:
+                    self._cv.wait(wait)
+                    continue
+                heapq.heappop(self._queue)
+                late = self.millis() - at
+                if late > STALE_MS:
+                    self.dropped += 1
+                    continue
+                self.fired += 1
+                if late > LATE_MS: self.late += 1
+                self.cues.append((time.monotonic(), note, vel, late))
+
+    def close(self):
+        self._stop = True
+        with self._cv:
+            self._cv.notify()
+        for fd in (self.slave, self.master):
+            try: os.close(fd)
+            except OSError: pass
@@ -0,0 +1,142 @@
+# Guide-note output, compiled ahead of playback: note mapping applied, a note-off `gate` after every
+# note-on, and the whole stream kept as a time array plus packed 3-byte MIDI messages. Playing it
+# sends those bytes straight to the port; render_midi writes the same stream to a file.
+#   python app.py song.mid --input "Nitro" --output "IAC Driver Bus 1" --guide-gate 40
+#   python app.py song.mid --render-guide guide.mid
+
+import math
+import numpy as np
+from config import GUIDE_CHANNEL, GUIDE_GATE_MS, OUTPUT_NOTE_MAP
+
+NOTE_ON, NOTE_OFF = 0x90, 0x80
+CONTROL_CHANGE, ALL_NOTES_OFF = 0xB0, 123
+OUTPUT_NOTES = bytes(OUTPUT_NOTE_MAP.get(n, n) for n in range(128))
+
+def hit_columns(batch):
+    # (t, note, vel) arrays from a Chart (slice) or a list of ExpectedHit
+    if hasattr(batch, "note") and isinstance(batch.note, np.ndarray):
+        return batch.t, batch.note, batch.vel
+    n = len(batch)
+    return (np.fromiter((h.t for h in batch), np.float64, n), np.fromiter((h.note for h in batch), np.uint8, n),
+            np.fromiter((h.vel for h in batch), np.uint8, n))
+
+class GuideStream:
+    """
+    Compiles guide notes into (t, data): song seconds and 3 bytes per message, time-ordered with
+    note-offs ahead of note-ons at the same instant. A note-off falls `gate_ms` after its note-on,
+    or right at the next note-on of the same output note if that comes sooner. Chart notes come in
+    look-ahead batches (add(..., until)); note-offs past `until` are held back until the next batch
+    can cut them short, and flush() releases the rest. The caller must call add() again (with no
+    notes, if need be) by next_off(), or held note-offs go out late. release() silences whatever a
+    stop left sounding.
+    """
+    def __init__(self, out_notes: bytes = None, gate_ms: float = GUIDE_GATE_MS, channel: int = GUIDE_CHANNEL):
+        self.table = np.frombuffer(out_notes or OUTPUT_NOTES, np.uint8)
+        self.gate = gate_ms / 1000.0
+        self.on_status = NOTE_ON | channel
+        self.off_status = NOTE_OFF | channel
+        self._off_t = np.empty(0, np.float64)     # held-back note-offs
+        self._off_n = np.empty(0, np.uint8)
+        self.notes = 0
+
+    def add(self, t, notes, vels, until: float = math.inf) -> tuple[np.ndarray, bytes]:
+        t = np.asarray(t, np.float64)
+        n = self.table[np.asarray(notes, np.intp)]
+        v = np.maximum(np.asarray(vels, np.uint8), 1)          # velocity 0 would be a note-off
+        order = np.lexsort((t, n))
+        t, n, v = t[order], n[order], v[order]
+        if len(t):
+            # two chart notes mapped onto one output note at the same instant sound once
+            keep = np.ones(len(t), bool)
+            keep[1:] = (n[1:] != n[:-1]) | (t[1:] != t[:-1])
+            t, n, v = t[keep], n[keep], v[keep]
+        off = t + self.gate
+        same = n[1:] == n[:-1]
+        off[:-1][same] = np.minimum(off[:-1][same], t[1:][same])
+        held_t, held_n = self._off_t, self._off_n
+        if len(held_t) and len(t):
+            first = np.full(128, np.inf)
+            starts = np.flatnonzero(np.r_[True, ~same])
+            first[n[starts]] = t[starts]
+            held_t = np.minimum(held_t, first[held_n])
+        off_t = np.concatenate((held_t, off))
+        off_n = np.concatenate((held_n, n))
+        due = off_t <= until
+        self._off_t, self._off_n = off_t[~due], off_n[~due]
+        self.notes += len(t)
+        return self._pack(t, n, v, off_t[due], off_n[due])
+
+    def next_off(self) -> float:
+        # earliest held-back note-off, inf if none
+        return float(self._off_t.min()) if len(self._off_t) else math.inf
+
+    def add_hits(self, batch, until: float = math.inf) -> tuple[np.ndarray, bytes]:
+        return self.add(*hit_columns(batch), until=until)
+
+    def flush(self) -> tuple[np.ndarray, bytes]:
+        off_t, off_n = self._off_t, self._off_n
+        self._off_t, self._off_n = off_t[:0], off_n[:0]
+        return self._pack(off_t[:0], off_n[:0], off_n[:0], off_t, off_n)
+
+    def release(self, sounding) -> list[bytes]:
+        # a note-off for every output note flagged in `sounding` (128 bytes), then all-notes-off on
+        # the channel for anything else a sustaining module still holds; nothing if none is sounding
+        notes = np.flatnonzero(np.frombuffer(sounding, np.uint8)).tolist()
+        if not notes: return []
+        return [bytes((self.off_status, n, 0)) for n in notes] + \
+               [bytes((CONTROL_CHANGE | self.off_status & 0x0F, ALL_NOTES_OFF, 0))]
+
+    def _pack(self, t, n, v, off_t, off_n) -> tuple[np.ndarray, bytes]:
+        times = np.concatenate((off_t, t))
+        msgs = np.empty((len(times), 3), np.uint8)
+        k = len(off_t)
+        msgs[:k, 0] = self.off_status; msgs[:k, 1] = off_n; msgs[:k, 2] = 0
+        msgs[k:, 0] = self.on_status;  msgs[k:, 1] = n;     msgs[k:, 2] = v
+        order = np.lexsort((msgs[:, 0] & 0x10, times))       # offs first at the same instant
+        return times[order], msgs[order].tobytes()
+
+def frame_groups(times: np.ndarray, data: bytes):
+    # (t, (msg, ...)) per distinct time: one scheduler event per instant, messages pre-split
+    if not len(times): return
+    cuts = np.flatnonzero(np.diff(times)) + 1
+    bounds = [0, *cuts.tolist(), len(times)]
+    tl = times.tolist()
+    for a, b in zip(bounds, bounds[1:]):
+        yield tl[a], tuple(data[i:i + 3] for i in range(a * 3, b * 3, 3))
+
+def raw_sender(port):
+    """
+    send(msg_bytes) for an open mido output. The rtmidi backend takes the bytes as they are; other
+    backends get a mido.Message built once per distinct message and reused.
+    """
+    rt = getattr(port, "_rt", None)
+    if rt is not None and hasattr(rt, "send_message"):
+        return rt.send_message
+    import mido
+    cache = {}
+    def send(msg: bytes):
+        m = cache.get(msg)
+        if m is None: m = cache[msg] = mido.Message.from_bytes(msg)
+        port.send(m)
+    return send
+
+def render_midi(hits, tempo_map, path: str, out_notes: bytes = None, gate_ms: float = GUIDE_GATE_MS) -> int:
+    # the stream playback would send, as a one-track MIDI file on the song's tempo map; returns messages written
+    from mido import MidiFile, MidiTrack, Message, MetaMessage
+    g = GuideStream(out_notes, gate_ms)
+    t1, d1 = g.add_hits(hits)
+    t2, d2 = g.flush()
+    times, data = np.concatenate((t1, t2)), d1 + d2
+    ticks = np.rint(tempo_map.ticks_array(times)).astype(np.int64) if len(times) else np.empty(0, np.int64)
+    events = [(tick, 0, MetaMessage("set_tempo", tempo=tempo)) for tick, tempo in tempo_map]
+    events += [(tick, 1, Message.from_bytes(data[i * 3:i * 3 + 3])) for i, tick in enumerate(ticks.tolist())]
+    events.sort(key=lambda e: (e[0], e[1]))
+    track = MidiTrack()
+    last = 0
+    for tick, _, msg in events:
+        track.append(msg.copy(time=tick - last))
+        last = tick
+    mid = MidiFile(ticks_per_beat=tempo_map.tpq)
+    mid.tracks.append(track)
+    mid.save(path)
+    return len(times)
@@ -1,8 +1,12 @@
-import threading
+import threading, heapq, math, time
+from array import array
+from bisect import bisect_left
 from collections import defaultdict
-from dh_types import ExpectedHit, PerHitScore, Notifier
+import numpy as np
+from dh_types import Chart, ExpectedHit, KINDS, KIND_CODE, PerHitScore, Judgment
 from config import PERFECT_MS, GREAT_MS, GOOD_MS
-from typing import Optional
+from stats import RunningStats
+from typing import Optional, Protocol
 from typing import Callable
 
 def grade_for_dt(dt_ms: float) -> str:
@@ -12,55 +16,260 @@ def grade_for_dt(dt_ms: float) -> str:
     if a <= GOOD_MS:    return "Good"
     return "Miss"
 
+class JudgmentPublisher(Protocol):
+    # e.g. pipeline.JudgmentPipeline; publish() must be cheap, it runs under Judge.lock. An optional
+    # wait() runs once the lock is released: the place to hold the publisher back (overflow "block").
+    def publish(self, rec: Judgment) -> None: ...
+
+class _KindIndex:
+    # Sorted chart times of one kind, their positions in Judge.expected, a matched byte per note
+    # and the miss-sweep cursor (everything before it is already settled).
+    __slots__ = ("kind", "times", "idx", "matched", "sweep")
+    def __init__(self, kind: str):
+        self.kind = kind
+        self.times = array("d")
+        self.idx = array("q")
+        self.matched = bytearray()
+        self.sweep = 0
+
+GRADES = ("Perfect", "Great", "Good", "Miss")
+
+class KindTally:
+    # Running aggregates for one kind (or the whole song), updated in O(1) per judgment
+    __slots__ = ("dt", "abs_dt", "vel_err", "grades", "early", "late", "silent")
+    def __init__(self):
+        self.dt = RunningStats()          # signed Δt, ms: mean < 0 rushes, > 0 drags
+        self.abs_dt = 0.0                 # sum of |Δt|, ms
+        self.vel_err = RunningStats()     # vel - vel_target
+        self.grades = dict.fromkeys(GRADES, 0)
+        self.early = 0
+        self.late = 0
+        self.silent = 0                   # chart notes never hit
+
+    def add(self, dt_ms: float, vel_err: int, grade: str):
+        self.dt.add(dt_ms)
+        self.abs_dt += abs(dt_ms)
+        self.vel_err.add(vel_err)
+        self.grades[grade] += 1
+        if dt_ms < 0:   self.early += 1
+        elif dt_ms > 0: self.late += 1
+
+    def summary(self) -> dict:
+        n = self.dt.n
+        return {
+            "played": n,
+            "silent_misses": self.silent,
+            "grades": dict(self.grades),
+            "mean_dt_ms": self.dt.mean,
+            "std_dt_ms": self.dt.std,
+            "mean_abs_dt_ms": self.abs_dt / n if n else 0.0,
+            "early": self.early,
+            "late": self.late,
+            "mean_vel_err": self.vel_err.mean,
+        }
+
 class Judge:
-    def __init__(self, expected_hits: list[ExpectedHit], tol_ms: int, notifier: Optional[Notifier] = None):
-        self.expected = expected_hits
+    def __init__(self, expected_hits: Chart | list[ExpectedHit], tol_ms: int, pipeline: Optional[JudgmentPublisher] = None,
+                 offset_ms: float = 0.0, lock=None):
+        self.expected = Chart()             # own copy; matched state lives in its bitmap
+        self.base = 0                       # chart notes dropped from the front (drop_settled)
         self.tol = tol_ms / 1000.0
-        self.lock = threading.Lock()
-        self.cursor = 0
+        self.offset = offset_ms / 1000.0    # calibrated input latency, subtracted from every hit time
+        self.lock = lock or threading.Lock()   # contextlib.nullcontext() when everything runs on one event loop
+        self.kinds: dict[str, _KindIndex] = {}
+        self._pos = array("q")              # expected[i] -> its slot in kinds[expected[i].kind]
+        self._due: list[tuple[float,str]] = []  # heap: first unsettled chart time of each kind
         self.scores: list[PerHitScore] = []
         self.per_kind = defaultdict(list)
+        self.tally = defaultdict(KindTally)   # per kind
+        self.overall = KindTally()
         self.combo = 0
         self.max_combo = 0
         self.total = 0
         self.misses = 0
-        self.notifier = notifier
+        self.pipeline = pipeline
+        self._wait = getattr(pipeline, "wait", None)
+        self._h_lock = self._h_match = self._h_grade = None
+        self._index(expected_hits)
+
+    def instrument(self, stages):
+        # stats.StageStats: time spent waiting for the lock, matching, and grading + publishing
+        self._h_lock = stages.stage("judge.lock_wait")
+        self._h_match = stages.stage("judge.match")
+        self._h_grade = stages.stage("judge.grade")
+
+    def _index(self, hits):
+        # append to the chart, then split the new range by kind with NumPy
+        c = self.expected
+        base, end = c.extend(hits)
+        if end == base:
+            return
+        codes = c.kind[base:end]
+        t = c.t[base:end]
+        matched = c.matched_mask(base, end).view(np.uint8)
+        pos = np.empty(end - base, np.int64)
+        for code in np.unique(codes).tolist():
+            sel = np.flatnonzero(codes == code)
+            kind = KINDS[code]
+            ki = self.kinds.get(kind)
+            if ki is None:
+                ki = self.kinds[kind] = _KindIndex(kind)
+            first = len(ki.times)
+            pos[sel] = np.arange(first, first + len(sel))
+            ki.times.frombytes(t[sel].tobytes())
+            ki.idx.frombytes((sel + base).astype(np.int64).tobytes())
+            ki.matched.extend(matched[sel].tobytes())
+            if ki.sweep == first:
+                heapq.heappush(self._due, (ki.times[first], kind))
+        self._pos.frombytes(pos.tobytes())
+
+    def extend(self, hits: Chart | list[ExpectedHit]):
+        # Append chart notes as they are decoded (must arrive in time order, e.g. from chart.iter_chart)
+        with self.lock:
+            self._index(hits)
+
+    def sweep(self, t_song: float):
+        # settle silent misses as a hit at t_song would, without one (e.g. at the end of a practice pass)
+        with self.lock:
+            self._register_silent_misses_until(t_song)
+        if self._wait: self._wait()
+
+    def drop_settled(self):
+        """
+        Forget the chart notes before the first one still open, so a chart that keeps growing
+        (practice loops) stays bounded. Judgment.idx keeps counting from the song start.
+        """
+        with self.lock:
+            c = self.expected
+            cut = min((ki.idx[ki.sweep] if ki.sweep < len(ki.idx) else c.n for ki in self.kinds.values()), default=0)
+            if cut <= 0:
+                return
+            removed = np.zeros(256, np.int64)
+            for kind, ki in self.kinds.items():
+                r = bisect_left(ki.idx, cut)
+                removed[KIND_CODE[kind]] = r
+                idx = np.frombuffer(ki.idx, np.int64)[r:] - cut
+                del ki.times[:r]
+                del ki.matched[:r]
+                ki.idx = array("q", idx.tobytes())
+                ki.sweep -= r
+            pos = np.frombuffer(self._pos, np.int64)[cut:] - removed[c.kind[cut:]]
+            self._pos = array("q", pos.tobytes())
+            c.drop_front(cut)
+            self.base += cut
+
+    def drop_after(self, t_song: float):
+        # forget chart notes later than t_song that nobody hit: queued by the look-ahead, never played
+        with self.lock:
+            c = self.expected
+            cut = int(np.searchsorted(c.t, t_song, "right"))
+            m = np.flatnonzero(c.matched_mask(cut))
+            if len(m): cut += int(m[-1]) + 1          # a note hit early stays
+            if cut >= c.n:
+                return
+            for ki in self.kinds.values():
+                r = bisect_left(ki.idx, cut)
+                del ki.times[r:]
+                del ki.idx[r:]
+                del ki.matched[r:]
+                ki.sweep = min(ki.sweep, r)
+            del self._pos[cut:]
+            c.n = cut
+            self._due = [(ki.times[ki.sweep], k) for k, ki in self.kinds.items() if ki.sweep < len(ki.times)]
+            heapq.heapify(self._due)
 
     def _register_silent_misses_until(self, t_actual: float):
-        while self.cursor < len(self.expected) and self.expected[self.cursor].t < t_actual - self.tol:
-            if not self.expected[self.cursor].matched:
-                self.misses += 1
-                self.combo = 0
-                if self.notifier:
-                    self.notifier.send_miss_pulse()
-            self.cursor += 1
+        # Settle every kind whose next unsettled note is older than the window; others aren't touched
+        cutoff = t_actual - self.tol
+        due = self._due
+        while due and due[0][0] < cutoff:
+            _, kind = heapq.heappop(due)
+            ki = self.kinds[kind]
+            lo = ki.sweep
+            hi = bisect_left(ki.times, cutoff, lo)
+            self._settle(ki, lo, hi)
+            ki.sweep = hi
+            if hi < len(ki.times):
+                heapq.heappush(due, (ki.times[hi], kind))
+
+    def _settle(self, ki: _KindIndex, lo: int, hi: int):
+        # count (and publish) the unmatched notes in ki[lo:hi] as misses
+        missed = ki.matched.count(0, lo, hi)
+        if not missed:
+            return
+        self.misses += missed
+        self.combo = 0
+        self.overall.silent += missed
+        self.tally[ki.kind].silent += missed
+        if self.pipeline:
+            now = time.monotonic()
+            for j in range(lo, hi):
+                if not ki.matched[j]:
+                    e = self.expected[ki.idx[j]]
+                    self.pipeline.publish(Judgment(e.t, e.kind, "Miss", math.nan, 0, e.vel, 0, self.base + ki.idx[j], now, e.note))
+
+    def _find_match(self, kind: str, t_actual: float) -> Optional[int]:
+        ki = self.kinds.get(kind)
+        if ki is None:
+            return None
+        j = self._closest_unmatched(ki, t_actual)
+        return None if j is None else ki.idx[j]
+
+    def _closest_unmatched(self, ki: _KindIndex, t_actual: float) -> Optional[int]:
+        # Walk outward from t_actual in this kind's times; O(log n) plus already-matched neighbours
+        times, matched, tol = ki.times, ki.matched, self.tol
+        mid = bisect_left(times, t_actual, ki.sweep)
+        left = mid - 1
+        while left >= ki.sweep and matched[left] and t_actual - times[left] <= tol:
+            left -= 1
+        right = mid
+        n = len(times)
+        while right < n and matched[right] and times[right] - t_actual <= tol:
+            right += 1
+        best = None
+        if left >= ki.sweep and not matched[left] and t_actual - times[left] <= tol:
+            best = left
+        if right < n and not matched[right] and times[right] - t_actual <= tol:
+            if best is None or times[right] - t_actual < t_actual - times[best]:
+                best = right
+        return best
 
     def register_hit(self, t_actual: float, note: int, vel: int, note_to_kind: Callable[[int], Optional[str]]):
-        kind = note_to_kind.get(note)
+        self._register_hit(t_actual, note, vel, note_to_kind)
+        if self._wait: self._wait()
+
+    def _register_hit(self, t_actual: float, note: int, vel: int, note_to_kind: Callable[[int], Optional[str]]):
+        kind = note_to_kind(note)
         if not kind:
             return
+        t_in = t_actual
+        t_actual -= self.offset
+        timed = self._h_lock is not None
+        if timed: t0 = time.perf_counter()
         with self.lock:
+            if timed:
+                t1 = time.perf_counter()
+                self._h_lock.add(t1 - t0)
             self._register_silent_misses_until(t_actual)
 
-            best_idx, best_dt = None, None
-            lo = max(0, self.cursor - 20)
-            hi = min(len(self.expected), self.cursor + 50)
-            for i in range(lo, hi):
-                e = self.expected[i]
-                if e.matched or e.kind != kind:
-                    continue
-                dt = t_actual - e.t
-                if abs(dt) <= self.tol:
-                    if best_dt is None or abs(dt) < abs(best_dt):
-                        best_idx, best_dt = i, dt
-
-            if best_idx is None:
+            i = self._find_match(kind, t_actual)
+            if timed:
+                t2 = time.perf_counter()
+                self._h_match.add(t2 - t1)
+            if i is None:
                 self.combo = 0
+                if self.pipeline:
+                    self.pipeline.publish(Judgment(t_actual, kind, "Extra", math.nan, vel, 0, 0, -1, time.monotonic(), note, t_in))
                 return
 
-            e = self.expected[best_idx]
-            e.matched = True
-            dt_ms = best_dt * 1000.0
+            c = self.expected
+            c.set_matched(i)
+            ki = self.kinds[kind]
+            p = self._pos[i]
+            ki.matched[p] = 1
+            t_e = ki.times[p]
+            vel_target = int(c._vel[i])
+            dt_ms = (t_actual - t_e) * 1000.0
             grade = grade_for_dt(dt_ms)
             if grade == "Miss":
                 self.combo = 0
@@ -69,33 +278,38 @@ class Judge:
                 self.combo += 1
                 self.max_combo = max(self.max_combo, self.combo)
 
-            if self.notifier:
-                self.notifier.send_grade(grade)
-
-            result = PerHitScore(kind=e.kind, dt_ms=dt_ms, vel=vel, vel_target=e.vel, grade=grade)
+            result = PerHitScore(kind=kind, dt_ms=dt_ms, vel=vel, vel_target=vel_target, grade=grade, t=t_actual)
             self.scores.append(result)
-            self.per_kind[e.kind].append(result)
+            self.per_kind[kind].append(result)
+            self.overall.add(dt_ms, vel - vel_target, grade)
+            self.tally[kind].add(dt_ms, vel - vel_target, grade)
             self.total += 1
-            print(f"[{e.kind:12s}] {grade:7s}  Δt={dt_ms:+6.1f} ms   vel={vel:3d} (target≈{e.vel:3d})   combo={self.combo}")
+            if self.pipeline:
+                self.pipeline.publish(Judgment(t_actual, kind, grade, dt_ms, vel, vel_target, self.combo, self.base + i, time.monotonic(), note, t_in))
+            if timed: self._h_grade.add(time.perf_counter() - t2)
+
+    def snapshot(self) -> dict:
+        # Live view of the running aggregates; cheap enough to poll while playing
+        with self.lock:
+            return {
+                "combo": self.combo,
+                "max_combo": self.max_combo,
+                "misses": self.misses,
+                "overall": self.overall.summary(),
+                "per_kind": {k: t.summary() for k, t in self.tally.items()},
+            }
 
     def finalize(self):
+        self.sweep(float("inf"))
         with self.lock:
-            for i in range(self.cursor, len(self.expected)):
-                if not self.expected[i].matched:
-                    self.misses += 1
-                    self.combo = 0
-                    if self.notifier:
-                        self.notifier.send_miss_pulse()
-
-            acc = sum(1 for s in self.scores if s.grade in ("Perfect","Great","Good"))
-            perfects = sum(1 for s in self.scores if s.grade == "Perfect")
-            avg_abs_dt = (sum(abs(s.dt_ms) for s in self.scores)/len(self.scores)) if self.scores else 0.0
+            g = self.overall.grades
+            n = self.overall.dt.n
             return {
-                "played": len(self.scores),
-                "notes_in_chart": len(self.expected),
-                "hits_landed": acc,
-                "perfects": perfects,
+                "played": n,
+                "notes_in_chart": self.base + len(self.expected),
+                "hits_landed": g["Perfect"] + g["Great"] + g["Good"],
+                "perfects": g["Perfect"],
                 "misses": self.misses,
-                "avg_abs_dt_ms": avg_abs_dt,
+                "avg_abs_dt_ms": self.overall.abs_dt / n if n else 0.0,
                 "max_combo": self.max_combo,
             }
@@ -0,0 +1,112 @@
+# Several e-drum kits judged against the same song at once. Each Player owns its whole input path
+# (rtmidi callback thread -> Judge -> judgment pipeline threads -> Arduino), so nothing a slow
+# consumer does on one kit can hold up another; they share only the scheduler's clock and chart.
+
+import threading, time
+from typing import Optional
+from judge import Judge
+from midi_io import MidiInputLoop
+from pipeline import JudgmentPipeline
+from stats import LatencyStats, thread_count
+
+class Player:
+    def __init__(self, name: str, input_name: str, profile, judge: Judge, pipeline: JudgmentPipeline,
+                 notifier=None, input_mode: str = "callback", offset_ms: float = 0.0):
+        self.name = name
+        self.input_name = input_name
+        self.profile = profile
+        self.judge = judge
+        self.pipeline = pipeline
+        self.notifier = notifier
+        self.offset_ms = offset_ms
+        self.loop = MidiInputLoop(input_name, mode=input_mode, profile=profile)
+        self.handle = LatencyStats()      # time spent judging each hit on the input thread
+        self.events = 0
+        self.first_event = None
+        self.last_event = None
+        self._stopped = False
+        self._thread: Optional[threading.Thread] = None
+        self.stats: Optional[dict] = None
+        self.error: Optional[str] = None
+        self.start_at = 0.0
+        self.h_input = self.h_handle = None
+
+    def instrument(self, stages):
+        # attach stats.StageStats histograms along this kit's whole path, input to LED
+        self.loop.h_deliver = stages.stage("midi.deliver")
+        self.h_input = stages.stage("input→judge")
+        self.h_handle = stages.stage("judge.total")
+        self.judge.instrument(stages)
+        self.pipeline.instrument(stages)
+        if self.notifier: self.notifier.instrument(stages)
+
+    def on_note(self, t_song: float, note: int, vel: int):
+        if self.h_input: self.h_input.add(time.monotonic() - self.start_at - t_song)
+        t0 = time.perf_counter()
+        self.judge.register_hit(t_song, note, vel, self.profile.kind_of)   # looked up per hit: the hi-hat pedal swaps it
+        t1 = time.perf_counter()
+        self.handle.add(t1 - t0)
+        if self.h_handle: self.h_handle.add(t1 - t0)
+        self.events += 1
+        if self.first_event is None: self.first_event = t1
+        self.last_event = t1
+
+    def _run(self, start_at: float):
+        try:
+            self.loop.run(start_at, self.on_note)
+        except Exception as e:
+            # one kit's port failing must not take the others down
+            self.error = f"{type(e).__name__}: {e}"
+            print(f"[WARN] {self.name}: input '{self.input_name}' failed: {self.error}")
+
+    def start(self, start_at: float):
+        self.start_at = start_at
+        self._thread = threading.Thread(target=self._run, args=(start_at,), name=f"input-{self.name}", daemon=True)
+        self._thread.start()
+
+    def alive(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def stop(self):
+        self._stopped = True
+        self.loop.stop()
+
+    def close(self) -> dict:
+        if self._thread: self._thread.join(2.0)
+        self.stats = self.judge.finalize()
+        self.pipeline.close()
+        if self.notifier: self.notifier.close()
+        return self.stats
+
+    def input_stats(self) -> dict:
+        span = (self.last_event - self.first_event) if self.events > 1 else 0.0
+        return {
+            **self.loop.stats(),
+            "events": self.events,
+            "events_per_s": (self.events - 1) / span if span > 0 else 0.0,
+            "handle_ms": self.handle.summary(),
+        }
+
+def run_players(players: list[Player], start_at: float, poll: float = 0.2, every=None) -> dict:
+    # start every input, then wait until all have stopped (stop() from a signal handler ends them);
+    # every=(seconds, fn) also calls fn periodically from this thread
+    wall0, cpu0 = time.monotonic(), time.process_time()
+    for p in players:
+        p.start(start_at)
+    threads = thread_count()
+    next_call = wall0 + every[0] if every else float("inf")
+    while any(p.alive() for p in players):
+        time.sleep(poll)
+        if time.monotonic() >= next_call:
+            every[1]()
+            next_call += every[0]
+    wall = time.monotonic() - wall0
+    return {"wall_s": wall, "cpu_pct": (time.process_time() - cpu0) / wall * 100.0 if wall > 0 else 0.0, "threads": threads}
+
+def aggregate(stats: list[dict]) -> dict:
+    total = {k: sum(s[k] for s in stats) for k in ("played", "hits_landed", "perfects", "misses")}
+    played = total["played"]
+    total["avg_abs_dt_ms"] = sum(s["avg_abs_dt_ms"] * s["played"] for s in stats) / played if played else 0.0
+    total["max_combo"] = max((s["max_combo"] for s in stats), default=0)
+    total["players"] = len(stats)
+    return total
@@ -0,0 +1,297 @@
+# LED look-ahead: chart notes go to the Arduino up to LED_LOOKAHEAD_S early, timed on the firmware's
+# millis() clock, and DrumBlink lights the "next hit" pads itself. Serial jitter and host load no
+# longer reach the light show; the host only has to stay a couple of seconds ahead.
+#   python app.py song.mid --input "Nitro" --serial usbmodem --led-guide
+#
+# The host keeps the device clock as offset + drift from SYNC round trips (the fastest recent one
+# wins, NTP style); the firmware measures its own drift against the host stamp in every cue frame.
+
+import functools, threading, time
+from collections import deque
+import numpy as np
+from config import (KIND_LED_NOTE, LED_CUE_BATCH, LED_CUE_CAPACITY, LED_CUE_LEAD_MS, LED_CUE_VEL,
+                    LED_LOOKAHEAD_S, LED_STATUS_EVERY_S, LED_SYNC_EVERY_S)
+from dh_types import KINDS
+from notifier import (ACK, CTRL_CLEAR, CTRL_NOTE, CTRL_STATUS, CTRL_SYNC, CUE_START, FALLBACK_NOTE, STATUS_START, TIME_START,
+                      encode_frame)
+
+MASK28 = (1 << 28) - 1
+MAX_DT = (1 << 14) - 1
+SYNC = encode_frame(CTRL_NOTE, CTRL_SYNC)
+STATUS = encode_frame(CTRL_NOTE, CTRL_STATUS)
+CLEAR = encode_frame(CTRL_NOTE, CTRL_CLEAR)
+REPLY_LEN = {TIME_START: 4, STATUS_START: 9}
+SYNC_BURST = 4             # round trips taken back to back before uploading anything
+SYNC_TIMEOUT_S = 0.25      # a SYNC unanswered this long is lost (round trips are a few ms)
+SYNC_GIVE_UP = 5           # lost SYNCs, none ever answered: the firmware has no look-ahead support
+PUMP_S = 0.1
+
+def u28(v: int) -> bytes:
+    v &= MASK28
+    return bytes((v >> 21 & 0x7F, v >> 14 & 0x7F, v >> 7 & 0x7F, v & 0x7F))
+
+def u14(v: int) -> bytes:
+    return bytes((v >> 7 & 0x7F, v & 0x7F))
+
+def unpack7(b) -> int:
+    v = 0
+    for x in b: v = v << 7 | x
+    return v
+
+def encode_cues(cues: list[tuple[int, int, int]], host_ms: int) -> bytes:
+    # cues: time-ordered (device ms, note, vel), at most LED_CUE_BATCH and < 16.4 s apart
+    base = cues[0][0]
+    body = bytearray(u28(base) + u28(host_ms))
+    body.append(len(cues))
+    prev = base
+    for at, note, vel in cues:
+        body += u14(at - prev)
+        body.append(note & 0x7F); body.append(vel & 0x7F)
+        prev = at
+    x = 0
+    for b in body: x ^= b
+    return bytes((CUE_START,)) + bytes(body) + bytes((x & 0x7F,))
+
+class ReplyParser:
+    # firmware -> host bytes: bare ACKs, TIME and STATUS frames
+    def __init__(self):
+        self.buf = bytearray()
+        self.need = 0
+        self.acks = 0
+
+    def feed(self, data: bytes) -> list[tuple[int, bytes]]:
+        out = []
+        for b in data:
+            if b & 0x80:
+                self.need = REPLY_LEN.get(b, 0)
+                self.buf = bytearray((b,))
+            elif self.need:
+                self.buf.append(b)
+                if len(self.buf) > self.need:
+                    out.append((self.buf[0], bytes(self.buf[1:])))
+                    self.need = 0
+            elif b == ACK:
+                self.acks += 1
+        return out
+
+class ClockSync:
+    """
+    Host monotonic seconds -> device milliseconds. Each SYNC round trip gives an offset (device ms
+    minus host ms at the midpoint); the estimate is the one from the fastest of the last few round
+    trips, and once there is a few seconds of them, the least-squares drift over the last `history`
+    carries it forward.
+    """
+    def __init__(self, window: int = 8, history: int = 64):
+        self.window = window
+        self.samples: deque = deque(maxlen=history)   # (host mid s, offset ms, rtt ms)
+        self.count = 0
+        self.ppm = 0.0
+        self._first = None                  # fastest of the first few: drift_ms is measured from it
+        self._last_raw = None
+        self._dev = 0
+
+    def add(self, sent: float, received: float, dev_raw: int):
+        if self._last_raw is None:
+            self._dev = dev_raw
+        else:
+            self._dev += (dev_raw - self._last_raw) & MASK28       # unwrap the 28-bit counter
+        self._last_raw = dev_raw
+        mid = (sent + received) / 2.0
+        x = (mid, self._dev - mid * 1000.0, (received - sent) * 1000.0)
+        self.samples.append(x)
+        self.count += 1
+        if self.count <= 4 and (self._first is None or x[2] < self._first[2]):
+            self._first = x
+        s = self.samples
+        if len(s) >= 4 and s[-1][0] - s[0][0] >= 1.0:
+            a = np.array(s)
+            good = a[:, 2] <= a[:, 2].min() + 2.0
+            if good.sum() >= 3:
+                h, o = a[good, 0], a[good, 1]
+                if np.ptp(h) > 0:
+                    self.ppm = float(np.polyfit(h, o, 1)[0]) * 1000.0       # ms per s -> ppm
+
+    def best(self) -> tuple[float, float, float]:
+        s = self.samples
+        return min((s[i] for i in range(max(0, len(s) - self.window), len(s))), key=lambda x: x[2])
+
+    def device_ms(self, host_s: float) -> float:
+        mid, off, _ = self.best()
+        return host_s * 1000.0 + off + self.ppm * 1e-6 * (host_s - mid) * 1000.0
+
+    def summary(self) -> dict:
+        s = self.samples
+        if not s:
+            return {"samples": 0}
+        rtt = sorted(x[2] for x in s)
+        last = min((s[i] for i in range(max(0, len(s) - 4), len(s))), key=lambda x: x[2])
+        return {"samples": self.count, "rtt_ms_min": rtt[0], "rtt_ms_p50": rtt[len(rtt) // 2],
+                "drift_ppm": self.ppm, "drift_ms": last[1] - self._first[1]}
+
+class LedGuide:
+    """
+    Streams chart notes to DrumBlink as cues. add() takes song-time batches (a Chart slice or a
+    list of ExpectedHit, e.g. from PlayScheduler's on_expected) at any time; once start() has the
+    session's start time and a scheduler to run on, a pump every PUMP_S keeps the clock synced
+    and uploads whatever falls within `lookahead`, never more than `capacity` cues outstanding on
+    the device. Each pad lights `lead_ms` before its note. close() clears what the device still holds.
+    """
+    def __init__(self, link, lead_ms: float = LED_CUE_LEAD_MS, lookahead: float = LED_LOOKAHEAD_S,
+                 capacity: int = LED_CUE_CAPACITY, batch: int = LED_CUE_BATCH, vel: int = LED_CUE_VEL,
+                 clock=time.monotonic):
+        self.link = link
+        self.lead = lead_ms / 1000.0
+        self.lookahead = lookahead
+        self.capacity = capacity
+        self.batch = batch
+        self.vel = vel
+        self.clock = clock
+        self.sync = ClockSync()
+        self.parser = ReplyParser()
+        self.device: dict = {}              # last STATUS from the firmware
+        self._lock = threading.Lock()
+        self._pending: deque = deque()      # (song s, note) not uploaded yet
+        self._onboard: deque = deque()      # device ms of written cues that haven't fired
+        self._inflight = 0                  # cues queued on the link, not written yet
+        self._led_note = [KIND_LED_NOTE.get(k, FALLBACK_NOTE) for k in KINDS]
+        self._sync_sent = None
+        self._next_sync = self._next_status = 0.0
+        self._unanswered = 0
+        self.start_at = None
+        self._started = 0.0
+        self._schedule = None
+        self._armed = False
+        self.disabled = False
+        self.cues = self.frames = self.bytes = self.skipped = self.lost = self.max_onboard = 0
+        link.listen(self.on_data)
+
+    def add(self, batch):
+        if self.disabled: return
+        if hasattr(batch, "kind") and not isinstance(batch, list):
+            notes = [self._led_note[c] for c in batch.kind.tolist()]
+            self._pending.extend(zip(batch.t.tolist(), notes))
+        else:
+            self._pending.extend((h.t, KIND_LED_NOTE.get(h.kind, FALLBACK_NOTE)) for h in batch)
+        self._arm()
+
+    def start(self, start_at: float, schedule):
+        # schedule(t_song, fn, label=...) is PlayScheduler.schedule
+        self.start_at = start_at
+        self._started = self.clock()
+        self._schedule = schedule
+        self._arm()
+
+    def _arm(self):
+        if self._schedule and not self._armed and not self.disabled:
+            self._armed = True
+            self._schedule(self.clock() + PUMP_S - self.start_at, self.pump, label="leds")
+
+    def pump(self):
+        self._armed = False
+        if self.disabled: return
+        now = self.clock()
+        link = self.link
+        if link.ready.is_set():
+            if self._sync_sent is not None and now - self._sync_sent > SYNC_TIMEOUT_S:
+                self._sync_sent = None                      # lost: try again
+                self._unanswered += 1
+                if self._unanswered >= SYNC_GIVE_UP and not self.sync.count:
+                    self._give_up("[WARN] Arduino doesn't answer clock sync (old firmware?); LED guide off.")
+                    return
+            if self._sync_sent is None and now >= self._next_sync:
+                self._sync_sent = now                       # before the write: the reply can beat us back
+                if link.send_bytes(SYNC):
+                    self._next_sync = now + (0.0 if self.sync.count < SYNC_BURST else LED_SYNC_EVERY_S)
+                else:
+                    self._sync_sent = None
+            if self.sync.count >= SYNC_BURST:
+                if now >= self._next_status and link.send_bytes(STATUS):
+                    self._next_status = now + LED_STATUS_EVERY_S
+                self._upload(now)
+        elif now - self._started > link.handshake_s + 1.0:
+            self._give_up("[WARN] Arduino link never came up; LED guide off.")
+            return
+        if self._pending or self._onboard or not link.ready.is_set():
+            self._arm()
+
+    def _give_up(self, msg: str):
+        print(msg)
+        self.disabled = True
+        self._pending.clear()
+
+    def _upload(self, now: float):
+        with self._lock:
+            dev_now = self.sync.device_ms(now)
+            onboard = self._onboard
+            while onboard and onboard[0] <= dev_now:
+                onboard.popleft()
+            pending, cues, taken = self._pending, [], []
+            horizon = now + self.lookahead
+            # few, full frames: wait for a frame's worth of cues unless the next one is getting close
+            if not pending: return
+            lead_in = self.start_at - self.lead
+            if lead_in + pending[0][0] > now + self.lookahead / 4 and \
+                    (len(pending) < self.batch or lead_in + pending[self.batch - 1][0] > horizon):
+                return
+            while pending and len(onboard) + self._inflight + len(cues) < self.capacity:
+                t_song, note = pending[0]
+                host_t = lead_in + t_song
+                if host_t > horizon: break
+                pending.popleft()
+                if host_t < now:
+                    self.skipped += 1                       # already due: too late to cue
+                    continue
+                cues.append((int(round(self.sync.device_ms(host_t))), note, self.vel))
+                taken.append((t_song, note))
+        host_ms = int(now * 1000.0)
+        i = 0
+        while i < len(cues):
+            j = i + 1
+            while j < len(cues) and j - i < self.batch and cues[j][0] - cues[j - 1][0] <= MAX_DT:
+                j += 1
+            frame = encode_cues(cues[i:j], host_ms)
+            with self._lock: self._inflight += j - i        # the write can complete before send_bytes returns
+            if not self.link.send_bytes(frame, functools.partial(self._written, cues[i:j], len(frame))):
+                # link down: the rest goes back to be retried (and skipped if it comes too late)
+                with self._lock:
+                    self._inflight -= j - i
+                    self._pending.extendleft(reversed(taken[i:]))
+                break
+            i = j
+
+    def _written(self, cues: list, size: int, ok: bool):
+        # from the link's writer: only cues whose frame reached the port count as on the device
+        with self._lock:
+            self._inflight -= len(cues)
+            if not ok:
+                self.lost += len(cues)
+                return
+            self.frames += 1
+            self.bytes += size
+            self.cues += len(cues)
+            self._onboard.extend(c[0] for c in cues)
+            if len(self._onboard) > self.max_onboard: self.max_onboard = len(self._onboard)
+
+    def close(self):
+        # stop uploading and drop the cues the device still has queued, so no pad lights after the session
+        self.disabled = True
+        self._pending.clear()
+        if self.link.ready.is_set() and self.sync.count:
+            self.link.send_bytes(CLEAR)
+
+    def on_data(self, data: bytes, t: float):
+        for kind, body in self.parser.feed(data):
+            if kind == TIME_START:
+                if self._sync_sent is not None:
+                    with self._lock:
+                        self.sync.add(self._sync_sent, t, unpack7(body))
+                    self._sync_sent = None
+            elif kind == STATUS_START:
+                self.device = {"fired": unpack7(body[0:2]), "late": unpack7(body[2:4]),
+                               "dropped": unpack7(body[4:6]), "drift_ms": unpack7(body[6:8]) - 8192,
+                               "free": body[8]}
+
+    def stats(self) -> dict:
+        return {"cues": self.cues, "frames": self.frames, "bytes": self.bytes, "skipped": self.skipped, "lost": self.lost,
+                "pending": len(self._pending), "max_onboard": self.max_onboard, "sync": self.sync.summary(),
+                "device": dict(self.device)}
@@ -1,17 +1,164 @@
-import time
+import time, threading
+from array import array
 import mido
 
+# How fast the driver→monotonic offset estimate may relax upward (covers clock drift between
+# the MIDI driver's timestamps and time.monotonic). 200 ppm = 0.2 ms per second.
+DRIFT_SLEW_PPM = 200.0
+
+class DriverClock:
+    """
+    Maps a MIDI driver's inter-message deltas onto time.monotonic().
+    The driver clock (running sum of deltas) is offset from monotonic by the callback delivery delay;
+    the smallest observed (arrival - driver time) is the best estimate of that offset, so
+    t = driver_time + min_offset, and arrival - t is how late this particular callback ran.
+    """
+    def __init__(self):
+        self.driver_t = None
+        self.offset = None
+        self.last_arrival = 0.0
+
+    def stamp(self, delta: float, arrival: float) -> tuple[float, float]:
+        # returns (estimated event time on the monotonic clock, uncertainty in seconds)
+        if self.driver_t is None:
+            self.driver_t = 0.0
+            self.offset = arrival
+        else:
+            self.driver_t += delta
+            # let the estimate drift upward slowly so a slow driver clock can't pin it in the past
+            self.offset += (arrival - self.last_arrival) * DRIFT_SLEW_PPM * 1e-6
+        self.last_arrival = arrival
+        offset_now = arrival - self.driver_t
+        if offset_now < self.offset:
+            self.offset = offset_now
+        t = self.driver_t + self.offset
+        return t, arrival - t
+
+def _find_rtmidi_port(names: list[str], wanted: str):
+    for i, n in enumerate(names):
+        if n == wanted: return i
+    w = wanted.lower()
+    for i, n in enumerate(names):
+        if w in n.lower() or n.lower() in w: return i
+    return None
+
 class MidiInputLoop:
-    def __init__(self, input_name: str):
+    """
+    mode="callback": python-rtmidi callback with driver delta timestamps (no polling, idle thread sleeps)
+    mode="poll":     mido iter_pending() every 1 ms, stamped when drained (fallback)
+    """
+    def __init__(self, input_name: str, mode: str = "callback", profile=None, dispatch=None):
         self.input_name = input_name
+        self.mode = mode
+        self.profile = profile             # profiles.DeviceProfile: velocity curve + pedal CCs
+        self.dispatch = dispatch           # e.g. loop.call_soon_threadsafe: hand hits to another thread
+        self._stopped = threading.Event()
+        self._midi_in = None
+        self.h_deliver = None              # stats.Histogram: driver timestamp -> our callback/poll
+        self.uncertainty_ms = array("f")   # per-hit timestamp uncertainty
+        self.hits = 0
+
+    def stop(self):
+        self._stopped.set()
 
     def run(self, start_at: float, on_note):
-        # on_note(t_song_seconds, note, velocity)
+        # on_note(t_song_seconds, note, velocity); returns when stop() is called
+        if self.mode == "callback" and self.open(start_at, on_note):
+            try:
+                while not self._stopped.wait(0.5):
+                    pass
+            finally:
+                self.close()
+            return
+        self.mode = "poll"
+        self._run_poll(start_at, on_note)
+
+    def open(self, start_at: float, on_note) -> bool:
+        # Start callback delivery without blocking; False if rtmidi or the port isn't available
+        try:
+            import rtmidi
+        except ImportError:
+            print("[WARN] python-rtmidi not available; falling back to polling input.")
+            return False
+        midi_in = rtmidi.MidiIn()
+        idx = _find_rtmidi_port(midi_in.get_ports(), self.input_name)
+        if idx is None:
+            print(f"[WARN] '{self.input_name}' not found via rtmidi; falling back to polling input.")
+            del midi_in
+            return False
+        # Receive everything: deltas are relative to the previous message of any type,
+        # and filtered messages could swallow time on some backends.
+        midi_in.ignore_types(sysex=False, timing=False, active_sense=False)
+        clock = DriverClock()
+        monotonic = time.monotonic
+        unc = self.uncertainty_ms
+        h_deliver = self.h_deliver
+        profile = self.profile
+        vel_lut = profile.vel_lut if profile else None
+        dispatch = self.dispatch
+
+        def callback(event, _data):
+            arrival = monotonic()
+            msg, delta = event
+            t, u = clock.stamp(delta, arrival)
+            if len(msg) < 3:
+                return
+            status = msg[0] & 0xF0
+            if status == 0x90 and msg[2] > 0:
+                self.hits += 1
+                unc.append(u * 1000.0)
+                if h_deliver: h_deliver.add(u)
+                vel = vel_lut[msg[1] << 7 | msg[2]] if vel_lut else msg[2]
+                if dispatch: dispatch(on_note, t - start_at, msg[1], vel)
+                else:        on_note(t - start_at, msg[1], vel)
+            elif status == 0xB0 and profile:
+                if dispatch: dispatch(profile.control, msg[1], msg[2])
+                else:        profile.control(msg[1], msg[2])
+
+        midi_in.open_port(idx)
+        midi_in.set_callback(callback)
+        self._midi_in = midi_in
+        print(f"Listening to: {self.input_name}  (callback, driver timestamps; press Ctrl-C to stop)")
+        return True
+
+    def close(self):
+        midi_in, self._midi_in = self._midi_in, None
+        if midi_in:
+            midi_in.cancel_callback()
+            midi_in.close_port()
+
+    def _run_poll(self, start_at: float, on_note):
         with mido.open_input(self.input_name) as port:
             print(f"Listening to: {self.input_name}  (press Ctrl-C to stop)")
-            while True:
-                for msg in port.iter_pending():
-                    if msg.type == 'note_on' and msg.velocity > 0:
-                        t_song = time.monotonic() - start_at
-                        on_note(t_song, msg.note, msg.velocity)
+            last_poll = time.monotonic()
+            while not self._stopped.is_set():
+                last_poll = self.drain(port, start_at, on_note, last_poll)
                 time.sleep(0.001)
+
+    def drain(self, port, start_at: float, on_note, last_poll: float) -> float:
+        # one poll of an open mido port; returns the time of this poll for the next call
+        profile = self.profile
+        for msg in port.iter_pending():
+            if msg.type == 'note_on' and msg.velocity > 0:
+                now = time.monotonic()
+                # the note arrived somewhere since the previous poll
+                self.hits += 1
+                self.uncertainty_ms.append((now - last_poll) * 1000.0)
+                if self.h_deliver: self.h_deliver.add(now - last_poll)
+                vel = profile.velocity(msg.note, msg.velocity) if profile else msg.velocity
+                on_note(now - start_at, msg.note, vel)
+            elif msg.type == 'control_change' and profile:
+                profile.control(msg.control, msg.value)
+        return time.monotonic()
+
+    def stats(self) -> dict:
+        u = sorted(self.uncertainty_ms)
+        if not u:
+            return {"mode": self.mode, "hits": 0}
+        return {
+            "mode": self.mode,
+            "hits": self.hits,
+            "uncertainty_ms_mean": sum(u) / len(u),
+            "uncertainty_ms_p99": u[min(len(u) - 1, int(0.99 * len(u)))],
+            "uncertainty_ms_max": u[-1],
+        }
@@ -1,35 +1,83 @@
+from bisect import bisect_right
+import numpy as np
 from mido import MidiFile, MetaMessage
 from config import DEFAULT_TEMPO_USPQN
 
-def build_tempo_map(mid: MidiFile):
+class TempoMap:
+    """
+    Tempo changes indexed by tick, with the elapsed seconds precomputed at each boundary.
+    Still behaves like the old list of (tick, tempo) pairs for existing callers.
+    """
+    def __init__(self, changes: list[tuple[int,int]], tpq: int):
+        self.tpq = tpq
+        ticks: list[int] = []
+        tempos: list[int] = []
+        for tick, tempo in sorted(changes, key=lambda x: x[0]):
+            if ticks and ticks[-1] == tick:
+                tempos[-1] = tempo          # later change at the same tick wins
+            else:
+                ticks.append(tick); tempos.append(tempo)
+        if not ticks or ticks[0] != 0:
+            ticks.insert(0, 0); tempos.insert(0, DEFAULT_TEMPO_USPQN)
+        self.ticks = ticks
+        self.tempos = tempos
+        # seconds per tick for each segment, seconds elapsed at each segment start
+        self.spt = [t / 1_000_000.0 / tpq for t in tempos]
+        secs = [0.0]
+        for i in range(1, len(ticks)):
+            secs.append(secs[-1] + (ticks[i] - ticks[i-1]) * self.spt[i-1])
+        self.secs = secs
+        self._ticks_np = np.asarray(ticks, dtype=np.int64)
+        self._secs_np = np.asarray(secs, dtype=np.float64)
+        self._spt_np = np.asarray(self.spt, dtype=np.float64)
+
+    # list-of-pairs compatibility
+    def __len__(self): return len(self.ticks)
+    def __getitem__(self, i): return (self.ticks[i], self.tempos[i])
+    def __iter__(self): return iter(zip(self.ticks, self.tempos))
+
+    def seconds_at(self, abs_ticks: int) -> float:
+        i = bisect_right(self.ticks, abs_ticks) - 1
+        if i < 0: i = 0
+        return self.secs[i] + (abs_ticks - self.ticks[i]) * self.spt[i]
+
+    def seconds_array(self, abs_ticks) -> np.ndarray:
+        ticks = np.asarray(abs_ticks, dtype=np.int64)
+        idx = np.searchsorted(self._ticks_np, ticks, side="right") - 1
+        np.clip(idx, 0, None, out=idx)
+        return self._secs_np[idx] + (ticks - self._ticks_np[idx]) * self._spt_np[idx]
+
+    def ticks_at(self, seconds: float) -> float:
+        i = bisect_right(self.secs, seconds) - 1
+        if i < 0: i = 0
+        return self.ticks[i] + (seconds - self.secs[i]) / self.spt[i]
+
+    def ticks_array(self, seconds) -> np.ndarray:
+        secs = np.asarray(seconds, dtype=np.float64)
+        idx = np.searchsorted(self._secs_np, secs, side="right") - 1
+        np.clip(idx, 0, None, out=idx)
+        return self._ticks_np[idx] + (secs - self._secs_np[idx]) / self._spt_np[idx]
+
+def build_tempo_map(mid: MidiFile) -> TempoMap:
     acc = 0
     tempos = [(0, DEFAULT_TEMPO_USPQN)]
-    if not mid.tracks:
-        return tempos
-    for msg in mid.tracks[0]:
-        acc += msg.time
-        if isinstance(msg, MetaMessage) and msg.type == "set_tempo":
-            tempos.append((acc, msg.tempo))
-    tempos.sort(key=lambda x: x[0])
-    return tempos
-
-def ticks_to_seconds(abs_ticks: int, tpq: int, tempo_map: list[tuple[int,int]]):
-    secs = 0.0
-    prev_tick = 0
-    prev_tempo = tempo_map[0][1]
-    for i in range(1, len(tempo_map)+1):
-        boundary = tempo_map[i][0] if i < len(tempo_map) else abs_ticks
-        if abs_ticks <= boundary:
-            dt = abs_ticks - prev_tick
-            secs += (dt / tpq) * (prev_tempo / 1_000_000.0)
-            return secs
-        dt = boundary - prev_tick
-        secs += (dt / tpq) * (prev_tempo / 1_000_000.0)
-        prev_tick = boundary
-        if i < len(tempo_map):
-            prev_tempo = tempo_map[i][1]
-    return secs
-
-def estimate_bpm(tempo_map: list[tuple[int,int]]) -> float:
+    if mid.tracks:
+        for msg in mid.tracks[0]:
+            acc += msg.time
+            if isinstance(msg, MetaMessage) and msg.type == "set_tempo":
+                tempos.append((acc, msg.tempo))
+    return TempoMap(tempos, mid.ticks_per_beat)
+
+def ticks_to_seconds(abs_ticks: int, tpq: int, tempo_map):
+    if isinstance(tempo_map, TempoMap) and tempo_map.tpq == tpq:
+        return tempo_map.seconds_at(abs_ticks)
+    return TempoMap(list(tempo_map), tpq).seconds_at(abs_ticks)
+
+def seconds_to_ticks(seconds: float, tpq: int, tempo_map):
+    if isinstance(tempo_map, TempoMap) and tempo_map.tpq == tpq:
+        return tempo_map.ticks_at(seconds)
+    return TempoMap(list(tempo_map), tpq).ticks_at(seconds)
+
+def estimate_bpm(tempo_map) -> float:
     us = tempo_map[0][1] if tempo_map else DEFAULT_TEMPO_USPQN
     return 60_000_000.0 / us
@@ -1,11 +1,34 @@
-import time
-import serial, serial.tools.list_ports
-from typing import Optional
+import time, threading
+from collections import deque
+from typing import Callable, Optional
 from dh_types import Notifier as NotifierProtocol
+from config import KIND_LED_NOTE, GRADE_LED_VEL, SERIAL_HANDSHAKE_S, SERIAL_QUEUE
+from stats import LatencyStats
+
+# Wire protocol shared with DrumBlink/src/main.cpp. Data bytes are 7-bit, so START always resyncs.
+START = 0xAA
+CTRL_NOTE = 0x7F          # [START, CTRL_NOTE, CTRL_PING] asks the firmware for an ACK
+CTRL_PING = 0x00
+CTRL_SYNC = 0x01          # firmware replies with a TIME frame (its millis())
+CTRL_STATUS = 0x02        # firmware replies with a STATUS frame (cue counters, its view of drift)
+CTRL_CLEAR = 0x03         # firmware drops every queued cue
+ACK = 0x55                # sent by the firmware on boot and in reply to a ping
+FALLBACK_NOTE = KIND_LED_NOTE["snare"]
+# LED look-ahead (led_guide.py). Multi-byte frames start with their own marker; every byte after
+# it is 7-bit, so a marker anywhere resyncs both parsers.
+CUE_START = 0xAB          # host: [CUE_START, base ms (4), host ms (4), n, n x (dt ms (2), note, vel), xor]
+TIME_START = 0xAD         # firmware: [TIME_START, millis (4)]
+STATUS_START = 0xAE       # firmware: [STATUS_START, fired (2), late (2), dropped (2), drift ms (2), free slots]
+
+def encode_frame(note: int, vel: int) -> bytes:
+    return bytes((START, note & 0x7F, vel & 0x7F))
+
+PING = encode_frame(CTRL_NOTE, CTRL_PING)
 
 def find_serial(name_like: Optional[str]) -> Optional[str]:
     if not name_like:
         return None
+    import serial.tools.list_ports
     s = name_like.lower()
     for p in serial.tools.list_ports.comports():
         combo = (p.device + " " + (p.description or "")).lower()
@@ -16,31 +39,198 @@ def find_serial(name_like: Optional[str]) -> Optional[str]:
     return None
 
 class ArduinoNotifier(NotifierProtocol):
-    def __init__(self, port: Optional[str], baud: int = 115200):
+    """
+    Non-blocking LED link. send_* only enqueue a prebuilt frame; a writer thread opens the port,
+    waits for the firmware's ACK (instead of a fixed sleep), then coalesces whatever is queued
+    into one write per wake-up. Frames sent before the link is ready are dropped, not replayed late.
+    """
+    def __init__(self, port: Optional[str], baud: int = 115200,
+                 handshake_s: float = SERIAL_HANDSHAKE_S, queue_size: int = SERIAL_QUEUE):
+        self.port = port
+        self.baud = baud
+        self.handshake_s = handshake_s
         self.ser = None
+        self.ready = threading.Event()
+        self._q: deque = deque(maxlen=queue_size)
+        self._ctl: deque = deque()     # send_bytes() frames (cues, clock sync): never evicted by grade flashes
+        self._wake = threading.Event()
+        self._closed = False
+        self._frames = {}          # (note, vel) -> encoded frame, built once
+        self.queued = 0
+        self.written = 0
+        self.writes = 0
+        self.bytes_written = 0
+        self.dropped = 0
+        self.dropped_not_ready = 0
+        self.max_depth = 0
+        self.write_latency = LatencyStats()   # duration of each ser.write
+        self.queue_latency = LatencyStats()   # enqueue -> handed to the OS
+        self.h_write = self.h_queue = None
+        self.on_data = None        # see listen()
+        self._reader = None
+        self._listen_lock = threading.Lock()
+        self._thread = None
         if port:
-            try:
-                self.ser = serial.Serial(port, baudrate=baud, timeout=0)
-                time.sleep(2.0)
-                print(f"Arduino connected on {port} @ {baud} baud")
-            except Exception as e:
-                print(f"[WARN] Could not open Arduino serial '{port}': {e}")
-
-    def send_grade(self, grade: str):
-        if not self.ser: return
+            self._thread = threading.Thread(target=self._run, name="arduino-writer", daemon=True)
+            self._thread.start()
+
+    def wait_ready(self, timeout: Optional[float] = None) -> bool:
+        return self.ready.wait(timeout)
+
+    def send_frame(self, note: int, vel: int):
+        if self._closed:
+            return
+        if not self.ready.is_set():
+            self.dropped_not_ready += 1
+            return
+        frame = self._frames.get((note, vel))
+        if frame is None:
+            frame = self._frames[(note, vel)] = encode_frame(note, vel)
+        self._enqueue(frame)
+
+    def send_bytes(self, data: bytes, on_written: Optional[Callable[[bool], None]] = None) -> bool:
+        # any pre-encoded frame(s), written whole and ahead of queued grade frames; False if not queued
+        # (link not ready or closed). The caller bounds how much it sends: this queue never drops.
+        # True only means queued: on_written(ok), from the writer, says whether the bytes reached the OS.
+        if self._closed or not self.ready.is_set():
+            return False
+        self._ctl.append((data, time.monotonic(), on_written))
+        self.queued += 1
+        self._kick()
+        return True
+
+    def _enqueue(self, data: bytes):
+        q = self._q
+        if len(q) == q.maxlen:
+            self.dropped += 1
+        q.append((data, time.monotonic(), None))
+        self.queued += 1
+        if len(q) > self.max_depth: self.max_depth = len(q)
+        self._kick()
+
+    def _kick(self):
+        # wake the writer; runtime.LoopSerialLink schedules a flush on its event loop instead
+        self._wake.set()
+
+    def send_grade(self, grade: str, kind: Optional[str] = None):
+        vel = GRADE_LED_VEL.get(grade)
+        if vel is not None:
+            self.send_frame(KIND_LED_NOTE.get(kind, FALLBACK_NOTE), vel)
+
+    def send_miss_pulse(self, kind: Optional[str] = None):
+        self.send_grade("Miss", kind)
+
+    def _handshake(self) -> bool:
+        deadline = time.monotonic() + self.handshake_s
+        next_ping = 0.0
+        while not self._closed and time.monotonic() < deadline:
+            now = time.monotonic()
+            if now >= next_ping:
+                self.ser.write(PING)
+                next_ping = now + 0.1
+            if ACK in self.ser.read(64):
+                self.ser.reset_input_buffer()
+                return True
+            time.sleep(0.01)
+        return False
+
+    def _run(self):
+        try:
+            import serial
+            self.ser = serial.Serial(self.port, baudrate=self.baud, timeout=0)
+        except Exception as e:
+            print(f"[WARN] Could not open Arduino serial '{self.port}': {e}")
+            return
         try:
-            if grade == "Perfect": self.ser.write(b'G')
-            elif grade in ("Great","Good"): self.ser.write(b'Y')
-            elif grade == "Miss": self.ser.write(b'R')
+            if self._handshake():
+                print(f"Arduino connected on {self.port} @ {self.baud} baud")
+            elif not self._closed:
+                print(f"[WARN] No handshake from '{self.port}' (old firmware?); sending anyway.")
         except Exception as e:
-            print(f"[WARN] Serial write failed: {e}")
+            print(f"[WARN] Arduino handshake failed: {e}")
+            return
+        with self._listen_lock:
+            if self.on_data: self._start_reader()
+            self.ready.set()
 
-    def send_miss_pulse(self):
-        if self.ser:
-            try: self.ser.write(b'R')
-            except: pass
+        q, ctl = self._q, self._ctl
+        while True:
+            self._wake.wait()
+            self._wake.clear()
+            if q or ctl:
+                frames = []
+                stamps = []
+                done = []
+                for src in (ctl, q):
+                    while src:
+                        try: f, t, cb = src.popleft()
+                        except IndexError: break
+                        frames.append(f); stamps.append(t)
+                        if cb: done.append(cb)
+                buf = b"".join(frames)
+                t0 = time.monotonic()
+                try:
+                    self.ser.write(buf)
+                except Exception as e:
+                    print(f"[WARN] Serial write failed: {e}")
+                    for cb in done: cb(False)
+                    continue
+                t1 = time.monotonic()
+                self.write_latency.add(t1 - t0)
+                for t in stamps: self.queue_latency.add(t1 - t)
+                if self.h_write:
+                    self.h_write.add(t1 - t0)
+                    for t in stamps: self.h_queue.add(t1 - t)
+                self.writes += 1
+                self.written += len(frames)
+                self.bytes_written += len(buf)
+                for cb in done: cb(True)
+            if self._closed and not q and not ctl:
+                return
+
+    def listen(self, on_data):
+        # on_data(bytes, time.monotonic()) gets whatever the firmware sends once the link is up (led_guide.py)
+        with self._listen_lock:
+            self.on_data = on_data
+            if self.ready.is_set(): self._start_reader()
+
+    def _start_reader(self):
+        if self._reader is None and self.ser is not None:
+            self.ser.timeout = 0.1
+            self._reader = threading.Thread(target=self._read_loop, name="arduino-reader", daemon=True)
+            self._reader.start()
+
+    def _read_loop(self):
+        ser = self.ser
+        while not self._closed:
+            try:
+                data = ser.read(ser.in_waiting or 1)
+            except Exception:
+                return
+            if data: self.on_data(data, time.monotonic())
+
+    def instrument(self, stages):
+        self.h_write = stages.stage("serial.write")
+        self.h_queue = stages.stage("serial.queue")
+
+    def stats(self) -> dict:
+        return {
+            "queued": self.queued,
+            "written": self.written,
+            "writes": self.writes,
+            "bytes": self.bytes_written,
+            "dropped": self.dropped,
+            "dropped_not_ready": self.dropped_not_ready,
+            "max_depth": self.max_depth,
+            "write_ms": self.write_latency.summary(),
+            "queue_ms": self.queue_latency.summary(),
+        }
 
     def close(self):
+        self._closed = True
+        self._wake.set()
+        if self._thread:
+            self._thread.join(2.0)
         if self.ser:
             try: self.ser.close()
             except: pass
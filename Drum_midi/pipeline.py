@@ -0,0 +1,205 @@
+# Judgment event pipeline: Judge publishes Judgment records, each sink (console, Arduino, log file)
+# consumes them on its own thread, so terminal or serial I/O never runs under Judge.lock.
+
+import json, threading, time
+from collections import deque
+from typing import Optional, Protocol
+from config import OVERFLOW_POLICIES
+from dh_types import Judgment, Notifier
+from stats import LatencyStats
+
+class Sink(Protocol):
+    name: str
+    def handle(self, rec: Judgment) -> None: ...
+    def close(self) -> None: ...
+
+class ConsoleSink:
+    name = "console"
+    def __init__(self, prefix: str = ""):
+        self.prefix = prefix        # e.g. the player's name when several kits share the terminal
+    def handle(self, rec: Judgment):
+        if rec.silent or rec.extra:
+            return
+        print(f"{self.prefix}[{rec.kind:12s}] {rec.grade:7s}  Δt={rec.dt_ms:+6.1f} ms   vel={rec.vel:3d} (target≈{rec.vel_target:3d})   combo={rec.combo}")
+    def close(self): pass
+
+class NotifierSink:
+    name = "arduino"
+    def __init__(self, notifier: Notifier):
+        self.notifier = notifier
+    def handle(self, rec: Judgment):
+        if rec.extra:  return
+        if rec.silent: self.notifier.send_miss_pulse(rec.kind)
+        else:          self.notifier.send_grade(rec.grade, rec.kind)
+    def close(self): pass
+
+class LogFileSink:
+    name = "log"
+    def __init__(self, path: str):
+        self.f = open(path, "a", encoding="utf-8")
+    def handle(self, rec: Judgment):
+        d = rec._asdict()
+        if rec.dt_ms != rec.dt_ms: d["dt_ms"] = None
+        if rec.t_in != rec.t_in:   d["t_in"] = None
+        self.f.write(json.dumps(d) + "\n")
+    def close(self):
+        self.f.close()
+
+class _Channel:
+    # Bounded single-producer/single-consumer queue feeding one sink thread, plus its counters.
+    # deque append/popleft are atomic; a small lock only makes drop_oldest's full check and append
+    # one step against the consumer's popleft, so `dropped` counts records really discarded.
+    # "block" never waits in put(), which runs under Judge.lock: the queue may run past capacity
+    # for one call's records, and the publisher waits for room in wait_for_space() after the lock.
+    def __init__(self, sink: Sink, capacity: int, overflow: str):
+        if overflow not in OVERFLOW_POLICIES:
+            raise ValueError(f"overflow must be one of {OVERFLOW_POLICIES}, got {overflow!r}")
+        self.sink = sink
+        self.capacity = capacity
+        self.overflow = overflow
+        self.q: deque = deque(maxlen=capacity if overflow == "drop_oldest" else None)
+        self._wake = threading.Event()
+        self._space = threading.Event()
+        self._lock = threading.Lock()
+        self._closing = False
+        self.published = 0
+        self.consumed = 0
+        self.dropped = 0
+        self.errors = 0
+        self.max_depth = 0
+        self.lag_sum_ms = 0.0
+        self.lag_max_ms = 0.0
+        self.origin: Optional[float] = None   # monotonic time of song t=0, once known
+        self.e2e = LatencyStats()             # hit (driver timestamp) -> sink done
+        self.h_queue = self.h_sink = self.h_e2e = None
+        self._start()
+
+    def _start(self):
+        self.thread = threading.Thread(target=self._run, name=f"sink-{self.sink.name}", daemon=True)
+        self.thread.start()
+
+    def put(self, rec: Judgment):
+        q = self.q
+        if self.overflow == "drop_oldest":
+            with self._lock:
+                if len(q) == q.maxlen: self.dropped += 1    # deque(maxlen) discards the oldest on append
+                q.append(rec)
+        elif self.overflow == "drop_newest" and len(q) >= self.capacity:
+            self.dropped += 1
+            return
+        else:
+            q.append(rec)
+        self.published += 1
+        if len(q) > self.max_depth: self.max_depth = len(q)
+        self._kick()
+
+    def wait_for_space(self):
+        # "block": the publisher, outside Judge.lock, waits until the sink is back under capacity
+        q, space = self.q, self._space
+        while len(q) >= self.capacity and not self._closing:
+            space.clear()
+            if len(q) >= self.capacity and not self._closing: space.wait()
+
+    def _kick(self):
+        self._wake.set()
+
+    def _run(self):
+        q, lock = self.q, self._lock
+        while True:
+            self._wake.wait()
+            self._wake.clear()
+            while q:
+                try:
+                    with lock: rec = q.popleft()
+                except IndexError:
+                    break
+                self._deliver(rec)
+                self._space.set()
+            if self._closing and not q:
+                return
+
+    def _deliver(self, rec: Judgment):
+        t0 = time.monotonic()
+        lag = (t0 - rec.t_pub) * 1000.0
+        self.lag_sum_ms += lag
+        if lag > self.lag_max_ms: self.lag_max_ms = lag
+        try:
+            self.sink.handle(rec)
+        except Exception as e:
+            self.errors += 1
+            if self.errors == 1:
+                print(f"[WARN] sink '{self.sink.name}' failed: {e}")
+        self.consumed += 1
+        t1 = time.monotonic()
+        if self.h_queue:
+            self.h_queue.add(t0 - rec.t_pub)
+            self.h_sink.add(t1 - t0)
+        if self.origin is not None and rec.t_in == rec.t_in:
+            self.e2e.add(t1 - self.origin - rec.t_in)
+            if self.h_e2e: self.h_e2e.add(t1 - self.origin - rec.t_in)
+
+    def close(self, timeout: Optional[float]):
+        self._closing = True
+        self._wake.set()
+        self._space.set()
+        self.thread.join(timeout)
+        try: self.sink.close()
+        except Exception: pass
+
+    def stats(self) -> dict:
+        return {
+            "published": self.published,
+            "consumed": self.consumed,
+            "dropped": self.dropped,
+            "backlog": len(self.q),
+            "max_depth": self.max_depth,
+            "lag_ms_mean": self.lag_sum_ms / self.consumed if self.consumed else 0.0,
+            "lag_ms_max": self.lag_max_ms,
+            "e2e_ms": self.e2e.summary(),
+        }
+
+class JudgmentPipeline:
+    def __init__(self, sinks=(), capacity: int = 1024, overflow: str = "drop_oldest"):
+        self.capacity = capacity
+        self.overflow = overflow
+        self.channels: list[_Channel] = []
+        self._blocking: list[_Channel] = []
+        for s in sinks:
+            self.add_sink(s)
+
+    _channel = _Channel
+
+    def add_sink(self, sink: Sink, capacity: Optional[int] = None, overflow: Optional[str] = None):
+        ch = self._channel(sink, capacity or self.capacity, overflow or self.overflow)
+        self.channels.append(ch)
+        if ch.overflow == "block": self._blocking.append(ch)
+
+    def instrument(self, stages):
+        # per sink: queue wait, handle() time and hit -> handled (stats.StageStats)
+        for ch in self.channels:
+            name = ch.sink.name
+            ch.h_queue = stages.stage(f"queue.{name}")
+            ch.h_sink = stages.stage(f"sink.{name}")
+            ch.h_e2e = stages.stage(f"hit→{name}")
+
+    def set_origin(self, start_at: float):
+        # song t=0 on the monotonic clock: lets channels measure hit -> feedback latency
+        for ch in self.channels:
+            ch.origin = start_at
+
+    def publish(self, rec: Judgment):
+        for ch in self.channels:
+            ch.put(rec)
+
+    def wait(self):
+        # Judge calls this after releasing its lock: "block" sinks hold the publisher here, not under the lock
+        for ch in self._blocking:
+            ch.wait_for_space()
+
+    def close(self, timeout: Optional[float] = 2.0):
+        # drains whatever is queued, then closes every sink
+        for ch in self.channels:
+            ch.close(timeout)
+
+    def stats(self) -> dict[str, dict]:
+        return {ch.sink.name: ch.stats() for ch in self.channels}
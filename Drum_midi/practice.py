@@ -0,0 +1,196 @@
+# Practice mode: loop a bar range at a percentage of the song's tempo, gaplessly, without
+# re-parsing the MIDI or reopening anything. The section is kept in ticks and timed from the
+# tempo map once; each pass is that timing divided by the speed in force when the pass is queued.
+#   python app.py song.mid --input "Nitro" --loop 17-20 --speed 70 --ramp 5
+
+import re, threading
+from bisect import bisect_right
+from collections import Counter
+from typing import Iterator, Optional
+import numpy as np
+from config import BEATS_PER_BAR, COUNT_IN_BARS
+from dh_types import Chart, ExpectedHit, KINDS, Judgment
+from midi_time import TempoMap
+
+def parse_bars(spec: str) -> tuple[int, int]:
+    # "17-20" -> (17, 20), "9" -> (9, 9); bars are 1-based and inclusive
+    m = re.fullmatch(r"\s*(\d+)\s*(?:-\s*(\d+))?\s*", spec)
+    if not m:
+        raise ValueError(f"bar range must look like 17-20 or 9, got {spec!r}")
+    lo, hi = int(m.group(1)), int(m.group(2) or m.group(1))
+    if lo < 1 or hi < lo:
+        raise ValueError(f"bad bar range {spec!r}")
+    return lo, hi
+
+class LoopTimeline:
+    """
+    The tempo-map interface PlayScheduler needs (tpq, seconds_at, seconds_array) over the practice
+    session's tick axis: `lead_ticks` of count-in, then ticks [t0, t1) of the song over and over.
+    Passes are timed when first looked up, at the speed `practice.speed` has then; after that they
+    never move, so a speed change lands on the next pass that isn't queued yet.
+    """
+    def __init__(self, tempo_map: TempoMap, t0: int, t1: int, lead_ticks: int, practice: "Practice"):
+        self.tempo_map = tempo_map
+        self.tpq = tempo_map.tpq
+        self.t0, self.t1 = t0, t1
+        self.span = t1 - t0
+        self.s0 = tempo_map.seconds_at(t0)
+        self.length = tempo_map.seconds_at(t1) - self.s0      # one pass at 100%
+        self.lead_ticks = lead_ticks
+        self.practice = practice
+        self.lead_speed = practice.speed / 100.0
+        self._lead_spt = tempo_map.spt[bisect_right(tempo_map.ticks, t0) - 1]
+        self.starts: list[float] = []        # song time at which each pass starts
+        self.speeds: list[float] = []        # and its speed (fraction)
+
+    def pass_at(self, k: int) -> tuple[float, float]:
+        while len(self.starts) <= k:
+            if self.starts:
+                start = self.starts[-1] + self.length / self.speeds[-1]
+            else:
+                start = self.lead_ticks * self._lead_spt / self.lead_speed
+            self.starts.append(start)
+            self.speeds.append(self.practice.speed / 100.0)
+        return self.starts[k], self.speeds[k]
+
+    def seconds_at(self, tick: int) -> float:
+        if tick < self.lead_ticks:
+            return tick * self._lead_spt / self.lead_speed
+        k, off = divmod(tick - self.lead_ticks, self.span)
+        start, speed = self.pass_at(k)
+        return start + (self.tempo_map.seconds_at(self.t0 + off) - self.s0) / speed
+
+    def seconds_array(self, ticks) -> np.ndarray:
+        return np.fromiter((self.seconds_at(int(t)) for t in ticks), np.float64, len(ticks))
+
+class PracticeSink:
+    # judgment sink: grade counts per pass, from the record's chart index; a pass is complete once
+    # every one of its notes has been judged (hit or swept as a miss)
+    name = "practice"
+    def __init__(self, practice: "Practice"):
+        self.practice = practice
+        self.n = practice.n
+        self.passes: dict[int, Counter] = {}
+
+    def handle(self, rec: Judgment):
+        if rec.extra:
+            return
+        k = rec.idx // self.n
+        c = self.passes.get(k)
+        if c is None: c = self.passes[k] = Counter()
+        c[rec.grade] += 1
+        if c.total() == self.n:
+            self.practice._judged(k)
+
+    def close(self): pass
+
+class Practice:
+    """
+    Loops bars [bar_lo, bar_hi] of a chart. hits() is the endless (or `passes`-long) chart to hand
+    PlayScheduler with on_expected=Judge.extend: every pass appends fresh copies of the section's
+    notes to each Judge. At the end of a pass its misses are swept and the Judges drop what's
+    settled, so they only ever hold about one pass; a pass is reported once every player's sink
+    has all its notes. With ramp > 0, a pass landing at least `ramp_at` of its notes raises the
+    speed by `ramp` percentage points, up to max_speed. finish() forgets notes the look-ahead
+    queued but nobody got to play before a stop.
+    """
+    def __init__(self, chart: Chart, tempo_map: TempoMap, bar_lo: int, bar_hi: int, speed: float = 100.0,
+                 ramp: float = 0.0, ramp_at: float = 0.9, max_speed: float = 100.0, passes: Optional[int] = None,
+                 tol_ms: float = 0.0, lead_bars: float = COUNT_IN_BARS):
+        self.speed = speed
+        self.ramp = ramp
+        self.ramp_at = ramp_at
+        self.max_speed = max_speed
+        self.passes = passes
+        self.tol = tol_ms / 1000.0
+        bar = BEATS_PER_BAR * tempo_map.tpq
+        t0, t1 = (bar_lo - 1) * bar, bar_hi * bar
+        # ticks back from the chart's seconds (exact up to rounding), then the section's offsets
+        ticks = np.rint(tempo_map.ticks_array(chart.t)).astype(np.int64)
+        sel = np.flatnonzero((ticks >= t0) & (ticks < t1))
+        if not len(sel):
+            raise ValueError(f"no drum notes in bars {bar_lo}-{bar_hi}")
+        self.bars = (bar_lo, bar_hi)
+        self.rel = tempo_map.seconds_array(ticks[sel]) - tempo_map.seconds_at(t0)   # seconds into the pass at 100%
+        self.kinds = [KINDS[c] for c in chart.kind[sel].tolist()]
+        self.notes = chart.note[sel].tolist()
+        self.vels = chart.vel[sel].tolist()
+        self.n = len(sel)
+        self.timeline = LoopTimeline(tempo_map, t0, t1, int(lead_bars * bar), self)
+        self.schedule = None          # PlayScheduler.schedule, for the end-of-pass report
+        self.sinks: list[PracticeSink] = []
+        self.judges = []
+        self._lock = threading.Lock()           # sinks of different players complete passes on their own threads
+        self._complete: Counter = Counter()     # pass -> sinks that have all its notes
+        self.reported: list[tuple[int, float, Counter]] = []    # (pass, speed %, grades)
+
+    def sink(self, judge) -> PracticeSink:
+        # one per player: goes on the pipeline of `judge`; pass results add up across players
+        s = PracticeSink(self)
+        self.sinks.append(s)
+        self.judges.append(judge)
+        return s
+
+    def hits(self) -> Iterator[ExpectedHit]:
+        k = 0
+        while self.passes is None or k < self.passes:
+            start, speed = self.timeline.pass_at(k)
+            if self.schedule:
+                end = start + self.length(k) + self.tol + 0.05
+                self.schedule(end, self._pass_done, end)
+            for rel, kind, note, vel in zip(self.rel.tolist(), self.kinds, self.notes, self.vels):
+                yield ExpectedHit(t=start + rel / speed, kind=kind, note=note, vel=vel)
+            k += 1
+
+    def length(self, k: int) -> float:
+        return self.timeline.length / self.timeline.pass_at(k)[1]
+
+    def grades(self, k: int) -> Counter:
+        c = Counter()
+        for s in self.sinks:
+            c.update(s.passes.get(k, {}))
+        return c
+
+    def landed(self, k: int) -> int:
+        g = self.grades(k)
+        return (g["Perfect"] + g["Great"] + g["Good"]) // max(1, len(self.sinks))
+
+    def _pass_done(self, t_song: float):
+        # the last note's window has closed: publish the pass's misses now, then let the Judges forget it
+        for j in self.judges:
+            j.sweep(t_song)
+            j.drop_settled()
+
+    def _judged(self, k: int):
+        with self._lock:
+            self._complete[k] += 1
+            if self._complete[k] < len(self.sinks):
+                return
+            del self._complete[k]
+            self._report(k)
+
+    def finish(self, t_song: float):
+        # stopped at song time t_song: notes queued for later were never played, so they don't count
+        for j in self.judges:
+            j.drop_after(t_song)
+
+    def _report(self, k: int):
+        speed = self.timeline.pass_at(k)[1] * 100.0
+        g = self.grades(k)
+        self.reported.append((k, speed, g))
+        landed = self.landed(k)
+        msg = f"Pass {k + 1} @ {speed:.0f}%: {landed}/{self.n} landed  " + \
+              "  ".join(f"{name} {g[name]}" for name in ("Perfect", "Great", "Good", "Miss") if g[name])
+        if self.ramp and landed >= self.ramp_at * self.n and self.speed < self.max_speed:
+            self.speed = min(self.max_speed, self.speed + self.ramp)
+            msg += f"  → speed {self.speed:.0f}%"
+        print(msg)
+
+    def summary(self) -> list[str]:
+        done = sorted({k for s in self.sinks for k in s.passes})
+        lines = [f"Practice: bars {self.bars[0]}-{self.bars[1]}, {self.n} notes per pass, {len(done)} passes"]
+        for k in done:
+            g = self.grades(k)
+            lines.append(f"  pass {k + 1:3d} @ {self.timeline.pass_at(k)[1] * 100:3.0f}%: {self.landed(k):3d}/{self.n} landed"
+                         f"  (P {g['Perfect']} / Gr {g['Great']} / Go {g['Good']} / M {g['Miss']})")
+        return lines
@@ -1,26 +1,146 @@
-# Simple per-device overrides to translate device notes -> GM notes.
-# Only include diffs from GM. Add/fix here as you discover mismaps.
-
-from typing import Optional
-
-ALEsis_NITRO_PRO = {
-    # examples:
-    # 39=Hand Clap -> treat as snare
-    39: 38,
-    # 52=Chinese cymbal -> treat as ride (depends on your kit layout)
-    52: 51,
-    # 59 sometimes is crash2 on some kits; keep as ride by default (config already maps 59: "ride")
-    # Add YOUR real mismaps here as you detect them:
-    # <incoming_device_note>: <target_gm_note>
-}
+# Device profiles: per-module note fixes, velocity curves and hi-hat pedal handling, loaded from
+# device_profiles/*.json and compiled into flat 128-entry tables, so translating a hit is one index.
+# Only include diffs from GM in a profile's "notes". Add/fix there as you discover mismaps.
+
+import json, os, time
+from typing import Callable, Optional
+from config import CALIBRATION_PATH, GM, OUTPUT_NOTE_MAP, PROFILE_DIRS
+
+NO_KIND = 255
+DEFAULT_PROFILE = "alesis_nitro_pro"
+
+def _profile_dirs() -> list[str]:
+    here = os.path.dirname(os.path.abspath(__file__))
+    return [os.path.join(here, os.path.expanduser(d)) for d in PROFILE_DIRS]
+
+def available_profiles() -> dict[str, str]:
+    # name -> path; later directories (the user's) override shipped profiles of the same name
+    found = {}
+    for d in _profile_dirs():
+        if os.path.isdir(d):
+            for fn in sorted(os.listdir(d)):
+                if fn.endswith(".json"):
+                    found[fn[:-5]] = os.path.join(d, fn)
+    return found
+
+def load_profile_data(name: str) -> dict:
+    path = available_profiles().get(name)
+    if path is None:
+        raise KeyError(f"unknown device profile {name!r} (have: {', '.join(sorted(available_profiles()))})")
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+def _curve(spec: Optional[dict]):
+    # velocity curve as a 128-entry table: {"gamma": g} or {"points": [[in, out], ...]}, plus "min"/"max"
+    import numpy as np
+    v = np.arange(128, dtype=np.float64)
+    spec = spec or {}
+    if "points" in spec:
+        xs, ys = zip(*spec["points"])
+        out = np.interp(v, xs, ys)
+    else:
+        out = 127.0 * (v / 127.0) ** float(spec.get("gamma", 1.0))
+    out = np.clip(np.rint(out), spec.get("min", 1), spec.get("max", 127))
+    out[0] = 0                      # velocity 0 is a note-off and stays one
+    return out.astype(np.uint8)
+
+class DeviceProfile:
+    """
+    A compiled profile. kind_lut / gm_note / out_note are 128-byte tables indexed by note, vel_lut
+    is 128x128 indexed by note << 7 | vel. kind_of(note) -> kind name or None is a bound list
+    index; the hi-hat pedal (control()) swaps which list it indexes, so callers should look up
+    profile.kind_of per hit rather than keep a reference.
+    """
+    def __init__(self, data: dict, name: str = "custom", gm: dict[int, str] = GM,
+                 output_map: dict[int, int] = OUTPUT_NOTE_MAP):
+        import numpy as np                      # deferred: listing profiles/ports shouldn't load it
+        from dh_types import KINDS, kind_code
+        self.name = name
+        self.title = data.get("name", name)
+        self.port_hint = data.get("port_hint")
+        overrides = {int(k): int(v) for k, v in data.get("notes", {}).items()}
+
+        gm_note = np.arange(128, dtype=np.uint8)
+        for src, dst in overrides.items():
+            gm_note[src] = dst
+        codes = np.full(128, NO_KIND, np.uint8)
+        for n in range(128):
+            kind = gm.get(int(gm_note[n]))
+            if kind: codes[n] = kind_code(kind)
+        self.gm_note = gm_note.tobytes()
+        self.kind_lut = codes.tobytes()
+
+        out = np.arange(128, dtype=np.uint8)
+        for src, dst in output_map.items():
+            out[src] = dst
+        for src, dst in {int(k): int(v) for k, v in data.get("output_notes", {}).items()}.items():
+            out[src] = dst
+        self.out_note = out.tobytes()
+
+        base = _curve(data.get("velocity_curve"))
+        vel = np.tile(base, (128, 1))
+        for n, spec in data.get("per_note_velocity", {}).items():
+            vel[int(n)] = _curve(spec)
+        self.vel_lut = vel.tobytes()
+
+        self._kinds = [KINDS[c] if c != NO_KIND else None for c in self.kind_lut]
+        self.kind_of: Callable[[int], Optional[str]] = self._kinds.__getitem__
+
+        # optional hi-hat openness: hat notes are re-judged as closed/open from the pedal CC
+        hh = data.get("hihat")
+        self.hihat_cc = int(hh["cc"]) if hh else None
+        self.hihat = None               # last pedal value seen; None until the pedal moves
+        if hh:
+            self._closed_at = int(hh.get("closed_at", 64))
+            hats = {int(n) for n in hh.get("notes", (42, 46))}
+            hats |= {n for n in range(128) if int(gm_note[n]) in hats}
+            self._kinds_closed = [("hihat_closed" if n in hats else k) for n, k in enumerate(self._kinds)]
+            self._kinds_open = [("hihat_open" if n in hats else k) for n, k in enumerate(self._kinds)]
+
+    @classmethod
+    def load(cls, name: str) -> "DeviceProfile":
+        return cls(load_profile_data(name), name)
+
+    def velocity(self, note: int, vel: int) -> int:
+        return self.vel_lut[note << 7 | vel]
+
+    def control(self, cc: int, value: int):
+        # feed every control change from the input; only the hi-hat pedal CC matters
+        if cc != self.hihat_cc:
+            return
+        self.hihat = value
+        self.kind_of = (self._kinds_closed if value >= self._closed_at else self._kinds_open).__getitem__
 
 def build_active_map(gm_map: dict[int, str], device_overrides: Optional[dict[int, int]]):
     """
     Returns a function that translates device note -> GM kind or None.
     If override maps a note->new_note, we resolve the kind via gm_map[new_note].
     """
-    def note_to_kind(note: int) -> Optional[str]:
-        if device_overrides and note in device_overrides:
-            note = device_overrides[note]
-        return gm_map.get(note)
-    return note_to_kind
+    return DeviceProfile({"notes": device_overrides or {}}, gm=gm_map).kind_of
+
+ALEsis_NITRO_PRO = {int(k): v for k, v in load_profile_data("alesis_nitro_pro")["notes"].items()}
+
+# Profiles selectable with app.py --profile
+PROFILES = available_profiles()
+
+def _calibration_file(path: Optional[str] = None) -> str:
+    return os.path.expanduser(path or os.environ.get("DRUM_MIDI_CALIBRATION", CALIBRATION_PATH))
+
+def load_latency_offset(profile: str, path: Optional[str] = None) -> float:
+    """Saved input latency offset (ms) for a profile; 0.0 if never calibrated."""
+    try:
+        with open(_calibration_file(path)) as f:
+            return float(json.load(f).get(profile, {}).get("offset_ms", 0.0))
+    except (OSError, ValueError):
+        return 0.0
+
+def save_latency_offset(profile: str, offset_ms: float, n: int, path: Optional[str] = None):
+    fn = _calibration_file(path)
+    try:
+        with open(fn) as f: data = json.load(f)
+    except (OSError, ValueError):
+        data = {}
+    data[profile] = {"offset_ms": round(offset_ms, 2), "taps": n, "updated": time.strftime("%Y-%m-%dT%H:%M:%S")}
+    os.makedirs(os.path.dirname(fn), exist_ok=True)
+    with open(fn, "w") as f:
+        json.dump(data, f, indent=2)
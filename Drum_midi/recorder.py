@@ -0,0 +1,126 @@
+# Append-only binary session log. Every Judgment (hits, silent misses, extra hits) becomes one
+# fixed-width record; read_records() memory-maps a whole file as a NumPy structured array.
+#   python recorder.py sessions.drec
+
+import os, sys, time
+import numpy as np
+from config import JUDGED_KINDS
+from dh_types import KINDS as _KINDS, Judgment
+
+# header: MAGIC, record size (u4), kind table length (u4), the kind table ("\n"-joined names, in code
+# order), zero padding to a multiple of 8. Kind codes only mean something against the file's table.
+MAGIC = b"DRUMREC2"
+GRADES = ("Perfect", "Great", "Good", "Miss", "Extra")
+KINDS = tuple(_KINDS[:len(JUDGED_KINDS)])        # the judged kinds' fixed codes
+GRADE_CODE = {g: i for i, g in enumerate(GRADES)}
+KIND_CODE = {k: i for i, k in enumerate(KINDS)}
+
+REC_DTYPE = np.dtype([
+    ("t_in", "<f8"),      # hit time from the input, song seconds before the latency offset (nan: silent miss)
+    ("dt_ms", "<f4"),     # nan for silent misses and extra hits
+    ("idx", "<i4"),       # chart index, -1 for extra hits
+    ("session", "<u4"),   # unix time the recorder was opened
+    ("note", "u1"),
+    ("vel", "u1"),
+    ("grade", "u1"),      # GRADES index
+    ("kind", "u1"),       # KINDS index, 255 if unknown
+])
+
+def _header() -> bytes:
+    table = "\n".join(KINDS).encode()
+    head = MAGIC + np.array([REC_DTYPE.itemsize, len(table)], "<u4").tobytes() + table
+    return head + bytes(-len(head) % 8)
+
+def _read_header(f, path: str) -> int:
+    # checks the header against this build's layout and kind table; returns where records start
+    head = f.read(len(MAGIC) + 8)
+    if head[:len(MAGIC)] != MAGIC or len(head) < len(MAGIC) + 8:
+        raise ValueError(f"{path}: not a session recording (or an older format)")
+    size, n = np.frombuffer(head, "<u4", 2, len(MAGIC)).tolist()
+    if size != REC_DTYPE.itemsize:
+        raise ValueError(f"{path}: a different record layout ({size} B records)")
+    kinds = tuple(f.read(n).decode("utf-8", "replace").split("\n")) if n else ()
+    if kinds != KINDS:
+        raise ValueError(f"{path}: recorded with a different kind table ({', '.join(kinds)})")
+    end = len(head) + n
+    return end + (-end % 8)
+
+class SessionRecorder:
+    """
+    Pipeline sink. handle() fills a preallocated structured block on the sink thread; full blocks
+    are written with one call, so the Judge never waits on the disk. Appends to an existing file.
+    """
+    name = "recorder"
+    def __init__(self, path: str, block: int = 4096, session: int | None = None):
+        self.path = path
+        self.session = int(time.time()) if session is None else session
+        self.buf = np.zeros(block, dtype=REC_DTYPE)
+        self.n = 0
+        self.records = 0
+        new = not os.path.exists(path) or os.path.getsize(path) == 0
+        if not new:
+            with open(path, "rb") as f: offset = _read_header(f, path)
+        self.f = open(path, "ab")
+        if new:
+            self.f.write(_header())
+        else:
+            # drop a torn trailing record left by a crash so the file stays aligned
+            tail = (os.path.getsize(path) - offset) % REC_DTYPE.itemsize
+            if tail: self.f.truncate(os.path.getsize(path) - tail)
+
+    def handle(self, rec: Judgment):
+        self.buf[self.n] = (rec.t_in, rec.dt_ms, rec.idx, self.session, rec.note & 0x7F if rec.note >= 0 else 0,
+                            rec.vel, GRADE_CODE.get(rec.grade, 255), KIND_CODE.get(rec.kind, 255))
+        self.n += 1
+        if self.n == len(self.buf):
+            self.flush()
+
+    def flush(self):
+        if self.n:
+            self.f.write(self.buf[:self.n].tobytes())
+            self.records += self.n
+            self.n = 0
+        self.f.flush()
+
+    def close(self):
+        self.flush()
+        self.f.close()
+
+def read_records(path: str) -> np.ndarray:
+    # Zero-copy view of every record in the file (read-only); a torn trailing record is ignored
+    size = os.path.getsize(path)
+    with open(path, "rb") as f: offset = _read_header(f, path)
+    n = (size - offset) // REC_DTYPE.itemsize
+    if n <= 0:
+        return np.zeros(0, dtype=REC_DTYPE)
+    return np.memmap(path, dtype=REC_DTYPE, mode="r", offset=offset, shape=(n,))
+
+def summarize(recs: np.ndarray) -> dict:
+    judged = recs[recs["idx"] >= 0]
+    hit = judged[~np.isnan(judged["dt_ms"])]
+    return {
+        "records": len(recs),
+        "sessions": len(np.unique(recs["session"])),
+        "hits": len(hit),
+        "silent_misses": len(judged) - len(hit),
+        "extra_hits": int((recs["idx"] < 0).sum()),
+        "grades": {g: int((recs["grade"] == i).sum()) for i, g in enumerate(GRADES)},
+        "mean_dt_ms": float(hit["dt_ms"].mean()) if len(hit) else 0.0,
+        "mean_abs_dt_ms": float(np.abs(hit["dt_ms"]).mean()) if len(hit) else 0.0,
+    }
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    if not argv:
+        print("usage: python recorder.py FILE.drec")
+        return 2
+    t0 = time.perf_counter()
+    recs = read_records(argv[0])
+    s = summarize(recs)
+    print(f"{argv[0]}: loaded in {(time.perf_counter() - t0)*1000:.1f} ms")
+    for k, v in s.items():
+        print(f"{k:>16s}: {v}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
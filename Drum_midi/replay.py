@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+# Offline replay: feed a recorded or synthetic hit stream through the scheduler, Judge and judgment
+# pipeline on a virtual clock, as fast as the CPU allows. Same inputs + seed -> same results.
+#   python replay.py "The Strokes-You Only Live Once-10-28-2025.mid" --jitter-ms 12 --miss-rate 0.05
+#   python replay.py song.mid --performance my_take.mid
+
+import argparse, random, sys, time
+from collections import Counter
+from typing import Callable, Iterable, Optional
+from config import GM, MATCH_TOL_MS
+from dh_types import Chart, ExpectedHit
+from judge import Judge
+from pipeline import JudgmentPipeline, NotifierSink
+from scheduler import PlayScheduler
+
+class VirtualClock:
+    # Injectable replacement for time.monotonic that only moves when told to
+    def __init__(self, t: float = 0.0):
+        self.t = t
+    def __call__(self) -> float:
+        return self.t
+    def advance_to(self, t: float):
+        if t > self.t: self.t = t
+
+class RecordingNotifier:
+    # Notifier that just counts what would have been sent to the Arduino
+    def __init__(self):
+        self.sent = Counter()
+    def send_grade(self, grade: str, kind: Optional[str] = None):
+        self.sent[(grade, kind)] += 1
+    def send_miss_pulse(self, kind: Optional[str] = None):
+        self.sent[("miss_pulse", kind)] += 1
+    def close(self): pass
+
+def humanize(expected: Iterable[ExpectedHit], jitter_ms: float = 10.0, miss_rate: float = 0.0,
+             vel_jitter: int = 10, seed: int = 0) -> list[tuple[float,int,int]]:
+    """Synthetic performance of a chart: (t_song, note, vel) with gaussian timing error and random drops."""
+    rng = random.Random(seed)
+    hits = []
+    for e in expected:
+        if miss_rate and rng.random() < miss_rate:
+            continue
+        t = e.t + rng.gauss(0.0, jitter_ms / 1000.0) if jitter_ms else e.t
+        vel = max(1, min(127, e.vel + rng.randint(-vel_jitter, vel_jitter))) if vel_jitter else e.vel
+        hits.append((t, e.note, vel))
+    hits.sort()
+    return hits
+
+def hits_from_midi(path: str) -> list[tuple[float,int,int]]:
+    """A recorded performance: every note_on in the file, timed in seconds via its own tempo map."""
+    from mido import MidiFile
+    hits, t = [], 0.0
+    for msg in MidiFile(path):    # iterating a MidiFile yields delta times in seconds
+        t += msg.time
+        if msg.type == "note_on" and msg.velocity > 0:
+            hits.append((t, msg.note, msg.velocity))
+    return hits
+
+def run_replay(expected: Chart | Iterable[ExpectedHit], tempo_map, hits: list[tuple[float,int,int]],
+               tol_ms: int = MATCH_TOL_MS, note_to_kind: Callable[[int], Optional[str]] = GM.get,
+               notifier=None) -> dict:
+    """
+    Plays `hits` against the chart with the scheduler unthreaded on a VirtualClock: chart notes reach
+    the Judge through the scheduler's look-ahead exactly as live, but nothing ever sleeps.
+    """
+    clock = VirtualClock()
+    notifier = notifier or RecordingNotifier()
+    pipeline = JudgmentPipeline([NotifierSink(notifier)], overflow="block")   # offline: never drop, or counts vary
+    judge = Judge([], tol_ms=tol_ms, pipeline=pipeline)
+    scheduler = PlayScheduler(clock=clock)
+
+    fresh = Chart.from_hits(expected).fresh()   # the Judge marks notes matched
+    t0 = time.perf_counter()
+    start_at = scheduler.start(fresh, tempo_map, play_click=False, start_delay=0.0,
+                               on_expected=judge.extend, threaded=False)
+    for t, note, vel in hits:
+        at = start_at + t
+        scheduler.advance(at, clock.advance_to)
+        clock.advance_to(at)
+        judge.register_hit(t, note, vel, note_to_kind)
+    scheduler.advance(float("inf"), clock.advance_to)
+    stats = judge.finalize()
+    elapsed = time.perf_counter() - t0
+    pipeline.close()
+
+    return {
+        "stats": stats,
+        "hits": len(hits),
+        "elapsed_s": elapsed,
+        "hits_per_s": len(hits) / elapsed if elapsed > 0 else float("inf"),
+        "notifier": dict(notifier.sent) if isinstance(notifier, RecordingNotifier) else None,
+        "pipeline": pipeline.stats(),
+    }
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Replay a performance against a chart faster than real time.")
+    ap.add_argument("midifile", help="Chart MIDI file")
+    ap.add_argument("--performance", help="MIDI file of a recorded performance (default: humanized chart)")
+    ap.add_argument("--jitter-ms", type=float, default=10.0, help="Humanized timing std-dev (default 10)")
+    ap.add_argument("--miss-rate", type=float, default=0.0, help="Fraction of chart notes left unplayed")
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--tol", type=int, default=MATCH_TOL_MS, help=f"Match tolerance in ms (default {MATCH_TOL_MS})")
+    ap.add_argument("--profile", help="Device profile for --performance notes (default: plain GM)")
+    args = ap.parse_args(argv)
+
+    from chart_cache import load_chart
+    expected, tempo_map = load_chart(args.midifile)
+    if args.performance:
+        hits = hits_from_midi(args.performance)
+    else:
+        hits = humanize(expected, args.jitter_ms, args.miss_rate, seed=args.seed)
+
+    note_to_kind = GM.get
+    if args.profile:
+        from profiles import DeviceProfile
+        note_to_kind = DeviceProfile.load(args.profile).kind_of
+    res = run_replay(expected, tempo_map, hits, tol_ms=args.tol, note_to_kind=note_to_kind)
+    print("----- Replay -----")
+    for k, v in res["stats"].items():
+        if k == "avg_abs_dt_ms": print(f"{k:>18s}: {v:.1f}")
+        else:                    print(f"{k:>18s}: {v}")
+    print(f"{'replayed':>18s}: {res['hits']} hits in {res['elapsed_s']*1000:.1f} ms ({res['hits_per_s']:,.0f} hits/s)")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,68 @@
+# End-of-song analytics over Judge.scores, vectorized: one pass to build columns, then NumPy per kind.
+
+import numpy as np
+from dh_types import PerHitScore
+
+HIST_EDGES = np.arange(-90.0, 91.0, 10.0)
+PERCENTILES = (10, 50, 90)
+
+def score_columns(scores: list[PerHitScore]) -> dict[str, np.ndarray]:
+    n = len(scores)
+    return {
+        "kind": np.array([s.kind for s in scores], dtype=object),
+        "t": np.fromiter((s.t for s in scores), np.float64, n),
+        "dt": np.fromiter((s.dt_ms for s in scores), np.float64, n),
+        "vel_err": np.fromiter((s.vel - s.vel_target for s in scores), np.float64, n),
+    }
+
+def _summary(t: np.ndarray, dt: np.ndarray, vel_err: np.ndarray, sections: int, t_end: float) -> dict:
+    p = np.percentile(dt, PERCENTILES)
+    hist, _ = np.histogram(np.clip(dt, HIST_EDGES[0], HIST_EDGES[-1] - 1e-9), HIST_EDGES)
+    # mean Δt per equal-length slice of the song: a trend across slices is tempo drift
+    sec = np.minimum((t / t_end * sections).astype(np.int64), sections - 1) if t_end > 0 else np.zeros(len(t), np.int64)
+    cnt = np.bincount(sec, minlength=sections)
+    tot = np.bincount(sec, weights=dt, minlength=sections)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        sect_mean = tot / cnt
+    slope = float(np.polyfit(t, dt, 1)[0]) * 60.0 if len(t) > 1 and np.ptp(t) > 0 else 0.0
+    return {
+        "count": len(dt),
+        "mean_dt_ms": float(dt.mean()),
+        "std_dt_ms": float(dt.std(ddof=1)) if len(dt) > 1 else 0.0,    # sample std, as RunningStats
+        **{f"p{q}_dt_ms": float(v) for q, v in zip(PERCENTILES, p)},
+        "hist": hist.tolist(),
+        "vel_err_mean": float(vel_err.mean()),
+        "vel_err_mae": float(np.abs(vel_err).mean()),
+        "section_dt_ms": [None if c == 0 else float(m) for c, m in zip(cnt, sect_mean)],
+        "drift_ms_per_min": slope,
+    }
+
+def build_report(scores: list[PerHitScore], sections: int = 8, t_end: float | None = None) -> dict:
+    if not scores:
+        return {"overall": None, "per_kind": {}}
+    c = score_columns(scores)
+    t_end = float(c["t"].max()) if t_end is None else t_end
+    kinds = c["kind"]
+    order = np.argsort(kinds, kind="stable")
+    uniq, starts = np.unique(kinds[order], return_index=True)
+    bounds = list(starts[1:]) + [len(order)]
+    per_kind = {}
+    for k, lo, hi in zip(uniq, starts, bounds):
+        sel = order[lo:hi]
+        per_kind[k] = _summary(c["t"][sel], c["dt"][sel], c["vel_err"][sel], sections, t_end)
+    return {
+        "overall": _summary(c["t"], c["dt"], c["vel_err"], sections, t_end),
+        "per_kind": per_kind,
+    }
+
+def format_report(rep: dict) -> list[str]:
+    if not rep["overall"]:
+        return ["(no hits)"]
+    lines = [f"{'kind':>14s} {'n':>5s} {'mean':>7s} {'std':>6s} {'p10':>7s} {'p50':>7s} {'p90':>7s} {'vel±':>6s} {'drift/min':>9s}"]
+    rows = sorted(rep["per_kind"].items()) + [("all", rep["overall"])]
+    for k, s in rows:
+        lines.append(f"{k:>14s} {s['count']:5d} {s['mean_dt_ms']:+7.1f} {s['std_dt_ms']:6.1f} {s['p10_dt_ms']:+7.1f} "
+                     f"{s['p50_dt_ms']:+7.1f} {s['p90_dt_ms']:+7.1f} {s['vel_err_mean']:+6.1f} {s['drift_ms_per_min']:+9.1f}")
+    sect = rep["overall"]["section_dt_ms"]
+    lines.append("Δt by section: " + "  ".join("   -  " if m is None else f"{m:+6.1f}" for m in sect))
+    return lines
@@ -0,0 +1,410 @@
+# Single-threaded session runtime: MIDI input, clicks/guide notes, judgment sinks and the Arduino
+# link all run as callbacks and tasks on one asyncio loop. Nothing polls or sleeps in slices; the
+# loop only wakes for a hit, a due event or a writable port, and Judge needs no lock.
+# The rtmidi driver thread (and the audio callback, if any) remain; they hand work to the loop.
+#   rt = Runtime(); players = [rt.player(...)]; scheduler = rt.scheduler(); ...; rt.run(players, scheduler, start_at)
+
+import asyncio, contextlib, functools, os, selectors, signal, time
+from collections import deque
+from typing import Callable, Optional
+import mido
+from config import SERIAL_HANDSHAKE_S, SERIAL_QUEUE
+from kits import Player
+from notifier import ArduinoNotifier, ACK, PING
+from pipeline import JudgmentPipeline, Sink, _Channel
+from scheduler import EventScheduler, PlayScheduler
+from stats import LatencyStats, thread_count
+
+class LoopEngine:
+    """
+    EventScheduler's interface on an event loop: each event is a loop.call_at timer, so the loop
+    sleeps until the next one. `done` resolves once finish() was called and the queue is empty.
+    Must be used from the loop's thread (PlayScheduler only touches it from its own events).
+    """
+    def __init__(self, loop: asyncio.AbstractEventLoop, clock: Callable[[], float] = time.monotonic):
+        self.loop = loop
+        self.clock = clock              # loop.time() is time.monotonic() on every platform asyncio supports
+        self._handles: dict[int, asyncio.TimerHandle] = {}
+        self._seq = 0
+        self._finish = False
+        self.done = loop.create_future()
+        self.lateness: dict[str, LatencyStats] = {}
+        self.stages = None
+
+    _late = EventScheduler._late
+
+    def schedule(self, t: float, fn: Callable, *args, label: Optional[str] = None):
+        if self.done.done():
+            return
+        self._seq += 1
+        self._handles[self._seq] = self.loop.call_at(t, self._fire, self._seq, t, fn, args, label)
+
+    def _fire(self, seq, t, fn, args, label):
+        del self._handles[seq]
+        late = self.clock() - t
+        try:
+            fn(*args)
+        finally:
+            if label: self._late(label, late)
+            self._check_done()
+
+    def _check_done(self):
+        if self._finish and not self._handles and not self.done.done():
+            self.done.set_result(None)
+
+    def finish(self):
+        self._finish = True
+        self._check_done()
+
+    def stop(self):
+        for h in self._handles.values():
+            h.cancel()
+        self._handles.clear()
+        if not self.done.done():
+            self.done.set_result(None)
+
+    def pending(self) -> int:
+        return len(self._handles)
+
+    def lateness_summary(self) -> dict[str, dict]:
+        return {k: v.summary() for k, v in self.lateness.items()}
+
+class _LoopChannel(_Channel):
+    # Same queue, overflow policy and counters as the threaded channel, drained by a loop callback.
+    # "block" can't wait on the loop's own thread, so it queues without a bound instead. Records put
+    # while the loop is stopped (Judge.finalize's misses) are delivered inline once the queue is full.
+    def __init__(self, sink: Sink, capacity: int, overflow: str, loop: asyncio.AbstractEventLoop):
+        if overflow == "block":
+            capacity = 1 << 62
+        super().__init__(sink, capacity, overflow)
+        self.loop = loop
+        self._scheduled = False
+
+    def _start(self):
+        pass
+
+    def put(self, rec):
+        if len(self.q) >= self.capacity and not self.loop.is_running():
+            self._drain()               # finalize after the session: the stopped loop won't make room
+        super().put(rec)
+
+    def _kick(self):
+        if not self._scheduled:
+            self._scheduled = True
+            self.loop.call_soon(self._drain)
+
+    def _drain(self):
+        self._scheduled = False
+        q = self.q
+        while q:
+            self._deliver(q.popleft())
+
+    def close(self, timeout: Optional[float]):
+        self._closing = True
+        self._drain()
+        try: self.sink.close()
+        except Exception: pass
+
+class LoopPipeline(JudgmentPipeline):
+    """JudgmentPipeline whose sinks run on the event loop, after the hit that produced the record."""
+    def __init__(self, loop: asyncio.AbstractEventLoop, sinks=(), capacity: int = 1024, overflow: str = "drop_oldest"):
+        self._channel = functools.partial(_LoopChannel, loop=loop)
+        super().__init__(sinks, capacity, overflow)
+
+class LoopSerialLink(ArduinoNotifier):
+    """
+    ArduinoNotifier on the event loop: the port's fd is non-blocking, the handshake is a task that
+    pings until the ACK shows up on a reader callback, and queued frames are coalesced into one
+    os.write per loop iteration. A short write parks the rest until the fd is writable; meanwhile
+    the queue bounds what piles up exactly as the threaded link does. POSIX only (needs add_reader).
+    """
+    def __init__(self, port: Optional[str], loop: asyncio.AbstractEventLoop, baud: int = 115200,
+                 handshake_s: float = SERIAL_HANDSHAKE_S, queue_size: int = SERIAL_QUEUE):
+        super().__init__(None, baud, handshake_s, queue_size)
+        self.port = port
+        self.loop = loop
+        self._fd = None
+        self._buf = b""                 # bytes the OS hasn't taken yet
+        self._stamps: deque = deque()   # (byte count through its end, enqueue time, on_written) of frames not fully written
+        self._buffered = 0              # bytes ever handed to _buf
+        self._flush_scheduled = False
+        self._writing = False           # waiting for the fd to become writable
+        self._task = loop.create_task(self._connect()) if port else None
+
+    async def _connect(self):
+        try:
+            import serial
+            self.ser = serial.Serial(self.port, baudrate=self.baud, timeout=0)
+            self._fd = self.ser.fileno()
+            os.set_blocking(self._fd, False)
+        except Exception as e:
+            print(f"[WARN] Could not open Arduino serial '{self.port}': {e}")
+            return
+        try:
+            if await self._handshake_async():
+                print(f"Arduino connected on {self.port} @ {self.baud} baud")
+            elif not self._closed:
+                print(f"[WARN] No handshake from '{self.port}' (old firmware?); sending anyway.")
+        except OSError as e:
+            print(f"[WARN] Arduino handshake failed: {e}")
+            return
+        with self._listen_lock:
+            if self.on_data: self._start_reader()
+            self.ready.set()
+
+    def _start_reader(self):
+        if self._reader is None and self._fd is not None:
+            self._reader = self._fd
+            self.loop.add_reader(self._fd, self._on_readable)
+
+    def _on_readable(self):
+        try: data = os.read(self._fd, 256)
+        except (BlockingIOError, InterruptedError): return
+        except OSError:
+            self.loop.remove_reader(self._fd)
+            return
+        if data: self.on_data(data, time.monotonic())
+
+    async def _handshake_async(self) -> bool:
+        fd, loop = self._fd, self.loop
+        acked = loop.create_future()
+        def on_readable():
+            try: data = os.read(fd, 64)
+            except BlockingIOError: return
+            if ACK in data and not acked.done(): acked.set_result(True)
+        loop.add_reader(fd, on_readable)
+        try:
+            deadline = loop.time() + self.handshake_s
+            while not self._closed and loop.time() < deadline:
+                os.write(fd, PING)
+                await asyncio.wait((acked,), timeout=min(0.1, deadline - loop.time()))
+                if acked.done():
+                    self.ser.reset_input_buffer()
+                    return True
+            return False
+        finally:
+            loop.remove_reader(fd)
+
+    def _kick(self):
+        if not self._flush_scheduled and not self._writing:
+            self._flush_scheduled = True
+            self.loop.call_soon(self._flush)
+
+    def _flush(self):
+        self._flush_scheduled = False
+        frames = []
+        for q in (self._ctl, self._q):          # cues and clock sync first, as in ArduinoNotifier
+            while q:
+                f, t, cb = q.popleft()
+                frames.append(f)
+                self._buffered += len(f)
+                self._stamps.append((self._buffered, t, cb))
+        self._buf += b"".join(frames)
+        self._write()
+
+    def _write(self):
+        if not self._buf or self._fd is None:
+            return
+        t0 = time.monotonic()
+        try:
+            n = os.write(self._fd, self._buf)
+        except BlockingIOError:
+            n = 0
+        except OSError as e:
+            print(f"[WARN] Serial write failed: {e}")
+            self._drop_unwritten()
+            return
+        t1 = time.monotonic()
+        self.write_latency.add(t1 - t0)
+        if self.h_write: self.h_write.add(t1 - t0)
+        if n:
+            self.writes += 1
+            self.bytes_written += n
+            self._buf = self._buf[n:]
+            # whatever is now fully written has reached the OS
+            stamps = self._stamps
+            while stamps and stamps[0][0] <= self.bytes_written:
+                _, t, cb = stamps.popleft()
+                self.queue_latency.add(t1 - t)
+                if self.h_queue: self.h_queue.add(t1 - t)
+                self.written += 1
+                if cb: cb(True)
+        if self._buf and not self._writing:
+            self._writing = True
+            self.loop.add_writer(self._fd, self._on_writable)
+
+    def _drop_unwritten(self):
+        self.dropped += len(self._stamps)
+        self._buf = b""
+        for _, _, cb in self._stamps:
+            if cb: cb(False)
+        self._stamps.clear()
+
+    def _on_writable(self):
+        self._write()
+        if not self._buf:
+            self._writing = False
+            self.loop.remove_writer(self._fd)
+            if self._q or self._ctl: self._kick()
+
+    def close(self):
+        self._closed = True
+        if self._task and not self._task.done():
+            self._task.cancel()
+        if self._fd is not None:
+            if self._reader is not None: self.loop.remove_reader(self._fd)
+            self._flush()               # last chance for queued frames; whatever the OS won't take is dropped
+            if self._writing:
+                self.loop.remove_writer(self._fd)
+                self._writing = False
+            self._drop_unwritten()
+        if self.ser:
+            try: self.ser.close()
+            except: pass
+
+class LoopPlayer(Player):
+    """
+    Player whose hits are judged on the event loop: the rtmidi callback only stamps the message and
+    hands it over with call_soon_threadsafe. The mido polling fallback becomes a loop task.
+    `done` resolves when the player stops or its input fails.
+    """
+    def start(self, start_at: float):
+        loop = asyncio.get_running_loop()
+        self.start_at = start_at
+        self.done = loop.create_future()
+        self._task = None
+        self.loop.dispatch = loop.call_soon_threadsafe
+        if self._stopped:
+            self._end()
+        elif self.loop.mode != "callback" or not self.loop.open(start_at, self.on_note):
+            self.loop.mode = "poll"
+            self._task = loop.create_task(self._poll(start_at))
+
+    async def _poll(self, start_at: float):
+        try:
+            with mido.open_input(self.input_name) as port:
+                print(f"Listening to: {self.input_name}  (press Ctrl-C to stop)")
+                last_poll = time.monotonic()
+                while True:                          # stop() cancels the task
+                    last_poll = self.loop.drain(port, start_at, self.on_note, last_poll)
+                    await asyncio.sleep(0.001)
+        except Exception as e:
+            self.error = f"{type(e).__name__}: {e}"
+            print(f"[WARN] {self.name}: input '{self.input_name}' failed: {self.error}")
+        finally:
+            self._end()
+
+    def _end(self):
+        if not self.done.done():
+            self.done.set_result(None)
+
+    def alive(self) -> bool:
+        return hasattr(self, "done") and not self.done.done()
+
+    def stop(self):
+        super().stop()
+        self.loop.close()
+        if getattr(self, "_task", None): self._task.cancel()
+        if hasattr(self, "done"): self._end()
+
+class _CountingSelector(selectors.DefaultSelector):
+    # counts loop iterations: each is one return from select(), i.e. one wake-up of the thread
+    def __init__(self):
+        super().__init__()
+        self.wakeups = 0
+
+    def select(self, timeout=None):
+        self.wakeups += 1
+        return super().select(timeout)
+
+class Runtime:
+    """Builds the session's pieces for one event loop, then runs it until Ctrl-C or the inputs end."""
+    def __init__(self):
+        self.selector = _CountingSelector()
+        self.loop = asyncio.SelectorEventLoop(self.selector)
+        asyncio.set_event_loop(self.loop)
+        self.judge_lock = contextlib.nullcontext()   # Judge is only ever touched from the loop
+        self.stats: dict = {}
+
+    def pipeline(self, sinks=(), capacity: int = 1024, overflow: str = "drop_oldest") -> LoopPipeline:
+        return LoopPipeline(self.loop, sinks, capacity, overflow)
+
+    def notifier(self, port: str, baud: int = 115200):
+        if os.name == "nt":
+            return ArduinoNotifier(port, baud)     # no add_reader on Windows serial handles
+        return LoopSerialLink(port, self.loop, baud)
+
+    def telemetry(self, address: str, **kw):
+        from telemetry import TelemetryServer
+        return TelemetryServer(address, loop=self.loop, **kw)
+
+    def player(self, *args, **kw) -> LoopPlayer:
+        return LoopPlayer(*args, **kw)
+
+    def scheduler(self) -> PlayScheduler:
+        return PlayScheduler(engine_factory=functools.partial(LoopEngine, self.loop))
+
+    def run(self, players: list[LoopPlayer], scheduler: PlayScheduler, start_at: float,
+            stop_at_end: bool = False, grace: float = 1.0, every=None) -> dict:
+        # every=(seconds, fn): also call fn periodically on the loop (e.g. a --stats dump)
+        return self.loop.run_until_complete(self._session(players, scheduler, start_at, stop_at_end, grace, every))
+
+    def _every(self, interval: float, fn):
+        fn()
+        self._periodic = self.loop.call_later(interval, self._every, interval, fn)
+
+    async def _session(self, players, scheduler, start_at, stop_at_end, grace, every) -> dict:
+        loop = self.loop
+        task = asyncio.current_task()
+        prev_sigint, ours = signal.getsignal(signal.SIGINT), False
+        try:
+            loop.add_signal_handler(signal.SIGINT, task.cancel)
+            ours = True
+        except (NotImplementedError, RuntimeError, ValueError):
+            pass                                    # Windows / not the main thread: KeyboardInterrupt still works
+        wall0, cpu0, wake0 = time.monotonic(), time.process_time(), self.selector.wakeups
+        for p in players:
+            p.start(start_at)
+        threads = thread_count()
+        self._periodic = self.loop.call_later(every[0], self._every, *every) if every else None
+        waits = set()
+        try:
+            waits.add(asyncio.gather(*(p.done for p in players)))
+            if stop_at_end:
+                waits.add(loop.create_task(self._song_end(scheduler.engine, grace)))
+            await asyncio.wait(waits, return_when=asyncio.FIRST_COMPLETED)
+        except asyncio.CancelledError:
+            pass
+        finally:
+            if ours:
+                # removing ours installs default_int_handler: put back whatever the caller had (app.py's)
+                loop.remove_signal_handler(signal.SIGINT)
+                if prev_sigint is not None: signal.signal(signal.SIGINT, prev_sigint)
+            if self._periodic: self._periodic.cancel()
+            for w in waits:
+                w.cancel()
+            for p in players:
+                p.stop()
+            scheduler.stop()
+            # retrieve the cancelled waits (asyncio logs any it collects unretrieved), let cancelled tasks unwind
+            await asyncio.gather(*waits, return_exceptions=True)
+            await asyncio.sleep(0)
+        wall = time.monotonic() - wall0
+        wakeups = self.selector.wakeups - wake0
+        self.stats = {
+            "wall_s": wall,
+            "cpu_pct": (time.process_time() - cpu0) / wall * 100.0 if wall > 0 else 0.0,
+            "wakeups": wakeups,
+            "wakeups_per_s": wakeups / wall if wall > 0 else 0.0,
+            "threads": threads,
+        }
+        return self.stats
+
+    async def _song_end(self, engine: LoopEngine, grace: float):
+        await engine.done
+        await asyncio.sleep(grace)                  # late hits on the last notes still count
+
+    def close(self):
+        self.loop.run_until_complete(asyncio.sleep(0))   # callbacks queued by closing sinks/links
+        self.loop.close()
+        asyncio.set_event_loop(None)
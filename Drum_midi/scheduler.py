@@ -1,68 +1,275 @@
-import time, threading
-import mido
-from audio import CLICK, play_mono
-from midi_time import estimate_bpm
-from config import COUNT_IN_BARS
-
-def schedule_clicks(bpm: float, bars: int, start_time: float):
-    sec_per_beat = 60.0 / bpm
-    events = []
-    total_beats = int(bars * 4)
-    for i in range(total_beats):
-        t = start_time + i * sec_per_beat
-        events.append(("click", t))
-    return events
+import math, time, threading, heapq
+from typing import Callable, Optional
+import numpy as np
+from dh_types import Chart
+from config import COUNT_IN_BARS, BEATS_PER_BAR, SCHED_SPIN_MS, SCHED_SPIN_LABELS, GUIDE_GATE_MS
+from guide import GuideStream, frame_groups, raw_sender
+from stats import LatencyStats
 
-class PlayScheduler:
-    def __init__(self):
+class EventScheduler:
+    """
+    Heap of timed callbacks run on one thread. Waits on a condition until the next event; for
+    labels in `spin_labels` it wakes `spin` seconds early and busy-waits the rest, so those fire
+    within microseconds of their time, and the others cost no CPU while waiting.
+    Events can be added from any thread while it runs. Dispatch lateness is kept per label.
+    """
+    def __init__(self, clock: Callable[[], float] = time.monotonic, spin: float = SCHED_SPIN_MS / 1000.0,
+                 spin_labels=SCHED_SPIN_LABELS):
+        self.clock = clock
+        self.spin = spin
+        self.spin_labels = frozenset(spin_labels)
+        self._heap: list = []
+        self._seq = 0
+        self._cv = threading.Condition()
         self._stop = False
+        self._finish = False
+        self.lateness: dict[str, LatencyStats] = {}
+        self.stages = None       # stats.StageStats: lateness histograms as "sched.<label>"
+
+    def _late(self, label: str, late: float):
+        st = self.lateness.get(label)
+        if st is None: st = self.lateness[label] = LatencyStats()
+        st.add(late)
+        if self.stages: self.stages.stage("sched." + label).add(late)
+
+    def schedule(self, t: float, fn: Callable, *args, label: Optional[str] = None):
+        with self._cv:
+            self._seq += 1
+            heapq.heappush(self._heap, (t, self._seq, fn, args, label))
+            if self._heap[0][1] == self._seq:
+                self._cv.notify()    # new earliest event: re-evaluate the wait
+
+    def finish(self):
+        # run() returns once the queue drains instead of waiting for more events
+        with self._cv:
+            self._finish = True
+            self._cv.notify()
+
+    def stop(self):
+        with self._cv:
+            self._stop = True
+            self._cv.notify()
+
+    def pending(self) -> int:
+        return len(self._heap)
+
+    def run(self):
+        clock, cv, heap = self.clock, self._cv, self._heap
+        while True:
+            with cv:
+                while True:
+                    if self._stop: return
+                    if not heap:
+                        if self._finish: return
+                        cv.wait()
+                        continue
+                    remaining = heap[0][0] - clock()
+                    lead = self.spin if heap[0][4] in self.spin_labels else 0.0
+                    if remaining > lead:
+                        cv.wait(remaining - lead)
+                        continue
+                    t, _, fn, args, label = heapq.heappop(heap)
+                    break
+            while clock() < t:
+                pass
+            late = clock() - t
+            fn(*args)
+            if label: self._late(label, late)
+
+    def run_until(self, t_end: float, set_clock: Optional[Callable[[float], None]] = None):
+        # Dispatch everything due by t_end on the caller's thread, without waiting (offline replay).
+        # set_clock, if given, moves an injected clock to each event's time before it runs.
+        heap = self._heap
+        while True:
+            with self._cv:
+                if self._stop or not heap or heap[0][0] > t_end:
+                    return
+                t, _, fn, args, label = heapq.heappop(heap)
+            if set_clock: set_clock(t)
+            late = self.clock() - t
+            fn(*args)
+            if label: self._late(label, late)
+
+    def lateness_summary(self) -> dict[str, dict]:
+        return {k: v.summary() for k, v in self.lateness.items()}
+
+class PlayScheduler:
+    def __init__(self, clock: Callable[[], float] = time.monotonic, engine_factory: Optional[Callable] = None):
+        self.clock = clock
+        self.engine_factory = engine_factory or EventScheduler   # e.g. runtime.LoopEngine on an asyncio loop
+        self.engine: EventScheduler|None = None
+        self.port_out = None
+        self.guide = None        # guide.GuideStream while guide notes go out
+        self._send_raw = None
+        self._sounding = bytearray(128)   # 1 while a guide note-on waits for its note-off
+        self.stages = None
         self._thread: threading.Thread|None = None
+        self._take = None
+        self.start_at = 0.0
 
     def stop(self):
-        self._stop = True
+        if self.engine: self.engine.stop()
+
+    def schedule(self, t_song: float, fn: Callable, *args, label: Optional[str] = None):
+        # insert an event at song time t_song while playing
+        if self.engine is None:
+            raise RuntimeError("PlayScheduler.schedule() before start(): there is no song time yet")
+        self.engine.schedule(self.start_at + t_song, fn, *args, label=label)
 
-    def start(self, expected_hits, tempo_map, play_click=True, midi_out_name=None, start_delay=2.0):
-        bpm = estimate_bpm(tempo_map)
-        start_at = time.monotonic() + start_delay
-        events = schedule_clicks(bpm, COUNT_IN_BARS, start_at)
+    def start(self, expected_hits, tempo_map, play_click=True, midi_out_name=None, start_delay=2.0,
+              on_expected=None, lookahead=1.0, mixer=None, metronome=False, threaded=True, out_notes=None,
+              gate_ms=GUIDE_GATE_MS):
+        """
+        expected_hits may be a Chart, a list or any time-ordered iterable (e.g. chart.iter_chart); it
+        is pulled lazily, `lookahead` seconds ahead of playback. Each pulled batch (a Chart slice or a
+        list) is passed to on_expected (e.g. Judge.extend) before its notes can be played or hit.
+        Clicks fall on the tempo map's beats: the count-in bar(s), then every beat if `metronome`.
+        With an audio.ClickMixer they are mixed at exact sample offsets, otherwise played one-shot.
+        Guide notes are mapped through out_notes (a 128-entry table, e.g. DeviceProfile.out_note) and
+        compiled a batch at a time into raw note-on/note-off bytes (guide.GuideStream, gate_ms long).
+        threaded=False starts no worker: the caller drives it with advance() (see replay.py), or the
+        engine runs on an event loop (runtime.py) and the caller closes the output with close_output().
+        """
+        clock = self.clock
+        engine = self.engine = self.engine_factory(clock=clock)
+        engine.stages = self.stages
+        start_at = self.start_at = clock() + start_delay
+        tpq = tempo_map.tpq
+        count_in = int(COUNT_IN_BARS * BEATS_PER_BAR) if play_click else 0
+        beat = 0
 
-        port_out = None
+        def schedule_beats(horizon, last_beat=None):
+            # clicks for beats up to `horizon` (monotonic time) or through beat index `last_beat`
+            nonlocal beat
+            stop_t = horizon - start_at
+            ticks = []
+            while (last_beat is None or beat <= last_beat) and tempo_map.seconds_at(beat * tpq) <= stop_t:
+                ticks.append(beat * tpq)
+                beat += 1
+            if not ticks: return
+            times = start_at + tempo_map.seconds_array(ticks)
+            first = beat - len(ticks)
+            accents = [(first + i) % BEATS_PER_BAR == 0 for i in range(len(ticks))]
+            if mixer is not None:
+                mixer.schedule(times, [1 if a else 0 for a in accents])
+            else:
+                from audio import clicks, play_mono
+                click, accent = clicks()
+                for t, a in zip(times.tolist(), accents):
+                    engine.schedule(t, play_mono, accent if a else click, label="click")
+
+        if count_in:
+            schedule_beats(float("inf"), last_beat=count_in - 1)
+
+        port_out = send_raw = guide = None
+        sounding = self._sounding = bytearray(128)
         if midi_out_name:
+            import mido
             try:
-                port_out = mido.open_output(midi_out_name)
+                port_out = self.port_out = mido.open_output(midi_out_name)
                 print(f"Sending MIDI to: {midi_out_name}")
             except Exception as e:
                 print(f"Could not open MIDI out '{midi_out_name}': {e}")
+        if port_out is not None:
+            send_raw = self._send_raw = raw_sender(port_out)
+            guide = self.guide = GuideStream(out_notes, gate_ms)
+            on_status = guide.on_status
+
+        def send_frames(frames):
+            for f in frames:
+                send_raw(f)
+                sounding[f[1]] = f[0] == on_status
+
+        def queue_guide(compiled):
+            for t, frames in frame_groups(*compiled):
+                engine.schedule(start_at + t, send_frames, frames, label="guide")
+
+        if isinstance(expected_hits, Chart):
+            chart_t = expected_hits.t
+            cursor = 0
+            def take(until):
+                # Chart: one searchsorted per refill, the batch is a slice
+                nonlocal cursor
+                hi = int(np.searchsorted(chart_t, until, "right"))
+                batch = expected_hits[cursor:hi]
+                cursor = hi
+                return batch, (float(chart_t[hi]) if hi < len(chart_t) else None)
+        else:
+            hits = iter(expected_hits)
+            pending = next(hits, None)
+            def take(until):
+                nonlocal pending
+                batch = []
+                while pending is not None and pending.t <= until:
+                    batch.append(pending)
+                    pending = next(hits, None)
+                return batch, (None if pending is None else pending.t)
+        self._take = take
+        last_t = 0.0
+        chart_end = None    # song time of the last note, once the chart is exhausted
+
+        def refill(due=-math.inf):
+            # move chart notes (and held-back guide note-offs) due within the look-ahead window onto
+            # the queue, then re-arm for whichever comes next: a chart gap must not hold a note-off
+            nonlocal last_t, chart_end
+            until = max(clock() + lookahead - start_at, due)
+            batch, next_t = take(until)
+            if len(batch):
+                if on_expected: on_expected(batch)
+                last_t = batch[-1].t
+            if guide and (len(batch) or guide.next_off() <= until):
+                queue_guide(guide.add_hits(batch, until))
+            if next_t is None:
+                chart_end = last_t
+                if guide: queue_guide(guide.flush())
+                engine.finish()
+            else:
+                due = min(next_t, guide.next_off()) if guide else next_t
+                engine.schedule(start_at + due - lookahead, refill, due)
 
-        for e in expected_hits:
-            t = start_at + e.t
-            events.append(("note", t, e.note, e.vel))
-        events.sort(key=lambda x: x[1])
+        def metronome_tick():
+            # beats through the end of the chart, queued half a look-ahead at a time
+            now = clock()
+            end = start_at + chart_end if chart_end is not None else float("inf")
+            schedule_beats(min(now + lookahead, end))
+            if now + lookahead < end:
+                engine.schedule(now + lookahead / 2, metronome_tick)
+
+        refill()
+        if metronome and play_click:
+            metronome_tick()
+        if not threaded:
+            return start_at
 
         def worker():
-            nonlocal port_out
-            for ev in events:
-                if self._stop: break
-                now = time.monotonic()
-                delay = ev[1] - now
-                if delay > 0:
-                    end_at = now + delay
-                    while not self._stop and time.monotonic() < end_at:
-                        time.sleep(min(0.01, end_at - time.monotonic()))
-                if self._stop: break
-                if ev[0] == "click" and play_click:
-                    play_mono(CLICK)
-                elif ev[0] == "note" and port_out is not None:
-                    port_out.send(mido.Message('note_on', channel=9, note=ev[2], velocity=ev[3]))
-                    port_out.send(mido.Message('note_off', channel=9, note=ev[2], velocity=0, time=0))
-            if port_out:
-                try: port_out.close()
-                except: pass
+            engine.run()
+            self.close_output()
 
         self._thread = threading.Thread(target=worker, daemon=True)
         self._thread.start()
         return start_at
 
+    def unpulled(self):
+        # chart notes the look-ahead never reached (stopped before the end); pulls the rest of a stream
+        return self._take(float("inf"))[0] if self._take else []
+
+    def close_output(self):
+        # a stop mid-gate cancels queued note-offs (and the GuideStream's held ones): silence those first
+        port, self.port_out = self.port_out, None
+        if port:
+            try:
+                for msg in self.guide.release(self._sounding): self._send_raw(msg)
+            except Exception: pass
+            try: port.close()
+            except: pass
+
+    def advance(self, t: float, set_clock: Optional[Callable[[float], None]] = None):
+        # unthreaded mode: run every event due by clock time t
+        self.engine.run_until(t, set_clock)
+
+    def lateness_summary(self) -> dict[str, dict]:
+        return self.engine.lateness_summary() if self.engine else {}
+
     def join(self, timeout=None):
         if self._thread:
             self._thread.join(timeout)
@@ -0,0 +1,147 @@
+import os, threading
+from array import array
+from bisect import bisect_right
+
+class LatencyStats:
+    # Collects samples (seconds) and summarises them in milliseconds
+    def __init__(self):
+        self.samples = array("d")
+
+    def add(self, seconds: float):
+        self.samples.append(seconds)
+
+    def __len__(self):
+        return len(self.samples)
+
+    def summary(self) -> dict:
+        s = sorted(self.samples)
+        n = len(s)
+        if not n:
+            return {"count": 0, "mean_ms": 0.0, "p50_ms": 0.0, "p99_ms": 0.0, "max_ms": 0.0}
+        return {
+            "count": n,
+            "mean_ms": sum(s) / n * 1000.0,
+            "p50_ms": s[n // 2] * 1000.0,
+            "p99_ms": s[min(n - 1, int(0.99 * n))] * 1000.0,
+            "max_ms": s[-1] * 1000.0,
+        }
+
+class RunningStats:
+    # Welford mean/variance, O(1) per sample, readable at any time
+    __slots__ = ("n", "mean", "m2", "lo", "hi")
+    def __init__(self):
+        self.n = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.lo = float("inf")
+        self.hi = float("-inf")
+
+    def add(self, x: float):
+        self.n += 1
+        d = x - self.mean
+        self.mean += d / self.n
+        self.m2 += d * (x - self.mean)
+        if x < self.lo: self.lo = x
+        if x > self.hi: self.hi = x
+
+    @property
+    def var(self) -> float:
+        return self.m2 / (self.n - 1) if self.n > 1 else 0.0
+
+    @property
+    def std(self) -> float:
+        return self.var ** 0.5
+
+STAGE_EDGES_US = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1_000, 2_000, 5_000, 10_000, 20_000, 50_000, 100_000)
+SPARK = " ▁▂▃▄▅▆▇█"
+
+class Histogram:
+    # Fixed log-spaced buckets (upper edges in µs above, the last bucket is everything beyond), so
+    # add() is a bisect and a few increments and memory never grows however long the session runs.
+    __slots__ = ("counts", "n", "total", "max")
+    def __init__(self):
+        self.counts = array("Q", bytes(8 * (len(STAGE_EDGES_US) + 1)))
+        self.n = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, seconds: float):
+        us = seconds * 1e6
+        self.counts[bisect_right(STAGE_EDGES_US, us)] += 1
+        self.n += 1
+        self.total += us
+        if us > self.max: self.max = us
+
+    def percentile(self, q: float) -> float:
+        # µs; the upper edge of the bucket holding the q-quantile (never more than the max seen)
+        rank = max(1, int(q * self.n + 0.999999))
+        acc = 0
+        for i, c in enumerate(self.counts):
+            acc += c
+            if acc >= rank:
+                return min(STAGE_EDGES_US[i], self.max) if i < len(STAGE_EDGES_US) else self.max
+        return 0.0
+
+    def summary(self) -> dict:
+        return {
+            "count": self.n,
+            "mean_us": self.total / self.n if self.n else 0.0,
+            "p50_us": self.percentile(0.5),
+            "p99_us": self.percentile(0.99),
+            "max_us": self.max,
+            "buckets": self.counts.tolist(),
+        }
+
+class StageStats:
+    """
+    Latency histograms for the hot path, by stage name, created on first use and listed in that
+    order. Components hold the Histogram they write to (or None when stats are off), so turning
+    this off costs one None check per stage. Writers on different threads use different stages:
+    with several kits, each is instrumented through prefixed() so its threads get their own. Stages
+    can appear from any thread, so readers iterate over a snapshot of the table.
+    """
+    def __init__(self, prefix: str = "", stages: dict | None = None):
+        self.prefix = prefix
+        self.stages: dict[str, Histogram] = {} if stages is None else stages
+
+    def prefixed(self, prefix: str) -> "StageStats":
+        # a view of the same table whose stage names start with `prefix`
+        return StageStats(self.prefix + prefix, self.stages)
+
+    def stage(self, name: str) -> Histogram:
+        name = self.prefix + name
+        h = self.stages.get(name)
+        if h is None:
+            h = self.stages[name] = Histogram()
+        return h
+
+    def summary(self) -> dict[str, dict]:
+        return {k: h.summary() for k, h in list(self.stages.items())}
+
+    def format(self) -> list[str]:
+        lines = [f"{'stage':>20s} {'n':>7s} {'mean':>9s} {'p50≤':>9s} {'p99≤':>9s} {'max':>9s}  µs buckets 1..100k+"]
+        for name, h in list(self.stages.items()):   # the scheduler thread adds "sched.<label>" as labels show up
+            if not h.n:
+                continue
+            top = max(h.counts)
+            spark = "".join(SPARK[0 if not c else 1 + (c * (len(SPARK) - 2)) // top] for c in h.counts)
+            lines.append(f"{name:>20s} {h.n:7d} {h.total / h.n:9.1f} {h.percentile(0.5):9.1f} "
+                         f"{h.percentile(0.99):9.1f} {h.max:9.1f}  |{spark}|")
+        return lines
+
+def dt_histogram(dts_ms, lo: float = -90.0, hi: float = 90.0, step: float = 10.0, width: int = 40) -> list[str]:
+    # ASCII histogram of timing errors (ms); values outside [lo, hi) are clamped into the end bins
+    nb = int((hi - lo) / step)
+    bins = [0] * nb
+    for d in dts_ms:
+        if d != d: continue    # nan (silent miss)
+        bins[min(nb - 1, max(0, int((d - lo) // step)))] += 1
+    top = max(bins) or 1
+    return [f"{lo + i*step:+6.0f} ms |{'#' * round(c * width / top):<{width}s}| {c}" for i, c in enumerate(bins)]
+
+def thread_count() -> int:
+    # OS threads (includes native ones such as the MIDI driver's), or Python threads off Linux
+    try:
+        return len(os.listdir("/proc/self/task"))
+    except OSError:
+        return threading.active_count()
@@ -0,0 +1,380 @@
+# Live telemetry: judgments and periodic per-player snapshots (combo, grades, Δt) fanned out to any
+# number of local subscribers - dashboards, a second screen. A Unix socket (or TCP on localhost) on
+# its own event loop; each subscriber picks JSON lines or compact binary records when it connects.
+# Every subscriber has its own bounded queue that drops its oldest records, so a stalled client
+# loses its own backlog and nothing else: publishing is a deque append whatever the audience.
+#   python app.py song.mid --input "Nitro" --telemetry /tmp/drums.sock
+#   python telemetry.py /tmp/drums.sock            # bundled client: prints what it receives
+#   python telemetry.py 127.0.0.1:7007 --bin
+
+import argparse, asyncio, json, math, os, socket, struct, sys, threading, time
+from collections import Counter, deque
+from typing import Optional
+from dh_types import KINDS, KIND_CODE, Judgment
+
+GRADES = ("Perfect", "Great", "Good", "Miss", "Extra")
+GRADE_CODE = {g: i for i, g in enumerate(GRADES)}
+FORMATS = ("json", "bin")
+# binary: every record is a little-endian u16 length, then the payload, whose first byte is its type
+T_HELLO, T_HIT, T_SNAPSHOT = 0, 1, 2
+LEN = struct.Struct("<H")
+HIT = struct.Struct("<BBBBdfBBIi")          # type, player, kind, grade, t_song, dt_ms (nan: silent miss), vel, vel_target, combo, idx
+SNAPSHOT = struct.Struct("<BBdIII5Iff")     # type, player, t (s since start), judged, combo, max_combo, grade counts, mean dt, mean |dt|
+
+def parse_address(addr: str):
+    # "host:port" -> TCP, anything else is a Unix socket path
+    host, sep, port = addr.rpartition(":")
+    if sep and port.isdigit() and "/" not in addr:
+        return (host or "127.0.0.1", int(port))
+    return addr
+
+class Aggregate:
+    # running per-player numbers for snapshots
+    def __init__(self):
+        self.judged = 0
+        self.grades = Counter()
+        self.combo = self.max_combo = 0
+        self.n_dt = 0
+        self.sum_dt = self.sum_abs_dt = 0.0
+
+    def add(self, rec: Judgment):
+        self.grades[rec.grade] += 1
+        if rec.extra: return
+        self.judged += 1
+        self.combo = rec.combo
+        if rec.combo > self.max_combo: self.max_combo = rec.combo
+        if rec.dt_ms == rec.dt_ms:
+            self.n_dt += 1
+            self.sum_dt += rec.dt_ms
+            self.sum_abs_dt += abs(rec.dt_ms)
+
+    def means(self) -> tuple[float, float]:
+        n = self.n_dt or 1
+        return self.sum_dt / n, self.sum_abs_dt / n
+
+class TelemetrySink:
+    # judgment sink feeding a TelemetryServer as one player
+    name = "telemetry"
+    def __init__(self, server: "TelemetryServer", player: int):
+        self.server = server
+        self.player = player
+    def handle(self, rec: Judgment):
+        self.server.publish(self.player, rec)
+    def close(self): pass
+
+class _Subscriber(asyncio.Protocol):
+    def __init__(self, server: "TelemetryServer"):
+        self.server = server
+        self.q: deque = deque(maxlen=server.queue_size)
+        self.fmt = None           # set by the client's first line
+        self.transport = None
+        self.paused = False
+        self._line = b""
+        self.sent = self.dropped = 0
+
+    def connection_made(self, transport):
+        self.transport = transport
+        transport.set_write_buffer_limits(high=self.server.write_buffer)
+
+    def data_received(self, data: bytes):
+        if self.fmt: return
+        self._line += data
+        if b"\n" in self._line or len(self._line) > 64:
+            fmt = self._line.split(b"\n", 1)[0].strip().decode("ascii", "replace").lower()
+            self.fmt = fmt if fmt in FORMATS else "json"
+            self.server._subscribe(self)
+
+    def push(self, payload: bytes):
+        q = self.q
+        if len(q) == q.maxlen:
+            if self.paused: self.dropped += 1      # the client is behind: its oldest record goes
+            else:           self.flush()           # just a burst: hand it to the socket
+        q.append(payload)
+
+    def flush(self):
+        if self.q and not self.paused:
+            n = len(self.q)
+            self.transport.write(b"".join(self.q))
+            self.q.clear()
+            self.sent += n
+
+    def pause_writing(self):
+        self.paused = True
+
+    def resume_writing(self):
+        self.paused = False
+        self.flush()
+
+    def connection_lost(self, exc):
+        self.server._unsubscribe(self)
+
+class TelemetryServer:
+    """
+    Fans judgments out to subscribers on `loop`, or on a loop of its own in a daemon thread. Clients
+    connect and send "json\\n" or "bin\\n"; they get a hello (players, kinds, grades), then every
+    judgment and a snapshot per player every `snapshot_s`. publish() may be called from any thread:
+    it queues the record and, at most once per loop iteration, wakes the loop, which encodes each
+    record once per format in use, appends it to every subscriber's queue and writes each queue in
+    one go. A client whose socket backs up past `write_buffer` bytes is not written to until it
+    drains; meanwhile its queue keeps the newest `queue_size` records.
+    """
+    def __init__(self, address: str, loop: Optional[asyncio.AbstractEventLoop] = None, queue_size: int = 256,
+                 snapshot_s: float = 1.0, write_buffer: int = 64 * 1024):
+        self.address = parse_address(address)
+        self.queue_size = queue_size
+        self.snapshot_s = snapshot_s
+        self.write_buffer = write_buffer
+        self.own_loop = loop is None
+        self.loop = loop or asyncio.new_event_loop()
+        self.players: list[str] = []
+        self.aggregates: list[Aggregate] = []
+        self.subs: dict[str, list[_Subscriber]] = {f: [] for f in FORMATS}
+        self._inbox: deque = deque()
+        self._drain_scheduled = False
+        self._server = None
+        self._timer = None
+        self._thread = None
+        self.t0 = time.monotonic()
+        self.published = self.snapshots = self.subscribed = self.peak = 0
+        self.sent = self.dropped = 0            # summed over subscribers that have left
+        self.drain_s = 0.0                      # loop time spent encoding and fanning records out
+
+    def sink(self, player: str) -> TelemetrySink:
+        self.players.append(player)
+        self.aggregates.append(Aggregate())
+        return TelemetrySink(self, len(self.players) - 1)
+
+    def start(self) -> "TelemetryServer":
+        if self.own_loop:
+            self._thread = threading.Thread(target=self.loop.run_forever, name="telemetry", daemon=True)
+            self._thread.start()
+            try:
+                asyncio.run_coroutine_threadsafe(self._serve(), self.loop).result(5.0)
+            except Exception:
+                self.loop.call_soon_threadsafe(self.loop.stop)
+                raise
+        elif self.loop.is_running():
+            self.loop.create_task(self._serve())
+        else:
+            self.loop.run_until_complete(self._serve())
+        return self
+
+    async def _serve(self):
+        factory = lambda: _Subscriber(self)
+        if isinstance(self.address, tuple):
+            self._server = await self.loop.create_server(factory, *self.address)
+            self.address = self._server.sockets[0].getsockname()[:2]     # port 0 -> the one picked
+        else:
+            if os.path.exists(self.address): os.unlink(self.address)    # stale socket from an earlier run
+            self._server = await self.loop.create_unix_server(factory, self.address)
+        if self.snapshot_s > 0:
+            self._timer = self.loop.call_later(self.snapshot_s, self._tick)
+
+    def publish(self, player: int, rec: Judgment):
+        self._inbox.append((player, rec))
+        if not self._drain_scheduled:
+            self._drain_scheduled = True
+            if self.own_loop: self.loop.call_soon_threadsafe(self._drain)
+            else:             self.loop.call_soon(self._drain)
+
+    def _drain(self):
+        self._drain_scheduled = False
+        t0 = time.perf_counter()
+        inbox, aggs = self._inbox, self.aggregates
+        js, bs = self.subs["json"], self.subs["bin"]
+        while inbox:
+            player, rec = inbox.popleft()
+            aggs[player].add(rec)
+            self.published += 1
+            if js: self._fanout(js, self._json_hit(player, rec))
+            if bs: self._fanout(bs, self._bin_hit(player, rec))
+        for s in js: s.flush()
+        for s in bs: s.flush()
+        self.drain_s += time.perf_counter() - t0
+
+    @staticmethod
+    def _fanout(subs, payload: bytes):
+        for s in subs: s.push(payload)
+
+    def _json_hit(self, player: int, rec: Judgment) -> bytes:
+        return json.dumps({"type": "hit", "player": self.players[player], "t": round(rec.t_song, 4), "kind": rec.kind,
+                           "grade": rec.grade, "dt_ms": None if rec.dt_ms != rec.dt_ms else round(rec.dt_ms, 2),
+                           "vel": rec.vel, "vel_target": rec.vel_target, "combo": rec.combo, "idx": rec.idx},
+                          separators=(",", ":")).encode() + b"\n"
+
+    def _bin_hit(self, player: int, rec: Judgment) -> bytes:
+        p = HIT.pack(T_HIT, player, KIND_CODE.get(rec.kind, 255), GRADE_CODE.get(rec.grade, 255), rec.t_song, rec.dt_ms,
+                     rec.vel & 0xFF, rec.vel_target & 0xFF, rec.combo, rec.idx)
+        return LEN.pack(len(p)) + p
+
+    def _snapshot(self, player: int, t: float, fmt: str) -> bytes:
+        a = self.aggregates[player]
+        mean, mean_abs = a.means()
+        if fmt == "json":
+            return json.dumps({"type": "snapshot", "player": self.players[player], "t": round(t, 3), "judged": a.judged,
+                               "combo": a.combo, "max_combo": a.max_combo, "grades": {g: a.grades[g] for g in GRADES},
+                               "mean_dt_ms": round(mean, 2), "mean_abs_dt_ms": round(mean_abs, 2)},
+                              separators=(",", ":")).encode() + b"\n"
+        p = SNAPSHOT.pack(T_SNAPSHOT, player, t, a.judged, a.combo, a.max_combo, *(a.grades[g] for g in GRADES), mean, mean_abs)
+        return LEN.pack(len(p)) + p
+
+    def _hello(self, fmt: str) -> bytes:
+        d = {"type": "hello", "players": self.players, "kinds": KINDS, "grades": GRADES, "snapshot_s": self.snapshot_s}
+        if fmt == "json":
+            return json.dumps(d, separators=(",", ":")).encode() + b"\n"
+        p = bytes((T_HELLO,)) + json.dumps(d).encode()
+        return LEN.pack(len(p)) + p
+
+    def _tick(self):
+        self._timer = self.loop.call_later(self.snapshot_s, self._tick)
+        self.send_snapshots()
+
+    def send_snapshots(self):
+        # on the loop
+        self._drain()                       # snapshots include everything published so far
+        t = time.monotonic() - self.t0
+        for fmt, subs in self.subs.items():
+            if not subs: continue
+            for player in range(len(self.players)):
+                self._fanout(subs, self._snapshot(player, t, fmt))
+            for s in subs: s.flush()
+        self.snapshots += 1
+
+    def _subscribe(self, s: _Subscriber):
+        s.push(self._hello(s.fmt))
+        s.flush()
+        self.subs[s.fmt].append(s)
+        self.subscribed += 1
+        n = self.subscribers()
+        if n > self.peak: self.peak = n
+
+    def _unsubscribe(self, s: _Subscriber):
+        if s.fmt and s in self.subs[s.fmt]:
+            self.subs[s.fmt].remove(s)
+            self.sent += s.sent
+            self.dropped += s.dropped
+
+    def subscribers(self) -> int:
+        return sum(len(v) for v in self.subs.values())
+
+    def stats(self) -> dict:
+        live = [s for v in self.subs.values() for s in v]
+        return {"published": self.published, "snapshots": self.snapshots, "subscribers": len(live),
+                "subscribed": self.subscribed, "peak": self.peak, "sent": self.sent + sum(s.sent for s in live),
+                "dropped": self.dropped + sum(s.dropped for s in live), "drain_ms": self.drain_s * 1000.0}
+
+    def _shutdown(self):
+        if self._timer: self._timer.cancel()
+        if self._server is None: return
+        self.send_snapshots()               # last word: the final numbers
+        self._server.close()
+        for s in [s for v in self.subs.values() for s in v]:
+            s.transport.close()             # after writing what it buffered
+        if not isinstance(self.address, tuple):
+            try: os.unlink(self.address)
+            except OSError: pass
+        self._server = None
+
+    def close(self):
+        if self.own_loop:
+            if self._thread and self._thread.is_alive():
+                asyncio.run_coroutine_threadsafe(self._close_async(), self.loop).result(5.0)
+                self.loop.call_soon_threadsafe(self.loop.stop)
+                self._thread.join(5.0)
+            self.loop.close()
+        elif self.loop.is_running():
+            self._shutdown()
+        elif not self.loop.is_closed():
+            self.loop.run_until_complete(self._close_async())
+
+    async def _close_async(self):
+        self._shutdown()
+        await asyncio.sleep(0)              # let the transports finish closing
+
+class TelemetryClient:
+    """Blocking subscriber, for tests, benchmarks and the command line: records() yields dicts."""
+    def __init__(self, address: str, fmt: str = "json", timeout: Optional[float] = 5.0):
+        addr = parse_address(address) if isinstance(address, str) else address
+        fam = socket.AF_INET if isinstance(addr, tuple) else socket.AF_UNIX
+        self.sock = socket.socket(fam, socket.SOCK_STREAM)
+        self.sock.settimeout(timeout)
+        self.sock.connect(addr)
+        self.sock.sendall(fmt.encode() + b"\n")
+        self.fmt = fmt
+        self.hello: dict = {}
+        self._buf = b""
+
+    def _read(self) -> bool:
+        data = self.sock.recv(65536)
+        self._buf += data
+        return bool(data)
+
+    def records(self):
+        while True:
+            if self.fmt == "json":
+                line, nl, rest = self._buf.partition(b"\n")
+                if not nl:
+                    if not self._read(): return
+                    continue
+                self._buf = rest
+                rec = json.loads(line)
+            else:
+                if len(self._buf) < 2 or len(self._buf) < 2 + LEN.unpack_from(self._buf)[0]:
+                    if not self._read(): return
+                    continue
+                n = LEN.unpack_from(self._buf)[0]
+                payload, self._buf = self._buf[2:2 + n], self._buf[2 + n:]
+                rec = self.decode(payload)
+            if rec["type"] == "hello": self.hello = rec
+            yield rec
+
+    def decode(self, p: bytes) -> dict:
+        if p[0] == T_HELLO:
+            return json.loads(p[1:])
+        players, kinds = self.hello.get("players", []), self.hello.get("kinds", KINDS)
+        name = lambda i: players[i] if i < len(players) else str(i)
+        if p[0] == T_HIT:
+            _, pl, kind, grade, t, dt, vel, vt, combo, idx = HIT.unpack(p)
+            return {"type": "hit", "player": name(pl), "t": t, "kind": kinds[kind] if kind < len(kinds) else None,
+                    "grade": GRADES[grade] if grade < len(GRADES) else None, "dt_ms": None if math.isnan(dt) else dt,
+                    "vel": vel, "vel_target": vt, "combo": combo, "idx": idx}
+        _, pl, t, judged, combo, max_combo, *rest = SNAPSHOT.unpack(p)
+        return {"type": "snapshot", "player": name(pl), "t": t, "judged": judged, "combo": combo, "max_combo": max_combo,
+                "grades": dict(zip(GRADES, rest[:5])), "mean_dt_ms": rest[5], "mean_abs_dt_ms": rest[6]}
+
+    def close(self):
+        self.sock.close()
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description="Print live judgments from a running session's --telemetry socket")
+    ap.add_argument("address", help="Unix socket path or host:port")
+    ap.add_argument("--bin", action="store_true", help="Subscribe to the binary records instead of JSON")
+    ap.add_argument("--raw", action="store_true", help="Print each record as JSON")
+    args = ap.parse_args(argv)
+    try:
+        client = TelemetryClient(args.address, "bin" if args.bin else "json", timeout=None)
+    except OSError as e:
+        print(f"Could not connect to {args.address}: {e}")
+        return 1
+    try:
+        for rec in client.records():
+            if args.raw:
+                print(json.dumps(rec))
+            elif rec["type"] == "hit":
+                dt = "   miss  " if rec["dt_ms"] is None else f"{rec['dt_ms']:+6.1f} ms"
+                print(f"{rec['player']:>8s} [{rec['kind'] or '?':12s}] {rec['grade']:7s} Δt={dt}  combo={rec['combo']}")
+            elif rec["type"] == "snapshot":
+                g = rec["grades"]
+                print(f"{rec['player']:>8s} @ {rec['t']:6.1f} s: combo {rec['combo']} (max {rec['max_combo']})  "
+                      f"P {g['Perfect']} / Gr {g['Great']} / Go {g['Good']} / M {g['Miss']} / X {g['Extra']}  "
+                      f"Δt {rec['mean_dt_ms']:+.1f} ms, |Δt| {rec['mean_abs_dt_ms']:.1f} ms")
+            else:
+                print(f"connected: players {', '.join(rec['players']) or '-'}")
+    except KeyboardInterrupt:
+        pass
+    finally:
+        client.close()
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,31 @@
+import json
+from pathlib import Path
+from mido import MidiFile, MidiTrack, Message
+from batch import run_batch, find_midis
+
+HERE = Path(__file__).resolve().parents[1]
+
+def test_batch_stats_unmapped_and_cache(simple_drum_midi, tmp_path):
+    path, _ = simple_drum_midi
+    mid = MidiFile(path)
+    tr = MidiTrack()
+    tr.append(Message("note_on", channel=9, note=81, velocity=90, time=0))   # triangle: not in GM map
+    mid.tracks.append(tr)
+    odd = str(tmp_path / "odd.mid")
+    mid.save(odd)
+    cache = str(tmp_path / "cache")
+
+    res = {Path(r["path"]).name: r for r in run_batch([path, odd, str(tmp_path / "missing.mid")], jobs=2, directory=cache)}
+    assert "error" in res["missing.mid"]
+    r = res["odd.mid"]
+    assert r["notes"] == 4 and r["per_kind"]["snare"] == 1 and not r["cached"]
+    assert r["unmapped"] == {39: 1, 81: 1}          # hand clap from the fixture + the triangle
+    assert r["peak_nps"] >= 1 and r["tempo_changes"] == 0      # one tempo throughout
+    assert len(list(Path(cache).glob("*.npz"))) == 2
+
+    again = list(run_batch([odd], jobs=1, directory=cache))[0]
+    assert again["cached"] and again["unmapped"] == r["unmapped"]
+    assert json.loads(json.dumps(again))["notes"] == 4
+
+def test_find_midis_lists_bundled_songs():
+    assert len(list(find_midis([str(HERE)]))) == 4
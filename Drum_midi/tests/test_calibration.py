@@ -0,0 +1,29 @@
+from calibrate import estimate_offset, tap_offsets, calibration_chart
+from config import GM
+from dh_types import ExpectedHit
+from judge import Judge
+from profiles import load_latency_offset, save_latency_offset
+
+def test_estimate_offset_rejects_outliers():
+    dts = [18.0, 22.0, 19.5, 20.5, 21.0, 19.0, 20.0, 140.0, -120.0]
+    offset, kept = estimate_offset(dts)
+    assert abs(offset - 20.0) < 1.0
+    assert len(kept) == 7
+
+def test_tap_offsets_use_nearest_beat():
+    hits, _ = calibration_chart(bpm=120, beats=4)
+    beats = [e.t for e in hits]
+    dts = tap_offsets([beats[0] + 0.015, beats[2] - 0.010, beats[3] + 0.4], beats, window=0.25)
+    assert [round(d) for d in dts] == [15, -10]
+
+def test_offset_roundtrip_and_judge_applies_it(tmp_path):
+    path = str(tmp_path / "cal.json")
+    assert load_latency_offset("kit", path) == 0.0
+    save_latency_offset("kit", 25.0, 20, path)
+    offset = load_latency_offset("kit", path)
+    assert offset == 25.0
+
+    j = Judge([ExpectedHit(t=1.0, kind="snare", note=38, vel=100)], tol_ms=120, offset_ms=offset)
+    j.register_hit(t_actual=1.045, note=38, vel=100, note_to_kind=GM.get)
+    assert j.scores[0].grade == "Perfect"
+    assert abs(j.scores[0].dt_ms - 20.0) < 1e-6
@@ -0,0 +1,28 @@
+from mido import MidiFile
+from chart import extract_chart
+import chart_cache
+
+def test_cache_roundtrip_skips_parsing(simple_drum_midi, tmp_path, monkeypatch):
+    path, _ = simple_drum_midi
+    cache = tmp_path / "cache"
+    exp, tm = chart_cache.load_chart(path, directory=str(cache))
+    assert len(list(cache.glob("*.npz"))) == 1
+
+    # a cache hit must not go through mido at all
+    monkeypatch.setattr("chart.extract_chart", lambda mid: (_ for _ in ()).throw(AssertionError("parsed")))
+    exp2, tm2 = chart_cache.load_chart(path, directory=str(cache))
+    assert exp2 == exp
+    assert list(tm2) == list(tm) and tm2.tpq == tm.tpq
+
+def test_cache_key_tracks_mapping(simple_drum_midi, monkeypatch):
+    path, _ = simple_drum_midi
+    data = open(path, "rb").read()
+    key = chart_cache.chart_key(data)
+    monkeypatch.setattr(chart_cache, "JUDGED_KINDS", {"kick"})
+    assert chart_cache.chart_key(data) != key
+
+def test_no_cache_writes_nothing(simple_drum_midi, tmp_path):
+    path, _ = simple_drum_midi
+    exp, _ = chart_cache.load_chart(path, use_cache=False, directory=str(tmp_path))
+    assert exp == extract_chart(MidiFile(path))[0]
+    assert not list(tmp_path.glob("*.npz"))
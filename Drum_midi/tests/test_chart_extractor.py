@@ -17,3 +17,57 @@ def test_extract_chart_filters_to_channel10_and_sorts(simple_drum_midi):
     # Sorted in time
     times = [e.t for e in exp]
     assert times == sorted(times)
+
+def test_iter_chart_merges_tracks_in_time_order(simple_drum_midi):
+    from mido import MidiTrack, Message
+    from chart import iter_chart
+    path, _ = simple_drum_midi
+    mid = MidiFile(path)
+    # second track interleaving with the first
+    extra = MidiTrack()
+    extra.append(Message('note_on', channel=9, note=38, velocity=80, time=240))
+    extra.append(Message('note_on', channel=9, note=42, velocity=80, time=480))
+    mid.tracks.append(extra)
+
+    streamed = iter_chart(mid)
+    first = next(streamed)
+    assert first.t == 0.25 and first.kind == "snare"
+    exp, _ = extract_chart(mid)
+    assert [first] + list(streamed) == exp
+
+def test_chart_arrays_views_and_bitmap(simple_drum_midi):
+    import numpy as np
+    from dh_types import Chart, ExpectedHit, KINDS
+    path, _ = simple_drum_midi
+    exp, _ = extract_chart(MidiFile(path))
+    assert isinstance(exp, Chart)
+    assert (exp.t.dtype, exp.kind.dtype, exp.note.dtype, exp.vel.dtype) == (np.float64, np.uint8, np.uint8, np.uint8)
+    assert [KINDS[k] for k in exp.kind] == [e.kind for e in exp]
+
+    c = Chart()
+    for i in range(3):
+        c.extend(exp)                    # grows past its initial capacity
+    assert len(c) == 3 * len(exp) and c[len(exp):2 * len(exp)] == exp
+    c.set_matched(9)
+    assert c[9].matched and not c[8].matched
+    assert np.flatnonzero(c.matched_mask()).tolist() == [9]
+    assert np.flatnonzero(c[8:12].matched_mask()).tolist() == [1]
+    assert not c.fresh()[9].matched
+    assert c[-1] == ExpectedHit(t=exp[-1].t, kind=exp[-1].kind, note=exp[-1].note, vel=exp[-1].vel)
+
+def test_stopped_stream_still_counts_the_notes_it_never_reached(simple_drum_midi):
+    from chart import iter_chart
+    from judge import Judge
+    from midi_time import build_tempo_map
+    from scheduler import PlayScheduler
+    path, _ = simple_drum_midi
+    mid = MidiFile(path)
+    judge = Judge([], tol_ms=50)
+    sched = PlayScheduler(clock=lambda: 0.0)
+    sched.start(iter_chart(mid), build_tempo_map(mid), play_click=False, start_delay=0.0,
+                on_expected=judge.extend, threaded=False)
+    assert 0 < len(judge.expected) < 4               # only the 1 s look-ahead has been pulled
+    sched.stop()
+    judge.extend(sched.unpulled())
+    stats = judge.finalize()
+    assert stats["notes_in_chart"] == 4 and stats["misses"] == 4
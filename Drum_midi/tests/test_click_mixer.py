@@ -0,0 +1,28 @@
+import numpy as np
+from audio import ClickMixer, render_wav
+
+def _impulse(n=4):
+    return np.ones(n, dtype=np.float32) * 0.5
+
+def test_clicks_land_on_exact_samples_across_blocks():
+    mixer = ClickMixer(sounds=[_impulse(), _impulse(300)], sr=1000, gain=1.0, block=64)
+    mixer.anchor(10.0)
+    mixer.schedule([10.010, 10.062], [0, 1])   # sample 10; sample 62 (spans into the next blocks)
+    out = np.zeros((64, 2), dtype=np.int16)
+    rendered = []
+    for _ in range(8):
+        mixer.render(64, out)
+        rendered.append(out[:, 0].copy())
+    sig = np.concatenate(rendered)
+    nz = np.flatnonzero(sig)
+    assert nz[0] == 10 and sig[10:14].tolist() == [16383] * 4 and sig[14] == 0
+    assert nz[4] == 62 and np.count_nonzero(sig[62:]) == 300
+    assert mixer.dropped == 0
+
+def test_events_scheduled_too_late_are_counted(tmp_path):
+    mixer = ClickMixer(sounds=[_impulse()], sr=1000, block=32)
+    render_wav(mixer, str(tmp_path / "a.wav"), 0.1)
+    mixer.schedule([0.010], [0])          # already rendered
+    out = np.zeros((32, 2), dtype=np.int16)
+    mixer.render(32, out)
+    assert mixer.dropped == 1 and not out.any()
@@ -0,0 +1,20 @@
+import time, threading
+import pytest
+from scheduler import EventScheduler, PlayScheduler
+
+def test_events_fire_in_time_order_and_can_be_inserted_while_running():
+    eng = EventScheduler()
+    fired = []
+    now = time.monotonic()
+    eng.schedule(now + 0.06, fired.append, "c", label="click")
+    eng.schedule(now + 0.02, fired.append, "a", label="click")
+    th = threading.Thread(target=eng.run); th.start()
+    eng.schedule(now + 0.04, fired.append, "b", label="click")   # inserted after start
+    eng.finish(); th.join(2)
+    assert fired == ["a", "b", "c"]
+    s = eng.lateness_summary()["click"]
+    assert s["count"] == 3 and s["max_ms"] < 5.0
+
+def test_play_scheduler_schedule_needs_start():
+    with pytest.raises(RuntimeError, match="start"):
+        PlayScheduler().schedule(1.0, print)
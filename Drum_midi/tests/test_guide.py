@@ -0,0 +1,99 @@
+import mido
+import numpy as np
+from dh_types import Chart, ExpectedHit
+from guide import GuideStream, frame_groups, render_midi
+from midi_time import TempoMap
+from replay import VirtualClock
+from scheduler import PlayScheduler
+
+def _msgs(data):
+    return [tuple(data[i:i + 3]) for i in range(0, len(data), 3)]
+
+def test_note_offs_follow_the_gate_or_the_next_retrigger():
+    g = GuideStream(gate_ms=40)
+    t, data = g.add([0.0, 0.0, 0.02, 0.5], [36, 53, 36, 36], [100, 90, 0, 80])
+    assert t.tolist() == [0.0, 0.0, 0.02, 0.02, 0.04, 0.06, 0.5, 0.54]
+    assert _msgs(data) == [(0x99, 36, 100), (0x99, 51, 90),     # 53 (ride bell) goes out as 51
+                           (0x89, 36, 0), (0x99, 36, 1),         # retrigger: off first, vel 0 sent as 1
+                           (0x89, 51, 0), (0x89, 36, 0), (0x99, 36, 80), (0x89, 36, 0)]
+
+def test_held_back_offs_are_cut_by_the_next_batch():
+    g = GuideStream(gate_ms=100)
+    t, data = g.add([0.95], [38], [100], until=1.0)
+    assert t.tolist() == [0.95]                       # its off (1.05) is past the window: held
+    t, data = g.add([1.01], [38], [70], until=2.0)
+    assert t.tolist() == [1.01, 1.01, 1.11] and _msgs(data)[:2] == [(0x89, 38, 0), (0x99, 38, 70)]
+    assert g.flush()[0].tolist() == []
+    assert [t for t, _ in frame_groups(t, data)] == [1.01, 1.11]
+
+def test_render_matches_the_stream_on_the_tempo_map(tmp_path):
+    tm = TempoMap([(0, 500_000), (960, 250_000)], 480)
+    hits = [ExpectedHit(t=float(tm.seconds_at(k * 240)), kind="snare", note=38, vel=100) for k in range(8)]
+    path = tmp_path / "guide.mid"
+    assert render_midi(hits, tm, str(path), gate_ms=50) == 16
+    mid = mido.MidiFile(path)
+    tick, ons = 0, []
+    for m in mid.tracks[0]:
+        tick += m.time
+        if m.type == "note_on" and m.velocity: ons.append(tick)
+    assert ons == [k * 240 for k in range(8)]
+    assert [m.tempo for m in mid.tracks[0] if m.type == "set_tempo"] == [500_000, 250_000]
+
+class RawPort:
+    # a mido rtmidi output as far as guide.raw_sender is concerned
+    def __init__(self): self._rt = self; self.sent = []
+    def send_message(self, msg): self.sent.append(bytes(msg))
+    def close(self): pass
+
+def test_scheduler_sends_precompiled_bytes(monkeypatch):
+    port = RawPort()
+    monkeypatch.setattr(mido, "open_output", lambda name: port)
+    chart = Chart.from_hits([ExpectedHit(t=i * 0.25, kind="kick", note=36, vel=100) for i in range(12)])
+    clock = VirtualClock()
+    sched = PlayScheduler(clock=clock)
+    start_at = sched.start(chart, TempoMap([(0, 500_000)], 480), play_click=False, midi_out_name="guide",
+                           start_delay=0.0, lookahead=1.0, threaded=False, gate_ms=30)
+    for step in range(400):
+        now = start_at + step * 0.01
+        sched.advance(now, clock.advance_to)
+        clock.advance_to(now)
+    assert len(port.sent) == 24 and all(type(m) is bytes for m in port.sent)
+    assert port.sent[:2] == [bytes((0x99, 36, 100)), bytes((0x89, 36, 0))]
+    assert sched.guide.notes == 12
+    lat = sched.lateness_summary()["guide"]
+    assert lat["count"] == 24
+
+def test_held_note_off_goes_out_on_time_across_a_chart_gap(monkeypatch):
+    port = RawPort()
+    monkeypatch.setattr(mido, "open_output", lambda name: port)
+    chart = Chart.from_hits([ExpectedHit(t=0.98, kind="kick", note=36, vel=100), ExpectedHit(t=12.0, kind="kick", note=36, vel=100)])
+    clock = VirtualClock()
+    sent = []
+    port.send_message = lambda msg: sent.append((clock(), bytes(msg)))
+    sched = PlayScheduler(clock=clock)
+    sched.start(chart, TempoMap([(0, 500_000)], 480), play_click=False, midi_out_name="guide",
+                start_delay=0.0, lookahead=1.0, threaded=False, gate_ms=40)
+    for step in range(1300):                      # start_at is 0 on this clock
+        now = step * 0.01
+        sched.advance(now, clock.advance_to)
+        clock.advance_to(now)
+    offs = [t for t, m in sent if m[0] == 0x89]
+    assert np.allclose(offs, [1.02, 12.04])        # not held until the refill before the 12 s note
+    assert sched.lateness_summary()["guide"]["max_ms"] < 1.0
+
+def test_stop_inside_a_gate_releases_the_sounding_note(monkeypatch):
+    port = RawPort()
+    monkeypatch.setattr(mido, "open_output", lambda name: port)
+    chart = Chart.from_hits([ExpectedHit(t=0.5, kind="kick", note=36, vel=100), ExpectedHit(t=0.5, kind="snare", note=38, vel=100),
+                             ExpectedHit(t=1.0, kind="kick", note=36, vel=100)])
+    clock = VirtualClock()
+    sched = PlayScheduler(clock=clock)
+    sched.start(chart, TempoMap([(0, 500_000)], 480), play_click=False, midi_out_name="guide",
+                start_delay=0.0, lookahead=1.0, threaded=False, gate_ms=200)
+    for step in range(60):                        # stop at 0.6 s: both notes of the first chord still held
+        sched.advance(step * 0.01, clock.advance_to)
+        clock.advance_to(step * 0.01)
+    sched.stop(); sched.close_output()
+    assert [m[0] for m in port.sent[:2]] == [0x99, 0x99]
+    assert sorted(port.sent[2:4]) == [bytes((0x89, 36, 0)), bytes((0x89, 38, 0))]
+    assert port.sent[4:] == [bytes((0xB9, 123, 0))]
@@ -33,4 +33,66 @@ def test_judge_matches_within_tolerance_and_grades():
     stats = j.finalize()
     assert stats["played"] == 1
     assert stats["misses"] == 0
-    assert stats["perfects"] == 1
\ No newline at end of file
+    assert stats["perfects"] == 1
+
+def test_judge_picks_closest_unmatched_of_same_kind():
+    exp = [ExpectedHit(t=1.0, kind="snare", note=38, vel=100),
+           ExpectedHit(t=1.0, kind="kick", note=36, vel=100),
+           ExpectedHit(t=1.1, kind="snare", note=38, vel=100)]
+    j = Judge(exp, tol_ms=120)
+    j.register_hit(t_actual=1.08, note=38, vel=100, note_to_kind=GM.get)
+    # matched state lives in the Judge's chart bitmap, not on the input objects
+    assert j.expected[2].matched and not j.expected[0].matched
+    j.register_hit(t_actual=1.095, note=38, vel=100, note_to_kind=GM.get)
+    assert j.expected[0].matched
+    stats = j.finalize()
+    assert stats["played"] == 2
+    assert stats["misses"] == 1 + 1  # first snare graded Miss (95ms late) + unplayed kick
+
+def test_judge_dense_window_beyond_old_scan_range():
+    # 200 interleaved notes inside one tolerance window; the hi-hat sits past cursor+50
+    exp = [ExpectedHit(t=1.0 + i * 0.0005, kind="snare", note=38, vel=100) for i in range(200)]
+    exp.append(ExpectedHit(t=1.1, kind="hihat_closed", note=42, vel=100))
+    exp.sort(key=lambda e: e.t)
+    j = Judge(exp, tol_ms=120)
+    j.register_hit(t_actual=1.1, note=42, vel=100, note_to_kind=GM.get)
+    assert j.finalize()["perfects"] == 1
+
+def test_judge_sweeps_misses_per_kind():
+    exp = [ExpectedHit(t=1.0, kind="kick", note=36, vel=100),
+           ExpectedHit(t=2.0, kind="snare", note=38, vel=100),
+           ExpectedHit(t=3.0, kind="snare", note=38, vel=100)]
+    j = Judge(exp, tol_ms=120)
+    j.register_hit(t_actual=3.0, note=38, vel=100, note_to_kind=GM.get)
+    assert j.misses == 2 and j.combo == 1
+
+def test_running_tallies_match_scores():
+    exp = [ExpectedHit(t=i * 0.5, kind=("snare", "kick")[i % 2], note=(38, 36)[i % 2], vel=100) for i in range(40)]
+    j = Judge(exp, tol_ms=120)
+    for i, e in enumerate(exp):
+        if i % 7 == 3: continue
+        j.register_hit(t_actual=e.t + (i % 5 - 2) * 0.01, note=e.note, vel=90 + i % 3, note_to_kind=GM.get)
+    snap = j.snapshot()["per_kind"]["snare"]
+    dts = [s.dt_ms for s in j.per_kind["snare"]]
+    mean = sum(dts) / len(dts)
+    assert snap["played"] == len(dts)
+    assert math.isclose(snap["mean_dt_ms"], mean, abs_tol=1e-9)
+    assert math.isclose(snap["std_dt_ms"] ** 2, sum((d - mean) ** 2 for d in dts) / (len(dts) - 1), rel_tol=1e-9)
+    assert snap["early"] == sum(d < 0 for d in dts)
+    stats = j.finalize()
+    assert stats["played"] == 34 and stats["misses"] == 6
+    assert j.snapshot()["overall"]["silent_misses"] == 6
+
+def test_vectorized_report():
+    from report import build_report
+    exp = [ExpectedHit(t=float(i), kind="snare", note=38, vel=100) for i in range(16)]
+    j = Judge(exp, tol_ms=120)
+    for e in exp:
+        j.register_hit(t_actual=e.t + e.t / 1000.0, note=38, vel=90, note_to_kind=GM.get)   # drifting 1 ms/s late
+    rep = build_report(j.scores, sections=4)
+    s = rep["per_kind"]["snare"]
+    assert s["count"] == 16 and math.isclose(s["vel_err_mean"], -10.0)
+    assert math.isclose(s["drift_ms_per_min"], 60.0, rel_tol=1e-3)
+    assert s["section_dt_ms"][0] < s["section_dt_ms"][-1]
+    assert sum(s["hist"]) == 16
+    assert math.isclose(s["std_dt_ms"], j.snapshot()["per_kind"]["snare"]["std_dt_ms"], rel_tol=1e-6)
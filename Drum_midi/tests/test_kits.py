@@ -0,0 +1,35 @@
+import time
+from dh_types import ExpectedHit
+from judge import Judge
+from kits import Player, aggregate
+from pipeline import JudgmentPipeline
+from profiles import DeviceProfile
+
+class SlowSink:
+    name = "slow"
+    def handle(self, rec): time.sleep(0.02)
+    def close(self): pass
+
+def _player(name, sinks, offset_ms=0.0):
+    chart = [ExpectedHit(t=i * 0.25, kind="snare", note=38, vel=100) for i in range(40)]
+    pipe = JudgmentPipeline(sinks)
+    return Player(name, "none", DeviceProfile.load("gm"), Judge(chart, tol_ms=120, pipeline=pipe, offset_ms=offset_ms), pipe)
+
+def test_players_judge_independently_and_aggregate():
+    slow = _player("P1", [SlowSink()])
+    fast = _player("P2", [], offset_ms=10.0)
+    for i in range(40):
+        slow.on_note(i * 0.25 + 0.05, 38, 90)     # 50 ms late: Good
+        fast.on_note(i * 0.25 + 0.01, 38, 90)     # on time after the 10 ms offset
+    # a backed-up sink on one kit never shows up in the other kit's (or even its own) judging time
+    assert slow.pipeline.stats()["slow"]["backlog"] > 0
+    # (median: a single hit can still wait out a 5 ms GIL switch interval behind another test's thread)
+    assert fast.handle.summary()["p50_ms"] < 5.0 and slow.handle.summary()["p50_ms"] < 5.0
+    s1, s2 = slow.close(), fast.close()
+    assert (s1["played"], s1["perfects"]) == (40, 0)
+    assert (s2["played"], s2["perfects"]) == (40, 40)
+    total = aggregate([s1, s2])
+    assert (total["players"], total["played"], total["hits_landed"]) == (2, 80, 80)
+    assert abs(total["avg_abs_dt_ms"] - 25.0) < 1e-6
+    ins = fast.input_stats()
+    assert ins["events"] == 40 and ins["events_per_s"] > 0
@@ -0,0 +1,154 @@
+import asyncio, time
+import pytest
+from config import KIND_LED_NOTE
+from dh_types import ExpectedHit
+from firmware_sim import FirmwareSim
+from led_guide import ClockSync, LedGuide, ReplyParser, encode_cues
+from midi_time import TempoMap
+from notifier import ArduinoNotifier, STATUS_START, TIME_START
+from runtime import LoopEngine, LoopSerialLink
+from scheduler import PlayScheduler
+
+TM = TempoMap([(0, 500_000)], 480)
+
+def _hits(n, start=1.0, step=0.0625):
+    kinds = ("kick", "snare", "hihat_closed", "ride")
+    return [ExpectedHit(t=start + i * step, kind=kinds[i % 4], note=36, vel=100) for i in range(n)]
+
+def _errors_ms(sim, guide, start_at, hits):
+    # when each pad actually lit vs when it should have
+    return sorted(abs(c[0] - (start_at + h.t - guide.lead)) * 1000 for c, h in zip(sim.cues, hits))
+
+def test_frames_and_replies_are_7bit_and_resync():
+    f = encode_cues([(1000, 36, 50), (1125, 38, 50), (1125 + 16383, 51, 50)], host_ms=900)
+    assert f[0] == 0xAB and all(b < 0x80 for b in f[1:]) and len(f) == 1 + 9 + 3 * 4 + 1
+    p = ReplyParser()
+    got = p.feed(bytes((0x55, TIME_START, 0, 0, 7)) + bytes((TIME_START, 0, 0, 7, 0x68, 0x55)))
+    assert got == [(TIME_START, bytes((0, 0, 7, 0x68)))] and p.acks == 2     # a marker abandons the cut-off frame
+    assert p.feed(bytes((STATUS_START,)) + bytes(9))[0][0] == STATUS_START
+
+def test_clock_sync_takes_the_fastest_round_trip_and_measures_drift():
+    cs = ClockSync()
+    for i in range(12):
+        host = 100.0 + i * 0.5
+        rtt = 0.001 if i % 3 == 0 else 0.009                 # slow round trips are skewed
+        dev = int(((host + (0.0 if i % 3 == 0 else 0.006)) * 1.002 - 90.0) * 1000) & ((1 << 28) - 1)
+        cs.add(host - rtt / 2, host + rtt / 2, dev)
+    assert cs.ppm == pytest.approx(2000, abs=150)
+    assert cs.device_ms(106.0) == pytest.approx((106.0 * 1.002 - 90.0) * 1000, abs=2.0)
+
+def test_cues_fire_on_the_device_clock_with_bounded_uploads():
+    sim = FirmwareSim(ppm=3000)
+    link = ArduinoNotifier(sim.port, handshake_s=2.0)
+    guide = LedGuide(link, capacity=12)
+    hits = _hits(48)
+    sched = PlayScheduler()
+    start_at = sched.start(hits, TM, play_click=False, start_delay=1.0, on_expected=guide.add)
+    guide.start(start_at, sched.schedule)
+    sched.join(15)
+    time.sleep(0.1)
+    link.close(); sim.close()
+    st = guide.stats()
+    assert st["cues"] == 48 and st["pending"] == 0 and len(sim.cues) == 48
+    assert [c[1] for c in sim.cues[:4]] == [KIND_LED_NOTE[k] for k in ("kick", "snare", "hihat_closed", "ride")]
+    assert st["max_onboard"] <= 12 and st["frames"] < 48 / 2             # full frames, never more than fits
+    err = _errors_ms(sim, guide, start_at, hits)
+    assert err[len(err) // 2] < 3.0, err
+    assert st["sync"]["drift_ppm"] == pytest.approx(3000, abs=1000)
+    assert st["device"]["fired"] > 0 and st["device"]["free"] <= 48
+
+def test_uploaded_cues_fire_without_the_host():
+    sim = FirmwareSim()
+    async def go():
+        loop = asyncio.get_running_loop()
+        link = LoopSerialLink(sim.port, loop, handshake_s=2.0)
+        guide = LedGuide(link)
+        hits = _hits(20, start=1.0, step=0.05)                 # all within one look-ahead
+        sched = PlayScheduler(engine_factory=lambda clock: LoopEngine(loop, clock))
+        start_at = sched.start(hits, TM, play_click=False, start_delay=0.5, on_expected=guide.add, threaded=False)
+        guide.start(start_at, sched.schedule)
+        while guide.stats()["cues"] < 20:
+            await asyncio.sleep(0.01)
+        sched.stop(); link.close()                               # host gone: the device has everything it needs
+        time.sleep(start_at + 2.2 - time.monotonic())            # and the loop is blocked meanwhile
+        return guide, start_at, hits
+    guide, start_at, hits = asyncio.run(go())
+    sim.close()
+    err = _errors_ms(sim, guide, start_at, hits)
+    assert len(err) == 20 and err[len(err) // 2] < 3.0, err
+
+def test_old_firmware_turns_the_guide_off_and_grades_still_flash():
+    sim = FirmwareSim(cues=False)
+    link = ArduinoNotifier(sim.port, handshake_s=2.0)
+    guide = LedGuide(link)
+    sched = PlayScheduler()
+    start_at = sched.start(_hits(4, start=1.5), TM, play_click=False, start_delay=0.0, on_expected=guide.add)
+    guide.start(start_at, sched.schedule)
+    sched.join(10)
+    link.send_grade("Perfect", "snare")
+    end = time.monotonic() + 2.0
+    while not sim.flashes and time.monotonic() < end:
+        time.sleep(0.01)
+    link.close(); sim.close()
+    assert guide.disabled and guide.stats()["cues"] == 0 and not sim.cues
+    assert [f[1] for f in sim.flashes] == [KIND_LED_NOTE["snare"]]
+
+class DownLink:
+    # handshake done, but every send fails (port gone)
+    handshake_s = 1.0
+    def __init__(self):
+        import threading
+        self.ready = threading.Event(); self.ready.set()
+    def listen(self, on_data): pass
+    def send_bytes(self, data, on_written=None): return False
+
+def test_unsent_cues_are_not_counted_on_board_and_sync_history_is_bounded():
+    guide = LedGuide(DownLink(), capacity=4)
+    for i in range(200):
+        guide.sync.add(100.0 + i, 100.0 + i + 0.001, 5000 + i * 1000)
+    assert guide.sync.count == 200 and len(guide.sync.samples) <= 64
+    guide.start_at = 100.0
+    guide.add(_hits(8, start=101.0, step=0.1))
+    guide._upload(100.9)
+    st = guide.stats()
+    assert st["cues"] == 0 and st["max_onboard"] == 0 and st["pending"] == 8    # all kept for a retry
+
+def test_cue_frames_survive_a_burst_of_grade_frames():
+    link = ArduinoNotifier(None, queue_size=4)                  # no port: nothing drains the queues
+    link.ready.set()
+    frame = encode_cues([(10_000, 36, 50)], host_ms=0)
+    assert link.send_bytes(frame)
+    for _ in range(50): link.send_grade("Perfect", "snare")
+    assert link.dropped == 46 and [f for f, *_ in link._ctl] == [frame]
+
+def test_close_clears_queued_cues_and_only_written_frames_count():
+    sim = FirmwareSim()
+    link = ArduinoNotifier(sim.port, handshake_s=2.0)
+    guide = LedGuide(link)
+    guide.add(_hits(16, start=1.5, step=0.05))                 # all pending: uploaded right after the sync burst
+    sched = PlayScheduler()
+    start_at = sched.start(_hits(1, start=1.5), TM, play_click=False, start_delay=0.0)
+    guide.start(start_at, sched.schedule)
+    end = time.monotonic() + 1.0
+    while guide.stats()["cues"] < 16 and time.monotonic() < end:
+        time.sleep(0.01)
+    sched.stop(); sched.join()
+    guide.close()                                               # Ctrl-C before the first pad is due
+    time.sleep(start_at + 2.5 - time.monotonic())
+    link.close(); sim.close()
+    assert guide.stats()["cues"] == 16 and not sim.cues         # written, then cleared: nothing lit
+
+class FailingLink(DownLink):
+    # queues everything, then the port write fails
+    def send_bytes(self, data, on_written=None):
+        if on_written: on_written(False)
+        return True
+
+def test_cues_lost_in_a_failed_write_never_count_on_board():
+    guide = LedGuide(FailingLink(), capacity=4)
+    guide.sync.add(100.0, 100.001, 5000)
+    guide.start_at = 100.0
+    guide.add(_hits(8, start=1.0, step=0.1))
+    guide._upload(100.9)
+    st = guide.stats()
+    assert st["cues"] == 0 and st["lost"] == 4 and st["max_onboard"] == 0 and guide._inflight == 0
@@ -0,0 +1,21 @@
+from midi_io import DriverClock
+
+def test_driver_clock_recovers_event_times_from_late_callbacks():
+    # true events every 100 ms; callbacks arrive 1 ms late plus occasional 8 ms stalls
+    clock = DriverClock()
+    stalls = {3: 0.008, 7: 0.005}
+    out = []
+    for i in range(10):
+        true_t = 10.0 + i * 0.1
+        arrival = true_t + 0.001 + stalls.get(i, 0.0)
+        out.append(clock.stamp(0.1 if i else 0.0, arrival))
+    for i, (t, u) in enumerate(out):
+        assert abs(t - (10.001 + i * 0.1)) < 1e-4
+    assert abs(out[3][1] - 0.008) < 1e-4
+    assert out[0][1] == 0.0
+
+def test_driver_clock_tracks_early_arrival():
+    clock = DriverClock()
+    clock.stamp(0.0, 5.010)           # first callback was delayed 10 ms
+    t, u = clock.stamp(0.5, 5.501)    # this one only 1 ms: offset estimate tightens
+    assert abs(t - 5.501) < 1e-9 and u == 0.0
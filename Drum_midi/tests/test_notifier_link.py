@@ -0,0 +1,49 @@
+import time
+from firmware_sim import FirmwareSim
+from notifier import ArduinoNotifier
+from config import KIND_LED_NOTE, GRADE_LED_VEL
+
+def _wait(cond, timeout=2.0):
+    end = time.monotonic() + timeout
+    while not cond() and time.monotonic() < end:
+        time.sleep(0.005)
+    return cond()
+
+def test_handshake_then_framed_grades_per_kind():
+    sim = FirmwareSim(boot_delay=0.2)
+    t0 = time.monotonic()
+    n = ArduinoNotifier(sim.port, handshake_s=2.0)
+    n.send_grade("Perfect", "snare")          # before ready: dropped, not replayed later
+    assert n.wait_ready(2.0)
+    assert time.monotonic() - t0 >= 0.2       # pings lost during "boot" were retried
+    assert sim.pings >= 1
+    n.send_grade("Perfect", "snare")
+    n.send_grade("Good", "kick")
+    n.send_miss_pulse("ride")
+    assert _wait(lambda: len(sim.flashes) == 3)
+    assert [(f[1], f[2]) for f in sim.flashes] == [
+        (KIND_LED_NOTE["snare"], GRADE_LED_VEL["Perfect"]),
+        (KIND_LED_NOTE["kick"], GRADE_LED_VEL["Good"]),
+        (KIND_LED_NOTE["ride"], GRADE_LED_VEL["Miss"]),
+    ]
+    n.close(); sim.close()
+    st = n.stats()
+    assert st["dropped_not_ready"] == 1 and st["written"] == 3
+
+def test_bursts_are_coalesced_into_few_writes():
+    sim = FirmwareSim()
+    n = ArduinoNotifier(sim.port)
+    assert n.wait_ready(2.0)
+    for _ in range(100):
+        n.send_grade("Great", "hihat_closed")
+    assert _wait(lambda: len(sim.flashes) == 100)
+    n.close(); sim.close()
+    assert n.stats()["writes"] < 100
+
+def test_missing_ack_falls_back_after_timeout():
+    sim = FirmwareSim(ack=False)
+    n = ArduinoNotifier(sim.port, handshake_s=0.2)
+    assert n.wait_ready(2.0)
+    n.send_grade("Perfect", "crash")
+    assert _wait(lambda: len(sim.flashes) == 1)
+    n.close(); sim.close()
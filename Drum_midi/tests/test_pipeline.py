@@ -0,0 +1,74 @@
+import threading
+from dh_types import ExpectedHit
+from judge import Judge
+from pipeline import JudgmentPipeline
+from config import GM
+
+class ListSink:
+    name = "list"
+    def __init__(self, gate=None):
+        self.recs, self.gate = [], gate
+    def handle(self, rec):
+        if self.gate: self.gate.wait()
+        self.recs.append(rec)
+    def close(self): pass
+
+def test_judge_publishes_hits_and_silent_misses():
+    sink = ListSink()
+    pipe = JudgmentPipeline([sink])
+    exp = [ExpectedHit(t=1.0, kind="snare", note=38, vel=100),
+           ExpectedHit(t=2.0, kind="kick", note=36, vel=90)]
+    j = Judge(exp, tol_ms=120, pipeline=pipe)
+    j.register_hit(t_actual=1.01, note=38, vel=80, note_to_kind=GM.get)
+    j.finalize()
+    pipe.close()
+    hit, miss = sink.recs
+    assert (hit.kind, hit.grade, hit.combo, hit.silent) == ("snare", "Perfect", 1, False)
+    assert round(hit.dt_ms, 3) == 10.0
+    assert (miss.kind, miss.grade, miss.silent, miss.vel_target) == ("kick", "Miss", True, 90)
+    stats = pipe.stats()["list"]
+    assert stats["consumed"] == 2 and stats["dropped"] == 0
+
+def test_overflow_drop_newest_never_blocks_publisher():
+    gate = threading.Event()
+    sink = ListSink(gate)
+    pipe = JudgmentPipeline([sink], capacity=4, overflow="drop_newest")
+    exp = [ExpectedHit(t=i * 0.5, kind="snare", note=38, vel=100) for i in range(20)]
+    j = Judge(exp, tol_ms=120, pipeline=pipe)
+    for e in exp:
+        j.register_hit(t_actual=e.t, note=38, vel=100, note_to_kind=GM.get)
+    gate.set()
+    pipe.close()
+    stats = pipe.stats()["list"]
+    assert stats["dropped"] > 0
+    assert stats["published"] + stats["dropped"] == 20
+    assert len(sink.recs) == stats["published"]
+
+def test_block_waits_for_room_outside_the_judge_lock():
+    gate = threading.Event()
+    sink = ListSink(gate)
+    pipe = JudgmentPipeline([sink], capacity=2, overflow="block")
+    exp = [ExpectedHit(t=i * 0.5, kind="snare", note=38, vel=100) for i in range(8)]
+    j = Judge(exp, tol_ms=120, pipeline=pipe)
+    player = threading.Thread(target=lambda: [j.register_hit(t_actual=e.t, note=38, vel=100, note_to_kind=GM.get) for e in exp])
+    player.start()
+    try:
+        player.join(0.2)
+        assert player.is_alive()                      # held back by the stuck sink...
+        assert j.lock.acquire(timeout=1.0)            # ...but not while holding the Judge's lock
+        j.lock.release()
+    finally:
+        gate.set()
+        player.join(2.0)
+    pipe.close()
+    assert not player.is_alive() and len(sink.recs) == 8 and pipe.stats()["list"]["dropped"] == 0
+
+def test_drop_oldest_counts_only_records_really_discarded():
+    sink = ListSink()
+    pipe = JudgmentPipeline([sink], capacity=8, overflow="drop_oldest")
+    exp = [ExpectedHit(t=i * 0.001, kind="snare", note=38, vel=100) for i in range(20000)]
+    j = Judge(exp, tol_ms=120, pipeline=pipe)
+    j.finalize()                                      # 20000 misses as fast as they can be published
+    pipe.close()
+    stats = pipe.stats()["list"]
+    assert stats["consumed"] + stats["dropped"] == 20000 == stats["published"]
@@ -0,0 +1,79 @@
+import numpy as np
+import pytest
+from dh_types import Chart, ExpectedHit
+from judge import Judge
+from midi_time import TempoMap
+from practice import Practice, parse_bars
+from replay import VirtualClock
+from scheduler import PlayScheduler
+
+TM = TempoMap([(0, 500_000)], 480)        # 120 bpm: one bar = 2 s
+
+def _chart(beats=12):
+    return Chart.from_hits([ExpectedHit(t=b * 0.5, kind="kick" if b % 2 == 0 else "snare", note=36 if b % 2 == 0 else 38, vel=100)
+                            for b in range(beats)])
+
+class Direct:
+    # publisher that hands judgments straight to the sinks (no threads: deterministic)
+    def __init__(self, *sinks): self.sinks = sinks
+    def publish(self, rec):
+        for s in self.sinks: s.handle(rec)
+
+def test_parse_bars():
+    assert parse_bars("17-20") == (17, 20) and parse_bars(" 9 ") == (9, 9)
+    with pytest.raises(ValueError): parse_bars("4-2")
+
+def test_section_is_timed_from_ticks_and_passes_are_gapless():
+    p = Practice(_chart(), TM, 2, 2, speed=50)
+    assert p.n == 4 and np.allclose(p.rel, [0.0, 0.5, 1.0, 1.5])
+    tl = p.timeline
+    assert tl.seconds_at(4 * 480) == pytest.approx(4.0)          # one bar of count-in at 50%
+    hits = p.hits()
+    first = [next(hits) for _ in range(8)]
+    assert [h.t for h in first] == pytest.approx([4, 5, 6, 7, 8, 9, 10, 11])   # pass 2 starts right as pass 1 ends
+    assert [h.note for h in first[:4]] == [36, 38, 36, 38]
+    p.speed = 100                                                   # lands on the next pass not yet queued
+    assert [next(hits).t for _ in range(4)] == pytest.approx([12.0, 12.5, 13.0, 13.5])
+    assert tl.seconds_at(4 * 480 + 2 * 4 * 480) == pytest.approx(12.0)   # clicks follow the same timeline
+
+def _play(p, seconds, stop=None):
+    # every note dead on time in 10 ms steps; a pass only ever lives in the Judge while it plays
+    pub = Direct()
+    judge = Judge([], tol_ms=120, pipeline=pub)
+    pub.sinks = (p.sink(judge),)
+    clock = VirtualClock()
+    sched = PlayScheduler(clock=clock)
+    p.schedule = sched.schedule
+    start_at = sched.start(p.hits(), p.timeline, play_click=False, start_delay=0.0, on_expected=judge.extend, threaded=False)
+    hit, held = 0, 0
+    for step in range(int(seconds * 100)):
+        now = start_at + step * 0.01
+        sched.advance(now, clock.advance_to)
+        clock.advance_to(now)
+        t = judge.expected.t
+        while hit - judge.base < len(t) and t[hit - judge.base] <= now - start_at and (stop is None or t[hit - judge.base] < stop):
+            i = hit - judge.base
+            judge.register_hit(float(t[i]), int(judge.expected.note[i]), 100, {36: "kick", 38: "snare"}.get)
+            hit += 1
+        held = max(held, len(judge.expected))
+    return judge, held
+
+def test_loop_judges_every_pass_and_ramps_speed():
+    p = Practice(_chart(), TM, 2, 2, speed=50, ramp=25, passes=4, tol_ms=120)
+    judge, held = _play(p, 25)
+    stats = judge.finalize()
+    assert stats["notes_in_chart"] == 16 and stats["perfects"] == 16
+    assert held <= 2 * p.n                    # settled passes are dropped, not kept forever
+    assert [round(s * 100) for s in p.timeline.speeds] == [50, 50, 75, 100]   # each ramp lands one queued pass later
+    assert [k for k, _, _ in p.reported] == [0, 1, 2, 3]
+    assert all(p.sinks[0].passes[k]["Perfect"] == 4 for k in range(4))
+    assert p.summary()[0].endswith("4 passes")
+
+def test_stopping_an_endless_loop_counts_only_what_was_played():
+    p = Practice(_chart(), TM, 2, 2, speed=100, tol_ms=120)        # a bar of count-in, then passes from 2 s, 2 s each
+    judge, _ = _play(p, 8.3, stop=7.2)                             # no hits after 7.2 s; stopped early in pass 4
+    assert [(k, g["Miss"]) for k, _, g in p.reported] == [(0, 0), (1, 0), (2, 1)]   # the pass-end sweep reported 7.5 s
+    p.finish(8.3)                                                  # pass 4 past 8.0 s was only queued
+    stats = judge.finalize()
+    assert stats["notes_in_chart"] == 13 and stats["perfects"] == 11 and stats["misses"] == 2
+    assert p.summary()[0].endswith("4 passes")
@@ -0,0 +1,34 @@
+from config import GM
+from dh_types import KINDS
+from profiles import DeviceProfile, available_profiles, build_active_map
+
+def test_shipped_profiles_compile():
+    assert {"gm", "alesis_nitro_pro", "roland_td"} <= set(available_profiles())
+    for name in available_profiles():
+        p = DeviceProfile.load(name)
+        assert len(p.kind_lut) == len(p.gm_note) == len(p.out_note) == 128 and len(p.vel_lut) == 128 * 128
+
+def test_lookup_tables_agree_with_gm_and_overrides():
+    p = DeviceProfile.load("alesis_nitro_pro")
+    for n in range(128):
+        kind = GM.get({39: 38, 52: 51}.get(n, n))
+        assert p.kind_of(n) == kind
+        assert (KINDS[p.kind_lut[n]] if p.kind_lut[n] != 255 else None) == kind
+    assert p.out_note[53] == 51 and p.out_note[38] == 38          # OUTPUT_NOTE_MAP
+    assert build_active_map(GM, {39: 38})(39) == "snare"
+
+def test_velocity_curves():
+    p = DeviceProfile({"velocity_curve": {"gamma": 0.5}, "per_note_velocity": {"36": {"points": [[0, 0], [127, 64]]}}})
+    assert p.velocity(38, 0) == 0 and p.velocity(38, 127) == 127
+    assert p.velocity(38, 32) == 64                        # 127 * sqrt(32/127)
+    assert p.velocity(36, 127) == 64 and p.velocity(36, 1) == 1
+
+def test_hihat_pedal_reclassifies_hat_notes():
+    p = DeviceProfile.load("roland_td")
+    assert p.kind_of(46) == "hihat_open" and p.kind_of(22) == "hihat_closed"   # device's own notes until the pedal moves
+    p.control(4, 127)
+    assert p.kind_of(46) == "hihat_closed" and p.kind_of(26) == "hihat_closed"
+    p.control(4, 10)
+    assert p.kind_of(42) == "hihat_open" and p.kind_of(38) == "snare" and p.kind_of(44) == "hihat_pedal"
+    p.control(7, 127)                                       # other CCs are ignored
+    assert p.kind_of(42) == "hihat_open"
@@ -0,0 +1,48 @@
+import math
+import numpy as np
+from config import GM
+from dh_types import ExpectedHit
+from judge import Judge
+from pipeline import JudgmentPipeline
+from recorder import SessionRecorder, read_records, summarize, GRADES, REC_DTYPE
+
+def _session(path, session):
+    exp = [ExpectedHit(t=1.0, kind="snare", note=38, vel=100), ExpectedHit(t=2.0, kind="kick", note=36, vel=90)]
+    p = JudgmentPipeline([SessionRecorder(path, block=2, session=session)])
+    j = Judge(exp, tol_ms=120, pipeline=p, offset_ms=10.0)
+    j.register_hit(t_actual=1.02, note=38, vel=80, note_to_kind=GM.get)
+    j.register_hit(t_actual=5.00, note=38, vel=70, note_to_kind=GM.get)   # nothing left to match
+    j.finalize()
+    p.close()
+
+def test_records_roundtrip_and_append(tmp_path):
+    path = str(tmp_path / "s.drec")
+    _session(path, 1)
+    _session(path, 2)
+    recs = read_records(path)
+    assert isinstance(recs, np.memmap) and recs.dtype == REC_DTYPE and len(recs) == 6
+
+    hit = recs[0]
+    assert (hit["idx"], hit["note"], hit["vel"], GRADES[hit["grade"]]) == (0, 38, 80, "Perfect")
+    assert math.isclose(hit["t_in"], 1.02) and math.isclose(hit["dt_ms"], 10.0, abs_tol=1e-3)
+    s = summarize(recs)
+    assert (s["sessions"], s["hits"], s["silent_misses"], s["extra_hits"]) == (2, 2, 2, 2)
+
+def test_torn_tail_is_ignored(tmp_path):
+    path = str(tmp_path / "s.drec")
+    _session(path, 1)
+    with open(path, "ab") as f: f.write(b"\x00" * 5)
+    assert len(read_records(path)) == 3
+    _session(path, 2)
+    assert len(read_records(path)) == 6
+
+def test_kind_table_is_checked_on_read(tmp_path, monkeypatch):
+    import pytest, recorder
+    path = str(tmp_path / "s.drec")
+    monkeypatch.setattr(recorder, "KINDS", recorder.KINDS[1:] + recorder.KINDS[:1])   # an older/newer build
+    _session(path, 1)
+    monkeypatch.undo()
+    with pytest.raises(ValueError, match="kind table"):
+        read_records(path)
+    with pytest.raises(ValueError, match="kind table"):
+        SessionRecorder(path)
@@ -0,0 +1,27 @@
+from pathlib import Path
+from mido import MidiFile
+from chart import extract_chart
+from replay import humanize, run_replay
+
+SONG = Path(__file__).resolve().parents[1] / "The Strokes-You Only Live Once-10-28-2025.mid"
+
+def test_exact_replay_is_all_perfect(simple_drum_midi):
+    path, _ = simple_drum_midi
+    exp, tm = extract_chart(MidiFile(path))
+    res = run_replay(exp, tm, humanize(exp, jitter_ms=0, vel_jitter=0))
+    s = res["stats"]
+    assert s["played"] == s["perfects"] == s["notes_in_chart"] == 4
+    assert s["misses"] == 0 and s["max_combo"] == 4
+    assert res["notifier"][("Perfect", "kick")] == 1
+
+def test_bundled_song_replay_is_deterministic():
+    exp, tm = extract_chart(MidiFile(str(SONG)))
+    hits = humanize(exp, jitter_ms=15, miss_rate=0.05, seed=7)
+    a = run_replay(exp, tm, hits)
+    b = run_replay(exp, tm, humanize(exp, jitter_ms=15, miss_rate=0.05, seed=7))
+    assert a["stats"] == b["stats"] and a["notifier"] == b["notifier"]
+    assert all(ch["dropped"] == 0 and ch["consumed"] == ch["published"] for ch in a["pipeline"].values())
+    s = a["stats"]
+    assert s["notes_in_chart"] == len(exp)
+    assert s["misses"] >= len(exp) - len(hits)
+    assert a["hits_per_s"] > 1000
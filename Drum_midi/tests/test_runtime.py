@@ -0,0 +1,140 @@
+import asyncio, signal, time
+import pytest
+from config import KIND_LED_NOTE, GRADE_LED_VEL
+from dh_types import Chart, ExpectedHit
+from firmware_sim import FirmwareSim
+from judge import Judge
+from midi_time import TempoMap
+from pipeline import ConsoleSink
+from profiles import DeviceProfile
+from runtime import LoopEngine, LoopSerialLink, Runtime
+from scheduler import PlayScheduler
+
+class ListSink:
+    name = "list"
+    def __init__(self): self.recs = []
+    def handle(self, rec): self.recs.append(rec)
+    def close(self): pass
+
+def test_loop_engine_fires_in_order_and_resolves_done():
+    async def go():
+        loop = asyncio.get_running_loop()
+        eng = LoopEngine(loop)
+        fired = []
+        now = time.monotonic()
+        eng.schedule(now + 0.06, fired.append, "c", label="x")
+        eng.schedule(now + 0.02, fired.append, "a", label="x")
+        eng.schedule(now + 0.04, fired.append, "b", label="x")
+        eng.finish()
+        await asyncio.wait_for(eng.done, 2)
+        return eng, fired
+    eng, fired = asyncio.run(go())
+    assert fired == ["a", "b", "c"] and eng.pending() == 0
+    s = eng.lateness_summary()["x"]
+    assert s["count"] == 3 and 0.0 <= s["max_ms"] < 50.0
+
+def test_play_scheduler_streams_chart_on_the_loop():
+    chart = Chart.from_hits([ExpectedHit(t=i * 0.02, kind="snare", note=38, vel=100) for i in range(20)])
+    async def go():
+        rt_loop = asyncio.get_running_loop()
+        batches = []
+        sched = PlayScheduler(engine_factory=lambda clock: LoopEngine(rt_loop, clock))
+        sched.start(chart, TempoMap([(0, 500_000)], 480), play_click=False, start_delay=0.01, lookahead=0.05,
+                    on_expected=batches.append, threaded=False)
+        await asyncio.wait_for(sched.engine.done, 2)
+        return batches
+    batches = asyncio.run(go())
+    assert len(batches) > 1                      # pulled a look-ahead window at a time
+    assert sum(len(b) for b in batches) == 20
+
+def test_hits_judged_and_delivered_on_one_loop_with_e2e_latency():
+    rt = Runtime()
+    sink = ListSink()
+    pipe = rt.pipeline([sink, ConsoleSink()])
+    judge = Judge([ExpectedHit(t=i * 0.5, kind="snare", note=38, vel=100) for i in range(4)], tol_ms=120,
+                  pipeline=pipe, lock=rt.judge_lock)
+    player = rt.player("P1", "no such port", DeviceProfile.load("gm"), judge, pipe)
+    start_at = time.monotonic()
+    pipe.set_origin(start_at)
+    for i in range(4):
+        rt.loop.call_soon(player.on_note, i * 0.5 + 0.01, 38, 90)
+    rt.loop.run_until_complete(asyncio.sleep(0.01))
+    assert [r.grade for r in sink.recs] == ["Perfect"] * 4      # sinks ran without a thread of their own
+    st = pipe.stats()["list"]
+    assert st["consumed"] == 4 and st["e2e_ms"]["count"] == 4
+    stats = player.close()
+    assert stats["perfects"] == 4
+    rt.close()
+
+def test_finalize_after_the_session_loses_nothing_on_the_stopped_loop():
+    rt = Runtime()
+    sink = ListSink()
+    pipe = rt.pipeline([sink], capacity=64)
+    judge = Judge([ExpectedHit(t=i * 0.01, kind="kick", note=36, vel=100) for i in range(1000)], tol_ms=120,
+                  pipeline=pipe, lock=rt.judge_lock)
+    judge.finalize()                                  # every note a miss, published with the loop stopped
+    pipe.close(); rt.close()
+    assert len(sink.recs) == 1000 and pipe.stats()["list"]["dropped"] == 0
+
+def test_runtime_ends_when_every_input_fails():
+    rt = Runtime()
+    pipe = rt.pipeline()
+    judge = Judge([], tol_ms=120, pipeline=pipe, lock=rt.judge_lock)
+    player = rt.player("P1", "no such port", DeviceProfile.load("gm"), judge, pipe, input_mode="poll")
+    sched = rt.scheduler()
+    chart = Chart.from_hits([ExpectedHit(t=10.0, kind="kick", note=36, vel=100)])
+    start_at = sched.start(chart, TempoMap([(0, 500_000)], 480), play_click=False, start_delay=0.0, threaded=False)
+    def on_int(signum, frame): pass
+    prev = signal.signal(signal.SIGINT, on_int)
+    try:
+        usage = rt.run([player], sched, start_at)
+        assert signal.getsignal(signal.SIGINT) is on_int        # the caller's Ctrl-C handler is back
+    finally:
+        signal.signal(signal.SIGINT, prev)
+    assert player.error and not player.alive()
+    assert usage["wall_s"] < 5.0 and usage["threads"] >= 1 and usage["wakeups"] >= 1
+    player.close(); rt.close()
+
+def test_serial_link_handshakes_and_coalesces_on_the_loop():
+    sim = FirmwareSim(boot_delay=0.1)
+    async def go():
+        link = LoopSerialLink(sim.port, asyncio.get_running_loop(), handshake_s=2.0)
+        link.send_grade("Perfect", "snare")       # before ready: dropped
+        while not link.ready.is_set():
+            await asyncio.sleep(0.01)
+        for _ in range(50):
+            link.send_grade("Great", "hihat_closed")
+        link.send_miss_pulse("ride")
+        end = time.monotonic() + 2.0
+        while len(sim.flashes) < 51 and time.monotonic() < end:
+            await asyncio.sleep(0.01)
+        link.close()
+        return link
+    link = asyncio.run(go())
+    sim.close()
+    assert sim.pings >= 1
+    assert [(f[1], f[2]) for f in sim.flashes[-1:]] == [(KIND_LED_NOTE["ride"], GRADE_LED_VEL["Miss"])]
+    st = link.stats()
+    assert len(sim.flashes) == 51 and st["written"] == 51 and st["dropped_not_ready"] == 1
+    assert st["writes"] < 51 and st["queue_ms"]["count"] == 51
+
+class _IdlePlayer:
+    # never ends on its own: only Ctrl-C or the song end can finish the session
+    def start(self, start_at): self.done = asyncio.get_running_loop().create_future()
+    def stop(self): pass
+
+@pytest.mark.parametrize("ending", ["song_end", "ctrl_c"])
+def test_session_shutdown_leaves_no_unretrieved_futures(ending):
+    import gc, os
+    rt = Runtime()
+    errors = []
+    rt.loop.set_exception_handler(lambda loop, ctx: errors.append(ctx["message"]))
+    sched = rt.scheduler()
+    chart = Chart.from_hits([ExpectedHit(t=0.05, kind="kick", note=36, vel=100)])
+    start_at = sched.start(chart, TempoMap([(0, 500_000)], 480), play_click=False, start_delay=0.0, threaded=False)
+    if ending == "ctrl_c":
+        rt.loop.call_later(0.05, os.kill, os.getpid(), signal.SIGINT)
+    rt.run([_IdlePlayer()], sched, start_at, stop_at_end=ending == "song_end", grace=0.01)
+    gc.collect()                                  # "exception was never retrieved" is logged on collection
+    rt.close()
+    assert errors == []
@@ -0,0 +1,68 @@
+from dh_types import ExpectedHit
+from judge import Judge
+from kits import Player
+from pipeline import JudgmentPipeline
+from profiles import DeviceProfile
+from scheduler import EventScheduler
+from stats import Histogram, StageStats, STAGE_EDGES_US
+
+def test_histogram_buckets_and_bucket_bound_percentiles():
+    h = Histogram()
+    for us in (0.5, 3, 3, 3, 40, 40, 700, 250_000):
+        h.add(us / 1e6)
+    assert len(h.counts) == len(STAGE_EDGES_US) + 1
+    assert h.counts[0] == 1 and h.counts[2] == 3 and h.counts[-1] == 1
+    assert h.percentile(0.5) == 5            # upper edge of the 2..5 µs bucket
+    assert h.percentile(1.0) == h.max == 250_000
+    s = h.summary()
+    assert s["count"] == 8 and abs(s["mean_us"] - sum((0.5, 3, 3, 3, 40, 40, 700, 250_000)) / 8) < 1e-6
+
+def test_instrumented_player_fills_every_stage_and_off_costs_nothing():
+    chart = [ExpectedHit(t=i * 0.25, kind="snare", note=38, vel=100) for i in range(10)]
+    plain = Judge(chart, tol_ms=120)
+    assert plain._h_lock is None              # not instrumented: no timing calls on the hot path
+
+    stages = StageStats()
+    pipe = JudgmentPipeline([])
+    p = Player("P1", "none", DeviceProfile.load("gm"), Judge(chart, tol_ms=120, pipeline=pipe), pipe)
+    p.instrument(stages)
+    for i in range(10):
+        p.on_note(i * 0.25, 38, 100)
+    p.close()
+    for name in ("input→judge", "judge.total", "judge.lock_wait", "judge.match", "judge.grade"):
+        assert stages.stages[name].n == 10, name
+    assert stages.format()[0].split()[0] == "stage" and len(stages.format()) == 6
+
+    eng = EventScheduler()
+    eng.stages = stages
+    eng.schedule(0.0, lambda: None, label="guide")
+    eng.finish(); eng.run()
+    assert stages.stages["sched.guide"].n == 1
+
+def test_each_kit_gets_its_own_stages():
+    chart = [ExpectedHit(t=i * 0.25, kind="snare", note=38, vel=100) for i in range(4)]
+    stages = StageStats()
+    for name, hits in (("P1", 4), ("P2", 2)):
+        pipe = JudgmentPipeline([])
+        p = Player(name, "none", DeviceProfile.load("gm"), Judge(chart, tol_ms=120, pipeline=pipe), pipe)
+        p.instrument(stages.prefixed(f"{name}."))
+        for i in range(hits):
+            p.on_note(i * 0.25, 38, 100)
+        p.close()
+    assert stages.stages["P1.judge.total"].n == 4 and stages.stages["P2.judge.total"].n == 2
+    assert "judge.total" not in stages.stages
+
+def test_format_while_another_thread_adds_stages():
+    import threading
+    stages = StageStats()
+    def adder():
+        for i in range(20000):
+            stages.stage(f"sched.l{i}").add(1e-5)      # as EventScheduler does for each new label
+    t = threading.Thread(target=adder)
+    t.start()
+    try:
+        while t.is_alive():
+            stages.format(); stages.summary()
+    finally:
+        t.join()
+    assert len(stages.format()) == 20001
@@ -0,0 +1,20 @@
+import subprocess, sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+
+def _run(*args):
+    return subprocess.run([sys.executable, *args], cwd=ROOT, capture_output=True, text=True, timeout=60)
+
+def test_importing_app_loads_no_heavy_modules():
+    out = _run("-c", "import sys, app; print(' '.join(sorted(m for m in ('numpy', 'serial', 'audio', 'mido', 'chart_cache', 'scheduler') if m in sys.modules)))")
+    assert out.returncode == 0, out.stderr
+    assert out.stdout.split() == []
+
+def test_list_ports_does_no_chart_or_device_work():
+    probe = ("import sys, app; rc = app.main(['--list-ports', 'nonexistent.mid']); "
+             "print('LOADED', ' '.join(m for m in ('numpy', 'audio', 'chart_cache', 'scheduler', 'judge') if m in sys.modules)); sys.exit(rc)")
+    out = _run("-c", probe)
+    assert out.returncode == 0, out.stderr
+    assert "Available MIDI inputs" in out.stdout and "Serial ports" in out.stdout
+    assert out.stdout.strip().splitlines()[-1] == "LOADED"
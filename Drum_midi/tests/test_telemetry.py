@@ -0,0 +1,75 @@
+import asyncio, math, threading, time
+from dh_types import ExpectedHit, Judgment
+from judge import Judge
+from runtime import Runtime
+from telemetry import TelemetryClient, TelemetryServer
+
+def _rec(i, grade="Perfect"):
+    dt = math.nan if grade == "Miss" else float(i % 7 - 3)
+    return Judgment(i * 0.25, "snare", grade, dt, 90, 100, i, i, time.monotonic())
+
+def _wait(cond, timeout=5.0):
+    end = time.monotonic() + timeout
+    while not cond() and time.monotonic() < end:
+        time.sleep(0.005)
+    return cond()
+
+def test_json_and_binary_subscribers_get_the_same_records_and_snapshots(tmp_path):
+    srv = TelemetryServer(str(tmp_path / "t.sock"), snapshot_s=0.1).start()
+    sink = srv.sink("P1")
+    clients = [TelemetryClient(srv.address, fmt) for fmt in ("json", "bin")]
+    assert _wait(lambda: srv.subscribers() == 2)
+    for i in range(6):
+        sink.handle(_rec(i, "Miss" if i == 2 else "Perfect"))
+    time.sleep(0.15)
+    srv.close()
+    got = [list(c.records()) for c in clients]
+    for c in clients: c.close()
+    for recs in got:
+        assert recs[0]["type"] == "hello" and recs[0]["players"] == ["P1"]
+        hits = [r for r in recs if r["type"] == "hit"]
+        assert [h["grade"] for h in hits] == ["Perfect", "Perfect", "Miss", "Perfect", "Perfect", "Perfect"]
+        assert hits[2]["dt_ms"] is None and hits[5]["dt_ms"] == 2.0 and hits[5]["kind"] == "snare"
+        snap = [r for r in recs if r["type"] == "snapshot"][-1]
+        assert snap["judged"] == 6 and snap["max_combo"] == 5 and snap["grades"]["Miss"] == 1
+        assert abs(snap["mean_abs_dt_ms"] - sum(abs(i % 7 - 3) for i in (0, 1, 3, 4, 5)) / 5) < 1e-3
+    assert srv.stats()["published"] == 6
+
+def test_a_stalled_subscriber_only_loses_its_own_backlog(tmp_path):
+    srv = TelemetryServer(str(tmp_path / "t.sock"), queue_size=32, write_buffer=4096, snapshot_s=0).start()
+    sink = srv.sink("P1")
+    stalled = TelemetryClient(srv.address)                  # connects, never reads
+    fast = TelemetryClient(srv.address, "bin")
+    assert _wait(lambda: srv.subscribers() == 2)
+    n, seen = 20000, []
+    reader = threading.Thread(target=lambda: seen.extend(r for r in fast.records() if r["type"] == "hit"))
+    reader.start()
+    for i in range(n):
+        sink.handle(_rec(i))
+    assert _wait(lambda: len(seen) == n, 10.0)
+    st = srv.stats()
+    srv.close(); reader.join(5); stalled.close(); fast.close()
+    assert [r["idx"] for r in seen] == list(range(n))       # the live client got everything, in order
+    assert st["dropped"] > 0 and st["dropped"] <= n          # only the stalled one dropped
+
+def test_runtime_pipeline_feeds_telemetry_on_its_loop(tmp_path):
+    rt = Runtime()
+    srv = rt.telemetry(str(tmp_path / "t.sock"), snapshot_s=0).start()
+    pipe = rt.pipeline([srv.sink("P1")])
+    judge = Judge([ExpectedHit(t=i * 0.5, kind="kick", note=36, vel=100) for i in range(3)], tol_ms=120,
+                  pipeline=pipe, lock=rt.judge_lock)
+    client = TelemetryClient(srv.address)
+    rt.loop.run_until_complete(_settle(rt.loop, lambda: srv.subscribers() == 1))
+    hello = next(client.records())
+    for i in range(3):
+        judge.register_hit(i * 0.5 + 0.01, 36, 100, {36: "kick"}.get)
+    rt.loop.run_until_complete(_settle(rt.loop, lambda: srv.stats()["sent"] >= 4))
+    pipe.close(); srv.close(); rt.close()
+    hits = [r for r in client.records() if r["type"] == "hit"]
+    client.close()
+    assert hello["players"] == ["P1"] and [h["combo"] for h in hits] == [1, 2, 3]
+
+async def _settle(loop, cond, timeout=2.0):
+    end = loop.time() + timeout
+    while not cond() and loop.time() < end:
+        await asyncio.sleep(0.005)
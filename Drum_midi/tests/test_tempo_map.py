@@ -0,0 +1,34 @@
+import numpy as np
+from mido import MidiFile, MidiTrack, MetaMessage
+from midi_time import TempoMap, build_tempo_map, ticks_to_seconds, seconds_to_ticks
+
+def _mid_with_tempos(changes, tpq=480):
+    mid = MidiFile(ticks_per_beat=tpq)
+    track = MidiTrack()
+    mid.tracks.append(track)
+    last = 0
+    for tick, tempo in changes:
+        track.append(MetaMessage('set_tempo', tempo=tempo, time=tick - last))
+        last = tick
+    return mid
+
+def test_tempo_changes_accumulate():
+    # 1 beat @120 BPM, then 1 beat @60 BPM
+    tm = build_tempo_map(_mid_with_tempos([(0, 500000), (480, 1000000)]))
+    assert tm.seconds_at(480) == 0.5
+    assert tm.seconds_at(960) == 1.5
+    assert ticks_to_seconds(720, 480, tm) == 1.0
+    # the tempo at tick 0 replaces the default
+    assert tm[0] == (0, 500000)
+
+def test_batch_matches_scalar_and_inverts():
+    changes = [(0, 500000)] + [(i * 240, 400000 + (i * 7919) % 300000) for i in range(1, 200)]
+    tm = TempoMap(changes, 480)
+    ticks = np.arange(0, 60000, 37)
+    secs = tm.seconds_array(ticks)
+    assert np.allclose(secs, [tm.seconds_at(int(t)) for t in ticks])
+    assert np.allclose(tm.ticks_array(secs), ticks)
+    assert abs(seconds_to_ticks(secs[100], 480, tm) - ticks[100]) < 1e-6
+
+def test_legacy_list_map_still_accepted():
+    assert ticks_to_seconds(960, 480, [(0, 500000)]) == 1.0